@@ -1,44 +1,232 @@
 from __future__ import annotations
+from bisect import bisect_right
 from datetime import datetime, date, time, timedelta
+from typing import Iterable
 from sqlmodel import Session, select
-from .models import StoreHours, Booking, Service
+from .models import StoreHours, Booking, BookingStatus, Service, Station, StaffUser, Role
 
 SLOT_MINUTES = 30
+# Longest booking the range queries look back for: overlapping bookings
+# start at most this long before the window, which keeps both index bounds.
+MAX_BOOKING_SPAN = timedelta(days=1)
 
-def list_available_start_times(session: Session, *, store_id: int, service_id: int, d: date, consultant_id: int | None = None) -> list[str]:
-    dow = d.weekday()
-    hours = session.exec(select(StoreHours).where(StoreHours.store_id==store_id, StoreHours.day_of_week==dow, StoreHours.active==True)).first()
-    if not hours:
-        return []
-    svc = session.get(Service, service_id)
-    if not svc or not svc.active:
-        return []
-    dur = svc.duration_minutes
+Interval = tuple[datetime, datetime]
 
-    start = datetime.combine(d, hours.open_time)
-    end_limit = datetime.combine(d, hours.close_time)
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """Merge overlapping/touching busy intervals (input is usually already sorted by the query)."""
+    merged: list[Interval] = []
+    for s, e in sorted(intervals):
+        if merged and s <= merged[-1][1]:
+            if e > merged[-1][1]:
+                merged[-1] = (merged[-1][0], e)
+        else:
+            merged.append((s, e))
+    return merged
 
-    stmt = select(Booking).where(Booking.store_id==store_id, Booking.scheduled_start_at>=start, Booking.scheduled_start_at<end_limit)
-    if consultant_id:
-        stmt = stmt.where(Booking.consultant_id==consultant_id)
-    existing = session.exec(stmt).all()
-
-    def conflicts(s: datetime, e: datetime) -> bool:
-        for b in existing:
-            if b.status == "CANCELLED":
-                continue
-            if s < b.scheduled_end_at and e > b.scheduled_start_at:
-                return True
-        return False
-
-    out = []
-    cur = start
-    step = timedelta(minutes=SLOT_MINUTES)
-    while True:
-        slot_end = cur + timedelta(minutes=dur)
-        if slot_end > end_limit:
-            break
-        if not conflicts(cur, slot_end):
-            out.append(cur.strftime("%H:%M"))
+def blocked_starts(resources: Iterable[Iterable[Interval]], capacity: int, duration: timedelta) -> list[Interval]:
+    """
+    Open ranges (p, q) of start times at which a booking of `duration`
+    would overlap the busy spans of `capacity` or more resources. A span
+    (s, e) blocks every start in (s - duration, e); each resource's ranges
+    are united first so that it counts once. p and q themselves are free.
+    """
+    events: list[tuple[datetime, int]] = []
+    for spans in resources:
+        for s, e in union_open((s - duration, e) for s, e in spans):
+            events.append((s, 1))
+            events.append((e, -1))
+    events.sort()  # ends sort before starts at the same instant, which stays free
+    out: list[Interval] = []
+    level = 0
+    opened: datetime | None = None
+    for at, delta in events:
+        level += delta
+        if level >= capacity and opened is None:
+            opened = at
+        elif level < capacity and opened is not None:
+            if at > opened:
+                out.append((opened, at))
+            opened = None
+    return out
+
+def union_open(ranges: Iterable[Interval]) -> list[Interval]:
+    """Union of open ranges; ranges that only touch stay apart (the shared instant is free)."""
+    out: list[Interval] = []
+    for s, e in sorted(ranges):
+        if out and s < out[-1][1]:
+            if e > out[-1][1]:
+                out[-1] = (out[-1][0], e)
+        else:
+            out.append((s, e))
+    return out
+
+def free_start_times(open_at: datetime, close_at: datetime, duration: timedelta, blocked: list[Interval], step: timedelta) -> list[datetime]:
+    """
+    Single sweep over the slot grid and sorted, disjoint open ranges of
+    blocked start times (blocked_starts). When a candidate falls inside a
+    range we jump straight to the first grid point at or after its end, so
+    cost is O(free slots + ranges).
+    """
+    out: list[datetime] = []
+    i, n = 0, len(blocked)
+    cur = open_at
+    while cur + duration <= close_at:
+        while i < n and blocked[i][1] <= cur:
+            i += 1
+        if i < n and blocked[i][0] < cur:
+            steps = -(-(blocked[i][1] - open_at) // step)  # ceil
+            cur = open_at + steps * step
+            continue
+        out.append(cur)
         cur += step
     return out
+
+def store_resources(session: Session, store_id: int) -> tuple[list[int], list[int]]:
+    """Active station ids and active consultant ids for a store - the parallel resources a booking can use."""
+    stations = session.exec(select(Station.id).where(Station.store_id==store_id, Station.is_active==True).order_by(Station.id)).all()
+    consultants = session.exec(select(StaffUser.id).where(StaffUser.store_id==store_id, StaffUser.role==Role.CONSULTANT, StaffUser.is_active==True).order_by(StaffUser.id)).all()
+    return list(stations), list(consultants)
+
+def _axis(rows, col: int, resources: list[int]) -> tuple[dict[int, list[Interval]], list[Interval]]:
+    """
+    One resource axis (col 2 = station, 3 = consultant) of the booking rows:
+    merged busy spans per resource, and the spans of bookings not assigned
+    on this axis, each of which still holds *some* resource. Availability
+    and assign_resources both read the store through this, so a start the
+    one lists is a start the other can place.
+    """
+    wanted = set(resources)
+    by_resource: dict[int, list[Interval]] = {}
+    unassigned: list[Interval] = []
+    for r in rows:
+        if r[col] is None:
+            unassigned.append((r[0], r[1]))
+        elif r[col] in wanted:
+            by_resource.setdefault(r[col], []).append((r[0], r[1]))
+    return {k: merge_intervals(v) for k, v in by_resource.items()}, unassigned
+
+def _axis_resources(rows, col: int, resources: list[int]) -> list[list[Interval]]:
+    busy, unassigned = _axis(rows, col, resources)
+    return list(busy.values()) + [[span] for span in unassigned]
+
+def _blocked(rows, stations: list[int], consultants: list[int], consultant_id: int | None, duration: timedelta) -> list[Interval]:
+    """
+    Start times a new booking cannot take: no single station free for the
+    whole booking (more unassigned bookings than free stations counts too),
+    or the same for the requested consultant / the consultant pool. Stores
+    without stations take one booking at a time.
+    rows are (start, end, station_id, consultant_id) for non-cancelled bookings.
+    """
+    if stations:
+        blocked = blocked_starts(_axis_resources(rows, 2, stations), len(stations), duration)
+    else:
+        blocked = blocked_starts([[(r[0], r[1]) for r in rows]], 1, duration)
+    if consultant_id:
+        blocked += blocked_starts([[(r[0], r[1]) for r in rows if r[3] == consultant_id]], 1, duration)
+    elif consultants:
+        blocked += blocked_starts(_axis_resources(rows, 3, consultants), len(consultants), duration)
+    return union_open(blocked)
+
+def _booking_rows(session: Session, store_id: int, start: datetime, end: datetime):
+    stmt = select(Booking.scheduled_start_at, Booking.scheduled_end_at, Booking.station_id, Booking.consultant_id).where(
+        Booking.store_id==store_id,
+        Booking.scheduled_start_at>=start - MAX_BOOKING_SPAN,
+        Booking.scheduled_start_at<end,
+        Booking.scheduled_end_at>start,
+        Booking.status!=BookingStatus.CANCELLED,
+    ).order_by(Booking.scheduled_start_at)
+    return session.exec(stmt).all()
+
+def list_available_start_times(session: Session, *, store_id: int, service_id: int, d: date, consultant_id: int | None = None, slot_minutes: int = SLOT_MINUTES) -> list[str]:
+    days = list_available_range(session, store_id=store_id, service_id=service_id, start=d, days=1, consultant_id=consultant_id, slot_minutes=slot_minutes)
+    return days.get(d.isoformat(), [])
+
+def list_available_range(session: Session, *, store_id: int, service_id: int, start: date, days: int, consultant_id: int | None = None, slot_minutes: int = SLOT_MINUTES) -> dict[str, list[str]]:
+    """
+    Free start times for every day in [start, start + days), keyed by ISO date.
+    A slot is free while one station (and one consultant, or the requested
+    consultant) is free for the whole service, the same rule
+    assign_resources books by. Query count does not depend on `days`.
+    """
+    svc = session.get(Service, service_id)
+    if not svc or not svc.active or days <= 0:
+        return {}
+    hours_by_dow: dict[int, StoreHours] = {}
+    for h in session.exec(select(StoreHours).where(StoreHours.store_id==store_id, StoreHours.active==True)).all():
+        hours_by_dow.setdefault(h.day_of_week, h)
+    if not hours_by_dow:
+        return {}
+
+    range_start = datetime.combine(start, time.min)
+    range_end = range_start + timedelta(days=days)
+    duration = timedelta(minutes=svc.duration_minutes)
+    stations, consultants = store_resources(session, store_id)
+    blocked = _blocked(_booking_rows(session, store_id, range_start, range_end), stations, consultants, consultant_id, duration)
+    blocked_ends = [e for _, e in blocked]
+
+    step = timedelta(minutes=slot_minutes)
+    out: dict[str, list[str]] = {}
+    for i in range(days):
+        d = start + timedelta(days=i)
+        hours = hours_by_dow.get(d.weekday())
+        if not hours:
+            out[d.isoformat()] = []
+            continue
+        open_at = datetime.combine(d, hours.open_time)
+        close_at = datetime.combine(d, hours.close_time)
+        lo = bisect_right(blocked_ends, open_at)
+        slots = free_start_times(open_at, close_at, duration, blocked[lo:], step)
+        out[d.isoformat()] = [s.strftime("%H:%M") for s in slots]
+    return out
+
+def _pick(candidates: list[int], busy: dict[int, list[Interval]], unassigned: list[Interval], start: datetime, end: datetime, load: dict[int, float]) -> int | None:
+    """
+    Least-loaded resource free for all of [start, end) (first-fit on ties).
+    Bookings without an assignment on this axis still hold *some* resource,
+    so that many free candidates are kept in reserve.
+    """
+    overlaps = lambda spans: any(s < end and e > start for s, e in spans)
+    free = [c for c in candidates if not overlaps(busy.get(c, ()))]
+    if len(free) <= sum(s < end and e > start for s, e in unassigned):
+        return None
+    return min(free, key=lambda c: (load.get(c, 0.0), candidates.index(c)))
+
+def assign_resources(session: Session, *, store_id: int, start: datetime, end: datetime, consultant_id: int | None = None) -> tuple[int | None, int | None] | None:
+    """
+    Choose (station_id, consultant_id) for a new booking over [start, end).
+    Returns None when the store has no free capacity for that window, by
+    the same per-resource rule list_available_range lists slots with.
+    A requested consultant is kept as-is; otherwise the least-loaded free
+    consultant of the day is picked. Stores without stations/consultants
+    configured get None on that axis.
+    """
+    stations, consultants = store_resources(session, store_id)
+    day_start = datetime.combine(start.date(), time.min)
+    rows = _booking_rows(session, store_id, min(day_start, start), max(day_start + timedelta(days=1), end))
+
+    station_load: dict[int, float] = {}
+    consultant_load: dict[int, float] = {}
+    for s, e, st, co in rows:
+        minutes = (e - s).total_seconds() / 60
+        if st is not None:
+            station_load[st] = station_load.get(st, 0.0) + minutes
+        if co is not None:
+            consultant_load[co] = consultant_load.get(co, 0.0) + minutes
+
+    if stations:
+        station_id = _pick(stations, *_axis(rows, 2, stations), start, end, station_load)
+        if station_id is None:
+            return None
+    else:
+        station_id = None
+        if any(s < end and e > start for s, e, _, _ in rows):
+            return None
+
+    if consultant_id:
+        if any(s < end and e > start and co == consultant_id for s, e, _, co in rows):
+            return None
+    elif consultants:
+        consultant_id = _pick(consultants, *_axis(rows, 3, consultants), start, end, consultant_load)
+        if consultant_id is None:
+            return None
+    return station_id, consultant_id
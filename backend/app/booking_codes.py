@@ -0,0 +1,72 @@
+from __future__ import annotations
+import secrets
+from sqlmodel import Session, select
+from .models import Booking
+
+# Crockford base32: no I, L, O or U, so codes survive being read aloud or retyped.
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_INDEX = {c: i for i, c in enumerate(ALPHABET)}
+_ALIASES = str.maketrans({"O": "0", "I": "1", "L": "1"})
+
+RANDOM_CHARS = 7          # 35 bits per store prefix
+BODY_CHARS = RANDOM_CHARS + 1
+MAX_ATTEMPTS = 5
+
+class BookingCodeExhausted(RuntimeError):
+    """No free code found within MAX_ATTEMPTS draws."""
+
+def _encode(n: int, width: int = 0) -> str:
+    out = ""
+    while n:
+        n, r = divmod(n, 32)
+        out = ALPHABET[r] + out
+    return out.rjust(width, "0") or "0"
+
+def _check_char(chars: str) -> str:
+    # Luhn mod 32: catches every single-character error and most adjacent swaps.
+    total, factor = 0, 2
+    for c in reversed(chars):
+        addend = factor * _INDEX[c]
+        total += addend // 32 + addend % 32
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(32 - total % 32) % 32]
+
+def store_prefix(store_id: int) -> str:
+    return "B" + _encode(store_id)
+
+def generate_code(store_id: int) -> str:
+    """e.g. B1-K7Q3-XM9C: store prefix, 7 random chars, 1 check char."""
+    prefix = store_prefix(store_id)
+    body = _encode(secrets.randbits(5 * RANDOM_CHARS), RANDOM_CHARS)
+    body += _check_char(prefix + body)
+    return f"{prefix}-{body[:4]}-{body[4:]}"
+
+def normalize_code(raw: str) -> str | None:
+    """
+    Canonical form of a code typed at the counter (case, spaces, hyphens and
+    O/I/L look-alikes are forgiven), or None if the check character fails.
+    """
+    chars = "".join(raw.split()).replace("-", "").upper().translate(_ALIASES)
+    prefix, body = chars[:-BODY_CHARS], chars[-BODY_CHARS:]
+    if len(body) != BODY_CHARS or not prefix.startswith("B") or any(c not in _INDEX for c in chars[1:]):
+        return None
+    if _check_char(prefix + body[:-1]) != body[-1]:
+        return None
+    return f"{prefix}-{body[:4]}-{body[4:]}"
+
+def new_booking_code(session: Session, store_id: int) -> str:
+    """Draw codes until one is unused (unique index lookup), up to MAX_ATTEMPTS."""
+    for _ in range(MAX_ATTEMPTS):
+        code = generate_code(store_id)
+        if session.exec(select(Booking.id).where(Booking.booking_code==code)).first() is None:
+            return code
+    raise BookingCodeExhausted(f"No free booking code for store {store_id} after {MAX_ATTEMPTS} attempts")
+
+def find_by_code(session: Session, raw: str) -> Booking | None:
+    """O(1) lookup on the unique booking_code index; legacy BO-1234 codes still match as typed."""
+    code = normalize_code(raw)
+    if code is not None:
+        booking = session.exec(select(Booking).where(Booking.booking_code==code)).first()
+        if booking:
+            return booking
+    return session.exec(select(Booking).where(Booking.booking_code==raw.strip().upper())).first()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+import base64, hashlib, hmac, struct
+from dataclasses import dataclass, replace
+from datetime import date, time, timedelta
+
+from .config import settings
+
+# Telegram rejects callback_data over 64 bytes.
+MAX_BYTES = 64
+
+ACTIONS = ("store", "cat", "search", "service", "consultant", "date", "time", "confirm")
+_ACTION_CODE = {a: i for i, a in enumerate(ACTIONS)}
+
+# action, store, category key (NO_CATEGORY = none), service, consultant (0 = auto), days since EPOCH (0 = none), minute of day (NO_MINUTE = none)
+_LAYOUT = struct.Struct(">BHIIIHH")
+_MAC_BYTES = 8
+EPOCH = date(2000, 1, 1)
+NO_MINUTE = 0xFFFF
+NO_CATEGORY = 0
+
+_key = hashlib.sha256(b"bontle-callback:" + (settings.telegram_callback_secret or settings.jwt_secret).encode()).digest()
+
+
+@dataclass(frozen=True, slots=True)
+class Tap:
+    """
+    One inline-button press with everything chosen so far in the booking
+    flow, so a tap can be handled by any worker without session state.
+    The category travels as category_key(name), which stays valid while the
+    category exists, however long the button sat in the chat.
+    """
+    action: str
+    store_id: int = 0
+    category: int | None = None
+    service_id: int = 0
+    consultant_id: int | None = None
+    day: date | None = None
+    at: time | None = None
+
+    def to(self, action: str, **changes) -> "Tap":
+        return replace(self, action=action, **changes)
+
+
+def category_key(name: str) -> int:
+    """Stable 32-bit key of a category name; handlers match it against the current catalog."""
+    return int.from_bytes(hashlib.blake2s(name.encode(), digest_size=4).digest()) or 1
+
+
+def _mac(payload: bytes) -> bytes:
+    return hmac.new(_key, payload, hashlib.sha256).digest()[:_MAC_BYTES]
+
+
+def encode(tap: Tap) -> str:
+    payload = _LAYOUT.pack(
+        _ACTION_CODE[tap.action],
+        tap.store_id,
+        NO_CATEGORY if tap.category is None else tap.category,
+        tap.service_id,
+        tap.consultant_id or 0,
+        (tap.day - EPOCH).days if tap.day else 0,
+        tap.at.hour * 60 + tap.at.minute if tap.at else NO_MINUTE,
+    )
+    data = base64.urlsafe_b64encode(payload + _mac(payload)).rstrip(b"=").decode()
+    if len(data) > MAX_BYTES:
+        raise ValueError(f"callback_data is {len(data)} bytes, over Telegram's {MAX_BYTES}")
+    return data
+
+
+def decode(data: str) -> Tap | None:
+    """The Tap behind callback_data, or None if it is malformed, tampered with, or from an older format."""
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (ValueError, TypeError):
+        return None
+    if len(raw) != _LAYOUT.size + _MAC_BYTES:
+        return None
+    payload, mac = raw[:_LAYOUT.size], raw[_LAYOUT.size:]
+    if not hmac.compare_digest(mac, _mac(payload)):
+        return None
+    action, store_id, category, service_id, consultant_id, days, minute = _LAYOUT.unpack(payload)
+    if action >= len(ACTIONS) or (minute != NO_MINUTE and minute >= 24 * 60):
+        return None
+    return Tap(
+        action=ACTIONS[action],
+        store_id=store_id,
+        category=None if category == NO_CATEGORY else category,
+        service_id=service_id,
+        consultant_id=consultant_id or None,
+        day=EPOCH + timedelta(days=days) if days else None,
+        at=None if minute == NO_MINUTE else time(minute // 60, minute % 60),
+    )
@@ -0,0 +1,153 @@
+from __future__ import annotations
+import asyncio, logging, threading, time
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from .config import settings
+from .db import engine
+from .models import Store, Service, StaffUser, Role
+
+logger = logging.getLogger(__name__)
+
+# Row types whose changes invalidate the cached catalog.
+CATALOG_MODELS = (Store, Service, StaffUser)
+
+
+class CatalogSnapshot:
+    """Immutable view of the active catalog. Rows are detached ORM objects: read them, never mutate them."""
+
+    def __init__(self, version: int, stores: list[Store], services: list[Service], consultants: list[StaffUser]):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.stores = tuple(stores)
+        self.store_by_id = {s.id: s for s in stores}
+        self.service_by_id = {s.id: s for s in services}
+        self.consultant_by_id = {c.id: c for c in consultants}
+
+        by_store: dict[int, list[Service]] = {}
+        for svc in services:
+            by_store.setdefault(svc.store_id, []).append(svc)
+        self.services_by_store = {k: tuple(v) for k, v in by_store.items()}
+        self.categories_by_store = {k: tuple(sorted({s.category for s in v})) for k, v in by_store.items()}
+
+        staff: dict[int, list[StaffUser]] = {}
+        for c in consultants:
+            staff.setdefault(c.store_id, []).append(c)
+        self.consultants_by_store = {k: tuple(v) for k, v in staff.items()}
+
+    def categories(self, store_id: int) -> tuple[str, ...]:
+        return self.categories_by_store.get(store_id, ())
+
+    def services(self, store_id: int, category: str | None = None, q: str | None = None) -> list[Service]:
+        out = list(self.services_by_store.get(store_id, ()))
+        if category:
+            out = [s for s in out if s.category == category]
+        if q:
+            needle = q.lower()
+            out = [s for s in out if needle in s.name.lower()]
+        return out
+
+    def consultants(self, store_id: int) -> tuple[StaffUser, ...]:
+        return self.consultants_by_store.get(store_id, ())
+
+
+def _load(version: int) -> CatalogSnapshot:
+    with Session(engine) as session:
+        stores = session.exec(select(Store).where(Store.is_active==True).order_by(Store.name)).all()
+        services = session.exec(select(Service).where(Service.active==True).order_by(Service.name)).all()
+        consultants = session.exec(select(StaffUser).where(StaffUser.role==Role.CONSULTANT, StaffUser.is_active==True).order_by(StaffUser.id)).all()
+        session.expunge_all()
+    return CatalogSnapshot(version, stores, services, consultants)
+
+
+class CatalogCache:
+    """
+    Process-wide catalog with TTL and explicit invalidation. Readers get the
+    current snapshot reference. Once a snapshot exists no reader waits for a
+    reload: an expired or invalidated snapshot is served stale while one
+    background thread rebuilds it. Only the very first load blocks, so async
+    callers use snapshot_async() (and startup warms the cache).
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: CatalogSnapshot | None = None
+        self._version = 0
+        self._rebuild_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.invalidations = 0
+
+    def _fresh(self, snap: CatalogSnapshot | None) -> bool:
+        return snap is not None and snap.version == self._version and time.monotonic() - snap.loaded_at < self.ttl_seconds
+
+    def snapshot(self) -> CatalogSnapshot:
+        snap = self._snapshot
+        if self._fresh(snap):
+            self.hits += 1
+            return snap
+        if snap is not None:
+            self.stale_hits += 1
+            if self._rebuild_lock.acquire(blocking=False):
+                threading.Thread(target=self._rebuild, name="catalog-reload", daemon=True).start()
+            return snap
+        with self._rebuild_lock:
+            if self._snapshot is None:
+                self.misses += 1
+                self._snapshot = _load(self._version)
+            return self._snapshot
+
+    async def snapshot_async(self) -> CatalogSnapshot:
+        """snapshot() for the event loop: a cold first load runs on a worker thread."""
+        if self._snapshot is not None:
+            return self.snapshot()
+        return await asyncio.to_thread(self.snapshot)
+
+    def _rebuild(self) -> None:
+        # Runs with _rebuild_lock held (taken by the reader that started it).
+        try:
+            self.misses += 1
+            self._snapshot = _load(self._version)
+        except Exception:
+            logger.exception("Catalog reload failed; serving the previous snapshot")
+        finally:
+            self._rebuild_lock.release()
+
+    def invalidate(self) -> None:
+        self._version += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "invalidations": self.invalidations,
+            "age_seconds": round(time.monotonic() - snap.loaded_at, 1) if snap else None,
+        }
+
+
+catalog = CatalogCache(ttl_seconds=settings.catalog_cache_ttl_seconds)
+
+
+# ─── Invalidation hooks ──────────────────────────────────────────────
+# Flag catalog writes during flush, invalidate once they are committed.
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_dirty(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CATALOG_MODELS):
+            session.info["catalog_dirty"] = True
+            return
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("catalog_dirty", False):
+        catalog.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop("catalog_dirty", None)
@@ -6,6 +6,19 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
     database_url: str | None = None
+    db_executor_workers: int = 8  # threads for DB work issued from async handlers
+
+    # Engine / pool profile (per uvicorn worker)
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: int = 30
+    db_pool_recycle_seconds: int = 1800  # below typical server/proxy idle cutoffs
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 15000  # Postgres only; 0 disables
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
     jwt_secret: str = "change-me"
     jwt_access_minutes: int = 30
     jwt_refresh_days: int = 7
@@ -14,10 +27,68 @@ class Settings(BaseSettings):
     telegram_bot_token: str | None = None
     telegram_webhook_secret: str = ""  # empty string means "no secret enforcement"
     public_base_url: str = "http://localhost:8000"
+    telegram_ingest_mode: str = "queue"  # "queue" acks webhooks at once; "inline" processes before replying
+    telegram_workers: int = 16  # updates handled at once in queue mode; bounds its throughput (see .env.example)
+    telegram_queue_size: int = 1000
+    telegram_dedup_size: int = 10000  # recent update_ids remembered in memory
+    telegram_dedup_persistent: bool = False  # also claim update_ids in the DB (multi-worker)
+    telegram_callback_secret: str = ""  # signs inline-button payloads; empty falls back to jwt_secret
+    conversation_store: str = "sql"  # "sql" shares booking-flow state across workers/restarts; "memory" is per process
+    conversation_ttl_minutes: int = 120  # abandoned flows expire after this
+    conversation_prune_seconds: int = 600  # how often expired flows are deleted from the store; 0 disables
+
+    # Outbound Bot API calls: shared keep-alive pool and rate limits
+    telegram_http_pool_size: int = 64
+    telegram_keepalive_seconds: float = 30.0
+    telegram_connect_timeout_seconds: float = 5.0
+    telegram_read_timeout_seconds: float = 10.0
+    telegram_pool_timeout_seconds: float = 10.0  # waiting for a free connection when every one is busy
+    telegram_global_rate: float = 30.0  # messages/s for the whole bot
+    telegram_chat_rate: float = 1.0  # messages/s per private chat
+    telegram_chat_burst: float = 3.0
+    telegram_group_per_minute: float = 20.0
+    telegram_max_retries: int = 3  # retries after a 429 before the call fails
+    telegram_batch_concurrency: int = 8  # sends a batch keeps in flight; more only queue ahead of interactive replies
+
+    # Event log: "transactional" writes events in the caller's commit,
+    # "write_behind" buffers them and bulk-inserts in the background.
+    event_log_mode: str = "transactional"  # "write_behind" trades crash safety for a modest gain; see .env.example
+    event_log_batch_size: int = 500
+    event_log_flush_seconds: float = 1.0
+
+    # Analytics rollups behind the Power BI views; 0 disables the periodic refresh.
+    rollup_refresh_seconds: int = 60
+
+    # Live queue stream (SSE) for staff tablets
+    queue_stream_buffer: int = 256  # messages a slow subscriber may lag before it is resynced
+    queue_stream_heartbeat_seconds: int = 15
+    queue_stream_ticket_seconds: int = 60  # lifetime of the ?ticket= a tablet opens (or reopens) the stream with
+
+    # Booking reminders, sent this many hours before the start ("24,2"); empty disables.
+    reminder_hours: str = "24,2"
+    reminder_interval_seconds: int = 60
+    reminder_batch_size: int = 500  # bookings claimed per window per tick
+
+    # No-show sweeper: SCHEDULED/ARRIVED bookings this long past their end become NO_SHOW; 0 disables.
+    no_show_sweep_seconds: int = 300
+    no_show_grace_minutes: int = 30
+    no_show_sweep_batch: int = 1000  # rows per UPDATE (one short transaction each)
+    no_show_sweep_stores: int = 50  # stores per chunk
+    no_show_sweep_pause_ms: int = 50  # between full batches, so other writers get the lock
+
+    # In-process caches
+    catalog_cache_ttl_seconds: int = 300
+    principal_cache_ttl_seconds: int = 60  # how long a deactivation/role change takes to reach other workers
+    principal_cache_size: int = 10000
+    kpi_ttl_seconds: int = 30  # daily KPI counters re-read from the DB after this (other workers, bulk SQL)
 
     # CORS
     cors_origins: str = "http://localhost:5173"
 
+    @property
+    def reminder_hour_list(self) -> List[int]:
+        return [int(h) for h in self.reminder_hours.split(",") if h.strip()]
+
     @property
     def cors_origin_list(self) -> List[str]:
         return [o.strip() for o in self.cors_origins.split(",") if o.strip()]
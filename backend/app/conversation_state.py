@@ -0,0 +1,141 @@
+from __future__ import annotations
+import functools, json, threading, time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session
+
+from .config import settings
+from .db import run_in_session
+from .models import ConversationState
+
+# Short keys for the persisted fields (the rest of the flow rides in callback_data);
+# anything else is stored under its own name.
+_SHORT = {"store_id": "s"}
+_LONG = {v: k for k, v in _SHORT.items()}
+
+
+def _pack(data: dict) -> str:
+    return json.dumps({_SHORT.get(k, k): v for k, v in data.items()}, separators=(",", ":"))
+
+def _unpack(raw: str) -> dict:
+    return {_LONG.get(k, k): v for k, v in json.loads(raw).items()}
+
+
+class _Counters:
+    loads = saves = unchanged = 0
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "loads": self.loads, "saves": self.saves, "unchanged": self.unchanged}
+
+
+class SqlConversationStore(_Counters):
+    """Conversation state in the conversationstate table, so any worker can continue any flow."""
+
+    def __init__(self, ttl: timedelta):
+        self.ttl = ttl
+
+    def _load(self, session: Session, user_id: int) -> dict:
+        row = session.get(ConversationState, user_id)
+        if row is None or row.updated_at < datetime.utcnow() - self.ttl:
+            return {}
+        return _unpack(row.data)
+
+    def _save(self, session: Session, user_id: int, data: dict) -> None:
+        if data:
+            session.merge(ConversationState(user_id=user_id, data=_pack(data), updated_at=datetime.utcnow()))
+        else:
+            session.exec(delete(ConversationState).where(ConversationState.user_id==user_id))
+        session.commit()
+
+    async def load(self, user_id: int) -> dict:
+        self.loads += 1
+        return await run_in_session(self._load, user_id)
+
+    async def save(self, user_id: int, data: dict) -> None:
+        self.saves += 1
+        await run_in_session(self._save, user_id, data)
+
+    async def prune(self) -> dict:
+        """Delete expired flows (a JobRunner job)."""
+        return {"pruned": await run_in_session(prune_conversations, self.ttl)}
+
+
+class MemoryConversationStore(_Counters):
+    """Single-process stand-in with the same interface and expiry, for local runs."""
+
+    def __init__(self, ttl: timedelta):
+        self.ttl = ttl.total_seconds()
+        self._rows: dict[int, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    async def load(self, user_id: int) -> dict:
+        self.loads += 1
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is not None and time.monotonic() - row[1] > self.ttl:
+                del self._rows[user_id]
+                row = None
+        return _unpack(row[0]) if row else {}
+
+    async def save(self, user_id: int, data: dict) -> None:
+        self.saves += 1
+        with self._lock:
+            if data:
+                self._rows[user_id] = (_pack(data), time.monotonic())
+            else:
+                self._rows.pop(user_id, None)
+
+    async def prune(self) -> dict:
+        """Drop expired flows, including those of users who never came back (a JobRunner job)."""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [user_id for user_id, (_, at) in self._rows.items() if at < cutoff]
+            for user_id in expired:
+                del self._rows[user_id]
+        return {"pruned": len(expired)}
+
+
+def prune_conversations(session: Session, ttl: timedelta | None = None) -> int:
+    """Delete flows abandoned for longer than the TTL."""
+    ttl = ttl or timedelta(minutes=settings.conversation_ttl_minutes)
+    result = session.exec(delete(ConversationState).where(ConversationState.updated_at < datetime.utcnow() - ttl))
+    session.commit()
+    return result.rowcount
+
+
+def _make_store():
+    ttl = timedelta(minutes=settings.conversation_ttl_minutes)
+    return MemoryConversationStore(ttl) if settings.conversation_store == "memory" else SqlConversationStore(ttl)
+
+conversation_store = _make_store()
+
+
+async def save_conversation(user_id: int, data: dict) -> None:
+    """Write a user's state outside a with_conversation_state handler."""
+    await conversation_store.save(user_id, data)
+
+
+def with_conversation_state(handler):
+    """
+    Load the user's state into context.user_data before the handler runs and
+    write it back once afterwards, only if the handler changed it. A flow
+    therefore survives restarts and can continue on any worker.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None:
+            return await handler(update, context)
+        store = conversation_store
+        state = await store.load(user.id)
+        context.user_data.clear()
+        context.user_data.update(state)
+        try:
+            return await handler(update, context)
+        finally:
+            if context.user_data != state:
+                await store.save(user.id, dict(context.user_data))
+            else:
+                store.unchanged += 1
+    return wrapper
@@ -1,14 +1,117 @@
-from sqlmodel import SQLModel, create_engine
+import asyncio, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import Enum, event
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlmodel import SQLModel, Session, create_engine
 from .config import settings
 
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - t0
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return conn
+
+    def recreate(self):
+        # dispose()/invalidation rebuilds the pool; keep the counters running.
+        new = super().recreate()
+        new.checkouts, new.timeouts, new.wait_total, new.wait_max = self.checkouts, self.timeouts, self.wait_total, self.wait_max
+        return new
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cur.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cur.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cur.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cur.close()
+
 def get_engine():
-    url = (settings.database_url or "").strip()
-    if not url:
-        url = "sqlite:///./bontle.db"
-        return create_engine(url, echo=False, connect_args={"check_same_thread": False})
-    return create_engine(url, echo=False)
+    url = (settings.database_url or "").strip() or "sqlite:///./bontle.db"
+    if url.startswith("sqlite"):
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # In-memory: each connection is its own empty database, so every thread
+            # (run_in_session's executor included) shares one connection via StaticPool.
+            # Pool settings don't apply.
+            return create_engine(url, echo=False, poolclass=StaticPool, connect_args={"check_same_thread": False})
+        eng = create_engine(
+            url, echo=False, poolclass=TimedQueuePool,
+            pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds, pool_pre_ping=settings.db_pool_pre_ping,
+            connect_args={"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000},
+        )
+        event.listen(eng, "connect", _sqlite_pragmas)
+        return eng
+    connect_args = {}
+    if settings.db_statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={int(settings.db_statement_timeout_ms)}"
+    return create_engine(
+        url, echo=False, poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds, pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping, connect_args=connect_args,
+    )
 
 engine = get_engine()
 
 def init_db():
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist, so indexes added to a model
+    # later are created here.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    if engine.dialect.name == "postgresql":
+        # Likewise enum members added later (e.g. EventType.REMINDER_SENT) for
+        # native enum types. ADD VALUE cannot run inside a transaction block.
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            enums = {c.type.name: c.type.enums for t in SQLModel.metadata.sorted_tables for c in t.columns if isinstance(c.type, Enum) and c.type.native_enum}
+            for name, values in enums.items():
+                for value in values:
+                    conn.exec_driver_sql(f"ALTER TYPE {name} ADD VALUE IF NOT EXISTS '{value}'")
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    out = {"dialect": engine.dialect.name, "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        out.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(), idle=pool.checkedin())
+    if isinstance(pool, TimedQueuePool):
+        out.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_avg_ms=round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            wait_max_ms=round(pool.wait_max * 1000, 3),
+        )
+    return out
+
+# Async handlers (the Telegram bot) must not run blocking queries on the event
+# loop it shares with FastAPI, so their DB work goes through this bounded pool.
+_db_executor = ThreadPoolExecutor(max_workers=settings.db_executor_workers, thread_name_prefix="bontle-db")
+
+async def run_in_session(fn, /, *args, **kwargs):
+    """Await fn(session, *args, **kwargs) executed on the DB thread pool with its own Session."""
+    def call():
+        with Session(engine) as session:
+            return fn(session, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, call)
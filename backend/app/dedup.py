@@ -0,0 +1,105 @@
+from __future__ import annotations
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from .db import run_in_session
+from .models import ProcessedUpdate
+
+logger = logging.getLogger(__name__)
+
+PRUNE_EVERY = 1000
+RETENTION = timedelta(days=2)  # Telegram stops redelivering well within this
+
+
+def _claim(session: Session, update_id: int) -> bool:
+    session.add(ProcessedUpdate(update_id=update_id))
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+def _release(session: Session, update_id: int) -> None:
+    session.exec(delete(ProcessedUpdate).where(ProcessedUpdate.update_id==update_id))
+    session.commit()
+
+def prune_processed_updates(session: Session, retention: timedelta = RETENTION) -> int:
+    result = session.exec(delete(ProcessedUpdate).where(ProcessedUpdate.received_at < datetime.utcnow() - retention))
+    session.commit()
+    return result.rowcount
+
+
+class UpdateDeduplicator:
+    """
+    Drops Telegram redeliveries before any handler or DB work runs.
+
+    A bounded LRU of recent update_ids answers most replays in memory. With
+    `persistent=True` the first sighting is also claimed in the
+    processedupdate table, so a replay landing on another worker is caught
+    by the primary key. Check-and-mark happens without an await in between,
+    so concurrent replays in one process cannot both pass.
+    """
+
+    def __init__(self, size: int = 10000, persistent: bool = False):
+        self.size = size
+        self.persistent = persistent
+        self._recent: OrderedDict[int, None] = OrderedDict()
+        self._claims = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.persistent_duplicates = 0
+
+    def _remember(self, update_id: int) -> bool:
+        if update_id in self._recent:
+            self._recent.move_to_end(update_id)
+            return False
+        self._recent[update_id] = None
+        if len(self._recent) > self.size:
+            self._recent.popitem(last=False)
+        return True
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        if not self._remember(update_id):
+            self.duplicates += 1
+            return True
+        if self.persistent:
+            try:
+                claimed = await run_in_session(_claim, update_id)
+            except Exception:
+                # Lock/pool/statement timeouts: nothing was claimed, so let Telegram's retry through.
+                self._recent.pop(update_id, None)
+                raise
+            if not claimed:
+                self.duplicates += 1
+                self.persistent_duplicates += 1
+                return True
+            self._claims += 1
+            if self._claims % PRUNE_EVERY == 0:
+                try:
+                    await run_in_session(prune_processed_updates)
+                except Exception:
+                    # The update is claimed; failing it now would turn its redelivery into a duplicate.
+                    logger.exception("Pruning processed updates failed")
+        self.accepted += 1
+        return False
+
+    async def forget(self, update_id: int) -> None:
+        """Undo a mark when we did not take the update (e.g. 503), so Telegram's retry is accepted."""
+        self._recent.pop(update_id, None)
+        if self.persistent:
+            await run_in_session(_release, update_id)
+
+    def stats(self) -> dict:
+        return {
+            "persistent": self.persistent,
+            "tracked": len(self._recent),
+            "accepted": self.accepted,
+            "duplicates_dropped": self.duplicates,
+            "persistent_duplicates": self.persistent_duplicates,
+        }
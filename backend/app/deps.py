@@ -1,11 +1,11 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from typing import Annotated
-from sqlmodel import Session, select
+from sqlmodel import Session
 from jose import JWTError
 
 from .db import engine
-from .models import StaffUser
+from .principal_cache import InactiveUser, Principal, principals
 from .security import decode_token
 
 
@@ -23,26 +23,38 @@ def get_session():
         yield session
 
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    session: Annotated[Session, Depends(get_session)],
-) -> StaffUser:
+def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Principal:
     """
     Validate JWT access token and return the current active user.
     Raises 401 if token is invalid, expired, wrong type, or user not found/inactive.
     """
+    return principal_from_token(token)
+
+
+def get_stream_user(ticket: Annotated[str, Query()], store_id: Annotated[int, Query()]) -> Principal:
+    """
+    For EventSource, which cannot send headers: a stream ticket from
+    POST /queue/stream-ticket in ?ticket=, valid only for its store's stream.
+    Access tokens are refused here so they never end up in a URL.
+    """
+    return principal_from_token(ticket, token_type="stream", store_id=store_id)
+
+
+def principal_from_token(token: str, token_type: str = "access", store_id: int | None = None) -> Principal:
+    """The token is checked on every call; the user behind it comes from the principal cache."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-
     try:
         data = decode_token(token)
     except JWTError as exc:
         raise credentials_exception from exc
 
-    if data.get("type") != "access":
+    if data.get("type") != token_type:
+        raise credentials_exception
+    if token_type == "stream" and data.get("store_id") != store_id:
         raise credentials_exception
 
     user_id_str = data.get("sub")
@@ -54,15 +66,15 @@ def get_current_user(
     except ValueError:
         raise credentials_exception
 
-    user = session.exec(select(StaffUser).where(StaffUser.id == user_id)).first()
-
-    if not user:
-        raise credentials_exception
-
-    if not user.is_active:
+    # Neither missing nor inactive users are cached, so both are re-checked every time.
+    try:
+        user = principals.get(user_id)
+    except InactiveUser:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Inactive user"
         )
+    if user is None:
+        raise credentials_exception
 
     return user
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import logging, threading, time
+
+from sqlalchemy import event, insert
+from sqlmodel import Session
+
+from .config import settings
+from .db import engine
+from .models import EventLog
+
+logger = logging.getLogger(__name__)
+
+
+class EventLogWriter:
+    """
+    Write-behind buffer for EventLog rows.
+
+    Rows are queued only once the business change they describe has
+    committed (see the session hooks below) and a background thread writes
+    them with one bulk INSERT per batch, when `batch_size` rows are waiting
+    or `flush_interval` seconds have passed. A buffer that grows past
+    `max_buffer` (database down or slow) is flushed by the caller instead,
+    which pushes back on writers rather than growing without bound.
+    Events still buffered when the process dies are lost; stop() flushes.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, max_buffer: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: list[dict] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self.queued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+
+    def append(self, rows: list[dict]) -> None:
+        with self._cond:
+            self._buffer.extend(rows)
+            self.queued += len(rows)
+            depth = len(self._buffer)
+            if depth >= self.batch_size:
+                self._cond.notify()
+        if depth >= self.max_buffer or self._thread is None:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._cond:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                with Session(engine) as session:
+                    session.execute(insert(EventLog), rows)
+                    session.commit()
+            except Exception:
+                self.failed_flushes += 1
+                logger.exception("Event log flush of %s rows failed", len(rows))
+                with self._cond:
+                    # Keep them for the next attempt unless that would blow the bound.
+                    if len(self._buffer) + len(rows) <= self.max_buffer:
+                        self._buffer[:0] = rows
+                return 0
+            self.flushes += 1
+            self.written += len(rows)
+            self.last_flush_ms = round((time.perf_counter() - t0) * 1000, 2)
+            return len(rows)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="bontle-event-log", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "mode": settings.event_log_mode,
+            "buffered": len(self._buffer),
+            "queued": self.queued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+event_log_writer = EventLogWriter(
+    batch_size=settings.event_log_batch_size,
+    flush_interval=settings.event_log_flush_seconds,
+)
+
+
+# ─── Session hooks ───────────────────────────────────────────────────
+# Write-behind events ride on the session until its transaction commits, so
+# a rolled-back change never leaves an event behind.
+@event.listens_for(Session, "after_commit")
+def _enqueue_on_commit(session):
+    rows = session.info.pop("pending_events", None)
+    if rows:
+        event_log_writer.append(rows)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    session.info.pop("pending_events", None)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import asyncio, logging, time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    def __init__(self, name: str, interval: float, fn: Callable[[], Awaitable[dict | None]]):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.task: asyncio.Task | None = None
+        self.runs = 0
+        self.failures = 0
+        self.last: dict | None = None
+        self.last_ms = 0.0
+
+    async def loop(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                self.last = await self.fn()
+                self.runs += 1
+            except Exception:
+                self.failures += 1
+                logger.exception("Job %s failed", self.name)
+            self.last_ms = round((time.perf_counter() - t0) * 1000, 1)
+            await asyncio.sleep(max(0.0, self.interval - self.last_ms / 1000))
+
+    def stats(self) -> dict:
+        return {"interval_seconds": self.interval, "runs": self.runs, "failures": self.failures, "last_ms": self.last_ms, "last": self.last}
+
+
+class JobRunner:
+    """
+    In-process scheduler for periodic background work. Each job is an async
+    callable run every `interval` seconds on its own task, starting at once;
+    a run never overlaps the previous one and a failure is logged and retried
+    on the next tick. Jobs added after start() begin immediately.
+    Every worker runs its own jobs, so a job must be safe to run concurrently
+    in several processes (claim its work in the database).
+    """
+
+    def __init__(self):
+        self._jobs: dict[str, _Job] = {}
+        self._running = False
+
+    def add(self, name: str, interval: float, fn: Callable[[], Awaitable[dict | None]]) -> None:
+        job = self._jobs[name] = _Job(name, interval, fn)
+        if self._running:
+            job.task = asyncio.create_task(job.loop(), name=f"job-{name}")
+
+    def start(self) -> None:
+        self._running = True
+        for job in self._jobs.values():
+            if job.task is None:
+                job.task = asyncio.create_task(job.loop(), name=f"job-{job.name}")
+
+    async def stop(self) -> None:
+        self._running = False
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            job.task = None
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self._jobs.items()}
+
+
+job_runner = JobRunner()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import threading
+from typing import Callable
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from .callback_data import Tap, category_key, encode
+from .catalog_cache import catalog, CatalogSnapshot
+from .models import Service
+
+
+class PrerenderedKeyboard(InlineKeyboardMarkup):
+    """
+    InlineKeyboardMarkup that builds its API dict once. PTB calls to_dict()
+    on every send/edit; for shared menus that walk is the same every time.
+    The returned dict is shared - callers must not mutate it.
+    """
+
+    __slots__ = ("_rendered",)
+
+    def __init__(self, inline_keyboard, **kwargs):
+        super().__init__(inline_keyboard, **kwargs)
+        self._rendered = super().to_dict()
+
+    def to_dict(self, recursive: bool = True):
+        if not recursive:
+            return super().to_dict(recursive=False)
+        return self._rendered
+
+
+def service_label(s: Service) -> str:
+    return f"{s.name} • R{(s.price_cents/100):.0f} • {s.duration_minutes}m"
+
+
+def _btn(text: str, tap: Tap) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text, callback_data=encode(tap))
+
+def _stores(snap: CatalogSnapshot):
+    return [[_btn(s.name, Tap("store", s.id))] for s in snap.stores]
+
+def _categories(snap: CatalogSnapshot, store_id: int):
+    kb = [[_btn(c, Tap("cat", store_id, category=category_key(c)))] for c in snap.categories(store_id)]
+    kb.append([_btn("Search service 🔎", Tap("search", store_id))])
+    return kb
+
+def _services(snap: CatalogSnapshot, store_id: int, category: int):
+    name = next((c for c in snap.categories(store_id) if category_key(c) == category), None)
+    if name is None:
+        return None  # renamed or removed since the button was sent
+    services = snap.services(store_id, category=name)
+    kb = [[_btn(service_label(s), Tap("service", store_id, service_id=s.id))] for s in services[:12]]
+    kb.append([_btn("Search service 🔎", Tap("search", store_id))])
+    kb.append([_btn("⬅ Back", Tap("store", store_id))])
+    return kb
+
+def _consultants(snap: CatalogSnapshot, store_id: int, service_id: int):
+    pick = Tap("consultant", store_id, service_id=service_id)
+    kb = [[_btn("Skip (auto-assign)", pick)]]
+    kb += [[_btn(c.email.split("@")[0], pick.to("consultant", consultant_id=c.id))] for c in snap.consultants(store_id)[:10]]
+    svc = snap.service_by_id.get(service_id)
+    back = Tap("cat", store_id, category=category_key(svc.category)) if svc else Tap("store", store_id)
+    kb.append([_btn("⬅ Back", back)])
+    return kb
+
+
+class KeyboardCache:
+    """
+    Menus that are identical for every customer of a store, keyed by
+    (menu, store_id[, category key | service_id]) within one catalog snapshot. A new snapshot
+    (invalidation or TTL reload) drops everything; menus rebuild lazily.
+    A menu whose category no longer exists is None.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation: tuple | None = None
+        self._menus: dict[tuple, PrerenderedKeyboard] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, menu: str, build: Callable, *args) -> PrerenderedKeyboard | None:
+        snap = catalog.snapshot()
+        generation = (snap.version, snap.loaded_at)
+        key = (menu, *args)
+        with self._lock:
+            if generation != self._generation:
+                self._generation = generation
+                self._menus = {}
+            markup = self._menus.get(key)
+        if markup is not None:
+            self.hits += 1
+            return markup
+        self.misses += 1
+        rows = build(snap, *args)
+        if rows is None:
+            return None
+        markup = PrerenderedKeyboard(rows)
+        with self._lock:
+            if generation == self._generation:
+                self._menus[key] = markup
+        return markup
+
+    def stores(self) -> PrerenderedKeyboard:
+        return self._get("stores", _stores)
+
+    def categories(self, store_id: int) -> PrerenderedKeyboard:
+        return self._get("categories", _categories, store_id)
+
+    def services(self, store_id: int, category: int) -> PrerenderedKeyboard | None:
+        return self._get("services", _services, store_id, category)
+
+    def consultants(self, store_id: int, service_id: int) -> PrerenderedKeyboard:
+        return self._get("consultants", _consultants, store_id, service_id)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "cached_menus": len(self._menus)}
+
+
+keyboards = KeyboardCache()
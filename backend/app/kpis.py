@@ -0,0 +1,148 @@
+from __future__ import annotations
+import threading, time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func, inspect, select
+from sqlmodel import Session
+
+from .config import settings
+from .db import engine
+from .models import Booking, BookingStatus, Store
+
+FIELDS = ("bookings", "completed", "no_show", "cancelled")
+_STATUS_FIELD = {BookingStatus.COMPLETED: 1, BookingStatus.NO_SHOW: 2, BookingStatus.CANCELLED: 3}
+
+
+def _load(session: Session, start: datetime, end: datetime, store_id: int | None = None) -> dict[int, list[int]]:
+    stmt = select(Booking.store_id, Booking.status, func.count()).where(
+        Booking.scheduled_start_at>=start, Booking.scheduled_start_at<end,
+    ).group_by(Booking.store_id, Booking.status)
+    if store_id is not None:
+        stmt = stmt.where(Booking.store_id==store_id)
+    out: dict[int, list[int]] = {}
+    for sid, status, n in session.exec(stmt):
+        counts = out.setdefault(sid, [0, 0, 0, 0])
+        counts[0] += n
+        field = _STATUS_FIELD.get(BookingStatus(status))
+        if field:
+            counts[field] += n
+    return out
+
+
+class KpiCounters:
+    """
+    Daily booking counters per (store_id, day), kept in memory.
+
+    Entries are loaded from the DB on first use (today's for every store at
+    startup) and then moved by the session hooks below as bookings are
+    created or change status, so reads are dict lookups. Writes made
+    elsewhere (other workers, bulk SQL such as purge) are picked up when an
+    entry is older than `ttl_seconds` and reloaded.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._counts: dict[tuple[int, date], list[int]] = {}
+        self._loaded_at: dict[tuple[int, date], float] = {}
+        # Bumped by apply(); a load only stores its counts if the key's
+        # generation is unchanged since it began, so no committed delta is lost.
+        self._generations: dict[tuple[int, date], int] = {}
+        self.hits = 0
+        self.loads = 0
+        self.deltas = 0
+
+    def seed(self, d: date | None = None) -> None:
+        d = d or datetime.utcnow().date()
+        start = datetime.combine(d, datetime.min.time())
+        with self._lock:
+            generations = dict(self._generations)
+        with Session(engine) as session:
+            store_ids = session.exec(select(Store.id)).scalars().all()
+            loaded = _load(session, start, start + timedelta(days=1))
+        now = time.monotonic()
+        with self._lock:
+            for sid in store_ids:
+                key = (sid, d)
+                if self._generations.get(key, 0) == generations.get(key, 0):
+                    self._counts[key] = loaded.get(sid, [0, 0, 0, 0])
+                    self._loaded_at[key] = now
+
+    def get(self, store_id: int, d: date) -> dict[str, int]:
+        key = (store_id, d)
+        with self._lock:
+            counts = self._counts.get(key)
+            fresh = counts is not None and time.monotonic() - self._loaded_at[key] < self.ttl
+            if fresh:
+                self.hits += 1
+                return dict(zip(FIELDS, counts))
+            generation = self._generations.get(key, 0)
+        start = datetime.combine(d, datetime.min.time())
+        with Session(engine) as session:
+            counts = _load(session, start, start + timedelta(days=1), store_id).get(store_id, [0, 0, 0, 0])
+        with self._lock:
+            self.loads += 1
+            # A delta landed mid-load and the read may or may not include it:
+            # answer from the read, leave the entry to the next reload.
+            if self._generations.get(key, 0) == generation:
+                self._counts[key] = counts
+                self._loaded_at[key] = time.monotonic()
+            return dict(zip(FIELDS, counts))
+
+    def apply(self, changes: list[tuple[int, date, BookingStatus | None, BookingStatus | None]]) -> None:
+        """(store_id, day, old status or None if new, new status or None if deleted), after commit."""
+        with self._lock:
+            for store_id, d, old, new in changes:
+                key = (store_id, d)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                counts = self._counts.get(key)
+                if counts is None:
+                    continue  # not loaded; the first read will see the committed row
+                self.deltas += 1
+                if old is None:
+                    counts[0] += 1
+                elif old in _STATUS_FIELD:
+                    counts[_STATUS_FIELD[old]] -= 1
+                if new is None:
+                    counts[0] -= 1
+                elif new in _STATUS_FIELD:
+                    counts[_STATUS_FIELD[new]] += 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self._counts), "hits": self.hits, "loads": self.loads, "deltas": self.deltas, "ttl_seconds": self.ttl}
+
+
+kpis = KpiCounters(ttl_seconds=settings.kpi_ttl_seconds)
+
+
+# ─── Session hooks ───────────────────────────────────────────────────
+# Collect booking inserts/status changes at flush, apply once committed.
+def _status(value) -> BookingStatus | None:
+    return BookingStatus(value) if value is not None else None
+
+@event.listens_for(Session, "after_flush")
+def _collect_booking_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            changes.append((obj.store_id, obj.scheduled_start_at.date(), None, _status(obj.status)))
+    for obj in session.dirty:
+        if isinstance(obj, Booking):
+            hist = inspect(obj).attrs.status.history
+            if hist.added and hist.deleted and hist.added[0] != hist.deleted[0]:
+                changes.append((obj.store_id, obj.scheduled_start_at.date(), _status(hist.deleted[0]), _status(hist.added[0])))
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            changes.append((obj.store_id, obj.scheduled_start_at.date(), _status(obj.status), None))
+    if changes:
+        session.info.setdefault("kpi_changes", []).extend(changes)
+
+@event.listens_for(Session, "after_commit")
+def _apply_on_commit(session):
+    changes = session.info.pop("kpi_changes", None)
+    if changes:
+        kpis.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    session.info.pop("kpi_changes", None)
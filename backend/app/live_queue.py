@@ -0,0 +1,125 @@
+from __future__ import annotations
+import asyncio, threading
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm.util import identity_key
+from sqlmodel import Session
+
+from .config import settings
+from .models import Booking, Incident
+
+RESYNC = {"type": "resync"}
+
+
+class QueueHub:
+    """
+    In-process pub/sub for the live staff queue, one channel per store.
+
+    publish() may be called from any thread (request threads, the DB pool);
+    delivery happens on the event loop passed to bind(). A subscriber that
+    falls more than `buffer` messages behind loses its backlog and gets a
+    single RESYNC instead, so one stalled tablet never holds memory or
+    slows the others down. Until bind() is called publishing is a no-op.
+    """
+
+    def __init__(self, buffer: int = 256):
+        self.buffer = buffer
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._subs: dict[int, set[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self, store_id: int) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.buffer)
+        with self._lock:
+            self._subs.setdefault(store_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, store_id: int, q: asyncio.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(store_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[store_id]
+
+    def has_subscribers(self, store_id: int) -> bool:
+        return store_id in self._subs
+
+    def publish(self, store_id: int, message: dict) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed() or store_id not in self._subs:
+            return
+        self.published += 1
+        loop.call_soon_threadsafe(self._fanout, store_id, message)
+
+    def _fanout(self, store_id: int, message: dict) -> None:
+        with self._lock:
+            subs = list(self._subs.get(store_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(RESYNC)
+                self.resyncs += 1
+
+    def close(self) -> None:
+        """
+        Wake every subscriber with None so open streams end (shutdown).
+        Backlogs are dropped rather than resynced: a full queue must still
+        end, and nobody reads a snapshot after None.
+        """
+        with self._lock:
+            subs = [q for qs in self._subs.values() for q in qs]
+        for q in subs:
+            while not q.empty():
+                q.get_nowait()
+            q.put_nowait(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscribers = sum(len(s) for s in self._subs.values())
+        return {"stores": len(self._subs), "subscribers": subscribers, "published": self.published, "delivered": self.delivered, "resyncs": self.resyncs}
+
+
+queue_hub = QueueHub(buffer=settings.queue_stream_buffer)
+
+
+# ─── Session hooks ───────────────────────────────────────────────────
+# Serialize today's booking inserts/updates and new incidents at flush (the
+# objects are expired after commit), publish once the commit has landed.
+@event.listens_for(Session, "after_flush")
+def _collect_queue_changes(session, flush_context):
+    today = datetime.utcnow().date()
+    messages = []
+    for obj in session.new:
+        if isinstance(obj, Booking) and queue_hub.has_subscribers(obj.store_id) and obj.scheduled_start_at.date() == today:
+            messages.append((obj.store_id, {"type": "booking", "booking": jsonable_encoder(obj)}))
+        elif isinstance(obj, Incident):
+            booking = session.identity_map.get(identity_key(Booking, obj.booking_id))
+            if booking is not None and queue_hub.has_subscribers(booking.store_id) and booking.scheduled_start_at.date() == today:
+                messages.append((booking.store_id, {"type": "incident", "incident": jsonable_encoder(obj)}))
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and queue_hub.has_subscribers(obj.store_id) and obj.scheduled_start_at.date() == today and session.is_modified(obj):
+            messages.append((obj.store_id, {"type": "booking", "booking": jsonable_encoder(obj)}))
+    if messages:
+        session.info.setdefault("queue_messages", []).extend(messages)
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    for store_id, message in session.info.pop("queue_messages", ()):
+        queue_hub.publish(store_id, message)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    session.info.pop("queue_messages", None)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 from datetime import datetime
 from sqlmodel import Session
+from .config import settings
 from .models import BookingStatus, EventLog, EventType, ActorType
+from . import event_log as _event_log  # noqa: F401 - registers the write-behind commit hooks
 import json
 
 VALID_TRANSITIONS = {
@@ -22,6 +24,11 @@ def validate_transition(current: BookingStatus, target: BookingStatus, is_manage
         raise ValueError(f"Invalid transition {current} -> {target}")
 
 def log_event(session: Session, *, booking_id: str | None, store_id: int | None, event_type: EventType, actor_type: ActorType, actor_staff_user_id: int | None = None, metadata: dict | None = None) -> None:
+    """
+    Record an event as part of the caller's transaction; the caller commits.
+    In write-behind mode the row is held until that commit and then handed
+    to the batched event log writer instead of being inserted inline.
+    """
     ev = EventLog(
         booking_id=booking_id,
         store_id=store_id,
@@ -31,5 +38,7 @@ def log_event(session: Session, *, booking_id: str | None, store_id: int | None,
         occurred_at=datetime.utcnow(),
         metadata_json=json.dumps(metadata) if metadata else None,
     )
-    session.add(ev)
-    session.commit()
+    if settings.event_log_mode == "write_behind":
+        session.info.setdefault("pending_events", []).append(ev.model_dump())
+    else:
+        session.add(ev)
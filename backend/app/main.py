@@ -1,15 +1,28 @@
-import logging
+import asyncio, logging
+from functools import partial
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import Session
 
-from telegram import Bot
-
 from .config import settings
-from .db import init_db, engine
+from .db import init_db, engine, pool_stats, run_in_session
 from .seed import seed_if_needed
 from .views import ensure_views
+from .reservations import ensure_booking_constraints
+from .catalog_cache import catalog as catalog_cache
+from .keyboards import keyboards
+from .update_queue import UpdateQueue
+from .dedup import UpdateDeduplicator, prune_processed_updates
+from .conversation_state import conversation_store
+from .event_log import event_log_writer
+from .rollups import RollupRefresher
+from .kpis import kpis
+from .live_queue import queue_hub
+from .principal_cache import principals
+from .jobs import job_runner
+from .reminders import send_due_reminders
+from .no_shows import sweep_no_shows
 
 from .routers import auth, catalog, availability, bookings, admin, analytics
 from .routers.telegram import router as telegram_router
@@ -34,7 +47,23 @@ async def startup():
     init_db()
     with Session(engine) as session:
         seed_if_needed(session)
+        ensure_booking_constraints(session)
         ensure_views(session)
+        if settings.telegram_dedup_persistent:
+            prune_processed_updates(session)
+    kpis.seed()
+    catalog_cache.snapshot()  # warm it, so bot taps only ever see background reloads
+    queue_hub.bind(asyncio.get_running_loop())
+    if settings.event_log_mode == "write_behind":
+        event_log_writer.start()
+    if settings.rollup_refresh_seconds > 0:
+        app.state.rollup_refresher = RollupRefresher(interval=settings.rollup_refresh_seconds)
+        app.state.rollup_refresher.start()
+    if settings.no_show_sweep_seconds > 0:
+        job_runner.add("no_show_sweeper", settings.no_show_sweep_seconds, partial(run_in_session, sweep_no_shows))
+    if settings.conversation_prune_seconds > 0:
+        job_runner.add("conversation_prune", settings.conversation_prune_seconds, conversation_store.prune)
+    job_runner.start()
 
     # --- Telegram startup (webhook mode) ---
     token = settings.telegram_bot_token
@@ -53,11 +82,18 @@ async def startup():
 
     app.state.telegram_app = ptb_app
     app.state.telegram_webhook_secret = webhook_secret
+    if settings.reminder_hour_list and settings.reminder_interval_seconds > 0:
+        job_runner.add("reminders", settings.reminder_interval_seconds, partial(send_due_reminders, ptb_app.bot))
+    app.state.telegram_dedup = UpdateDeduplicator(size=settings.telegram_dedup_size, persistent=settings.telegram_dedup_persistent)
+
+    if settings.telegram_ingest_mode == "queue":
+        update_queue = UpdateQueue(ptb_app, workers=settings.telegram_workers, maxsize=settings.telegram_queue_size)
+        update_queue.start()
+        app.state.telegram_update_queue = update_queue
 
     webhook_url = f"{public_base_url.rstrip('/')}/telegram/webhook"
 
-    bot = Bot(token=token)
-    await bot.set_webhook(
+    await ptb_app.bot.set_webhook(
         url=webhook_url,
         secret_token=webhook_secret if webhook_secret else None,
         allowed_updates=["message", "edited_message", "callback_query"],
@@ -69,17 +105,54 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown():
+    queue_hub.close()
+    await job_runner.stop()
+
+    update_queue = getattr(app.state, "telegram_update_queue", None)
+    if update_queue:
+        await update_queue.stop()
+
     ptb_app = getattr(app.state, "telegram_app", None)
     if ptb_app:
         await ptb_app.stop()
         await ptb_app.shutdown()
 
+    rollup_refresher = getattr(app.state, "rollup_refresher", None)
+    if rollup_refresher:
+        await rollup_refresher.stop()
+
+    # Last, so events from drained updates are flushed too.
+    event_log_writer.stop()
+
 
 @app.get("/health")
 def health():
     return {"ok": True, "name": "bontle", "version": "1.1"}
 
 
+@app.get("/metrics")
+def metrics():
+    update_queue = getattr(app.state, "telegram_update_queue", None)
+    dedup = getattr(app.state, "telegram_dedup", None)
+    rollup_refresher = getattr(app.state, "rollup_refresher", None)
+    ptb_app = getattr(app.state, "telegram_app", None)
+    return {
+        "db_pool": pool_stats(),
+        "event_log": event_log_writer.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "keyboards": keyboards.stats(),
+        "telegram_updates": update_queue.stats() if update_queue else None,
+        "telegram_dedup": dedup.stats() if dedup else None,
+        "telegram_outbound": ptb_app.bot.rate_limiter.stats() if ptb_app else None,
+        "conversations": conversation_store.stats(),
+        "rollups": rollup_refresher.stats() if rollup_refresher else None,
+        "kpis": kpis.stats(),
+        "principals": principals.stats(),
+        "queue_stream": queue_hub.stats(),
+        "jobs": job_runner.stats(),
+    }
+
+
 # Routers
 app.include_router(auth.router)
 app.include_router(catalog.router)
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from sqlalchemy import BigInteger, Index
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime, date, time
@@ -79,6 +80,17 @@ class RefreshToken(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Booking(SQLModel, table=True):
+    # Store-scoped time-range reads (queue, exports, availability, daily KPIs)
+    # seek on these instead of filtering a scheduled_start_at-only scan.
+    __table_args__ = (
+        Index("ix_booking_store_start", "store_id", "scheduled_start_at"),
+        Index("ix_booking_store_consultant_start", "store_id", "consultant_id", "scheduled_start_at"),
+        # Delta polls of the queue: what changed in a store since a cursor.
+        Index("ix_booking_store_updated", "store_id", "updated_at"),
+        # Scheduler scans across stores: upcoming SCHEDULED bookings (reminders).
+        Index("ix_booking_status_start", "status", "scheduled_start_at"),
+    )
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
     booking_code: str = Field(index=True, unique=True)
     store_id: int = Field(foreign_key="store.id", index=True)
@@ -93,7 +105,7 @@ class Booking(SQLModel, table=True):
     source_channel: str = Field(default="TELEGRAM", index=True)
 
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class EventType(str, Enum):
     BOOKED = "BOOKED"
@@ -107,6 +119,7 @@ class EventType(str, Enum):
     INCIDENT_LOGGED = "INCIDENT_LOGGED"
     FEEDBACK_RECEIVED = "FEEDBACK_RECEIVED"
     PURGE = "PURGE"
+    REMINDER_SENT = "REMINDER_SENT"
 
 class EventLog(SQLModel, table=True):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
@@ -136,3 +149,56 @@ class Incident(SQLModel, table=True):
     severity: str = Field(index=True)
     note: str
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class ProcessedUpdate(SQLModel, table=True):
+    # Telegram update_ids already accepted, shared by every worker when persistent dedup is on.
+    update_id: int = Field(primary_key=True)
+    received_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class ConversationState(SQLModel, table=True):
+    # Booking-wizard state per Telegram user, shared by every worker (see conversation_state.py).
+    user_id: int = Field(sa_type=BigInteger, primary_key=True, sa_column_kwargs={"autoincrement": False})
+    data: str  # compact JSON
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+# ─── Analytics rollups ───────────────────────────────────────────────
+# Pre-aggregated per (store, day[, hour | service | consultant]) by
+# rollups.refresh_rollups; the Power BI views in views.py select from these.
+class DailyStoreRollup(SQLModel, table=True):
+    store_id: int = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    bookings: int = 0
+    completed: int = 0
+    no_show: int = 0
+    cancelled: int = 0
+
+class HourlyRollup(SQLModel, table=True):
+    store_id: int = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    hour: int = Field(primary_key=True)
+    bookings: int = 0
+
+class ServiceDailyRollup(SQLModel, table=True):
+    store_id: int = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    service_id: int = Field(primary_key=True)
+    bookings: int = 0
+
+class ConsultantDailyRollup(SQLModel, table=True):
+    store_id: int = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    consultant_id: int = Field(primary_key=True)  # 0 = no consultant assigned
+    bookings: int = 0
+    completed: int = 0
+    no_show: int = 0
+
+class IncidentDailyRollup(SQLModel, table=True):
+    store_id: int = Field(primary_key=True)
+    day: date = Field(primary_key=True)  # day the incident was logged
+    incidents: int = 0
+    bookings: int = 0  # distinct bookings with an incident that day
+
+class AnalyticsState(SQLModel, table=True):
+    # Small key/value store: rollup watermark, deployed views version.
+    key: str = Field(primary_key=True)
+    value: str
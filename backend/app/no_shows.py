@@ -0,0 +1,98 @@
+from __future__ import annotations
+import json, time, uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, update
+from sqlmodel import Session
+
+from .config import settings
+from .live_queue import RESYNC, queue_hub
+from .logic import VALID_TRANSITIONS
+from .models import ActorType, Booking, BookingStatus, EventLog, EventType, Store
+
+# Every status the transition table lets become NO_SHOW (SCHEDULED, ARRIVED).
+SWEEPABLE = tuple(s for s, targets in VALID_TRANSITIONS.items() if BookingStatus.NO_SHOW in targets)
+
+
+def _overdue(store_ids: list[int], source: BookingStatus, cutoff: datetime, limit: int):
+    return (
+        select(Booking.id)
+        .where(Booking.status==source, Booking.scheduled_start_at < cutoff, Booking.scheduled_end_at < cutoff, Booking.store_id.in_(store_ids))
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _sweep_batch(session: Session, store_ids: list[int], source: BookingStatus, cutoff: datetime, limit: int) -> int:
+    """
+    Move up to `limit` overdue `source` bookings of these stores to NO_SHOW in
+    one UPDATE ... RETURNING and commit it with their events, so locks are
+    held for one bounded statement. Rows another worker or a staff member
+    is changing are skipped (Postgres) or re-checked by the status predicate.
+    """
+    now = datetime.utcnow()
+    # The re-check is spelled NOT IN (every other status) so SQLite drives the
+    # UPDATE from the id list; `status = source` would make it walk
+    # ix_booking_status over every row in that status, batch after batch.
+    still_source = Booking.status.not_in([s for s in BookingStatus if s != source])
+    rows = session.execute(
+        update(Booking)
+        .where(Booking.id.in_(_overdue(store_ids, source, cutoff, limit)), still_source)
+        .values(status=BookingStatus.NO_SHOW, updated_at=now)
+        .returning(Booking.id, Booking.store_id, Booking.scheduled_start_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        session.rollback()
+        return 0
+    metadata = json.dumps({"from": source.value, "reason": "overdue"})
+    # Plain dicts: building an EventLog model per row costs more than the SQL.
+    events = [
+        {"id": str(uuid.uuid4()), "booking_id": booking_id, "store_id": store_id, "event_type": EventType.NO_SHOW,
+         "actor_type": ActorType.SYSTEM, "actor_staff_user_id": None, "occurred_at": now, "metadata_json": metadata}
+        for booking_id, store_id, _ in rows
+    ]
+    if settings.event_log_mode == "write_behind":
+        session.info.setdefault("pending_events", []).extend(events)
+    else:
+        session.execute(insert(EventLog), events)
+    # Bulk UPDATE skips the ORM flush hooks; hand the KPI counters and live
+    # queue the same post-commit work they would have queued themselves.
+    session.info.setdefault("kpi_changes", []).extend((store_id, start.date(), source, BookingStatus.NO_SHOW) for _, store_id, start in rows)
+    today = now.date()
+    stores = {store_id for _, store_id, start in rows if start.date() == today and queue_hub.has_subscribers(store_id)}
+    session.info.setdefault("queue_messages", []).extend((store_id, RESYNC) for store_id in stores)
+    session.commit()
+    return len(rows)
+
+
+def sweep_no_shows(session: Session, now: datetime | None = None, grace_minutes: int | None = None, batch_size: int | None = None, stores_per_chunk: int | None = None) -> dict:
+    """
+    Mark bookings still SCHEDULED or ARRIVED `grace_minutes` after their
+    scheduled end as NO_SHOW. Stores are processed `stores_per_chunk` at a
+    time and each chunk in batches of `batch_size` rows, one transaction per
+    batch. Each batch seeks on ix_booking_status_start (status, start), so a
+    tick with nothing overdue is a few index seeks whatever the history size.
+    """
+    t0 = time.perf_counter()
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(minutes=settings.no_show_grace_minutes if grace_minutes is None else grace_minutes)
+    batch_size = batch_size or settings.no_show_sweep_batch
+    stores_per_chunk = stores_per_chunk or settings.no_show_sweep_stores
+    store_ids = session.exec(select(Store.id).order_by(Store.id)).scalars().all()
+    swept = {s.value: 0 for s in SWEEPABLE}
+    batches, slowest = 0, 0.0
+    for i in range(0, len(store_ids), stores_per_chunk):
+        chunk = store_ids[i:i + stores_per_chunk]
+        for source in SWEEPABLE:
+            while True:
+                b0 = time.perf_counter()
+                n = _sweep_batch(session, chunk, source, cutoff, batch_size)
+                batches += 1
+                slowest = max(slowest, time.perf_counter() - b0)
+                swept[source.value] += n
+                if n < batch_size:
+                    break
+                # Let writers waiting on the lock in (SQLite's busy handler backs off up to 100 ms).
+                time.sleep(settings.no_show_sweep_pause_ms / 1000)
+    return {"swept": swept, "batches": batches, "slowest_batch_ms": round(slowest * 1000, 1), "ms": round((time.perf_counter() - t0) * 1000, 1)}
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from .config import settings
+from .db import engine
+from .models import Role, StaffUser
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated staff user as the routers see it: what RBAC and event logging need, nothing mutable."""
+    id: int
+    email: str
+    role: Role
+    store_id: int | None
+
+
+class InactiveUser(Exception):
+    """The user exists but has been deactivated."""
+
+
+class PrincipalCache:
+    """
+    Active staff users by id, so authenticated requests skip the StaffUser
+    lookup. Bounded LRU with a TTL; commits that touch a StaffUser row evict
+    it at once in this process, other workers catch up within the TTL.
+    Inactive or missing users are never cached: get() returns None for a
+    missing user and raises InactiveUser for a deactivated one.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[Principal, float]] = OrderedDict()
+        # Bumped by invalidate(); a load only stores its result if the user's
+        # generation is unchanged since it began, so a concurrent invalidation wins.
+        self._generations: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+        with Session(engine) as session:
+            user = session.get(StaffUser, user_id)
+            if user is None or not user.is_active:
+                self.invalidate(user_id)
+                if user is None:
+                    return None
+                raise InactiveUser(user_id)
+            principal = Principal(id=user.id, email=user.email, role=Role(user.role), store_id=user.store_id)
+        with self._lock:
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (principal, time.monotonic())
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations, "ttl_seconds": self.ttl_seconds}
+
+
+principals = PrincipalCache(ttl_seconds=settings.principal_cache_ttl_seconds, max_size=settings.principal_cache_size)
+
+
+# ─── Invalidation hooks ──────────────────────────────────────────────
+# Note staff users written during flush, evict them once committed.
+@event.listens_for(Session, "after_flush")
+def _mark_principals_dirty(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, StaffUser) and obj.id is not None:
+            session.info.setdefault("principals_dirty", set()).add(obj.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    for user_id in session.info.pop("principals_dirty", ()):
+        principals.invalidate(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop("principals_dirty", None)
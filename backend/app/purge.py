@@ -0,0 +1,117 @@
+from __future__ import annotations
+import logging, threading, time, uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select
+from sqlmodel import Session
+
+from .db import engine
+from .logic import log_event
+from .models import Booking, EventLog, Feedback, Incident, EventType, ActorType
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+PAUSE_SECONDS = 0.05  # between batches, so bot/dashboard writes get the lock
+
+
+def _steps(cutoff: datetime) -> list[tuple[str, type, object]]:
+    """(label, model, WHERE clause) in FK order: children of old bookings go before the bookings."""
+    old_bookings = select(Booking.id).where(Booking.created_at < cutoff)
+    return [
+        ("feedback", Feedback, or_(Feedback.created_at < cutoff, Feedback.booking_id.in_(old_bookings))),
+        ("incidents", Incident, or_(Incident.created_at < cutoff, Incident.booking_id.in_(old_bookings))),
+        ("events", EventLog, or_(EventLog.occurred_at < cutoff, EventLog.booking_id.in_(old_bookings))),
+        ("bookings", Booking, Booking.created_at < cutoff),
+    ]
+
+
+class PurgeJob:
+    def __init__(self, older_than_days: int, dry_run: bool = False, actor_staff_user_id: int | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.older_than_days = older_than_days
+        self.cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        self.dry_run = dry_run
+        self.actor_staff_user_id = actor_staff_user_id
+        self.status = "pending"
+        self.current: str | None = None
+        self.counts: dict[str, int] = {}
+        self.batches = 0
+        self.error: str | None = None
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+
+    def run(self, batch_size: int = BATCH_SIZE, pause: float = PAUSE_SECONDS) -> "PurgeJob":
+        self.status = "running"
+        self.started_at = datetime.utcnow()
+        try:
+            with Session(engine) as session:
+                for label, model, where in _steps(self.cutoff):
+                    self.current = label
+                    self.counts[label] = 0
+                    if self.dry_run:
+                        self.counts[label] = session.exec(select(func.count()).select_from(model).where(where)).one()[0]
+                        continue
+                    # Set-based delete of at most batch_size keys per transaction.
+                    pk = model.__table__.primary_key.columns.values()[0]
+                    while True:
+                        batch = select(pk).where(where).limit(batch_size)
+                        deleted = session.exec(delete(model).where(pk.in_(batch))).rowcount
+                        session.commit()
+                        self.counts[label] += deleted
+                        self.batches += 1
+                        if deleted < batch_size:
+                            break
+                        time.sleep(pause)
+                self.current = None
+                if not self.dry_run:
+                    log_event(session, booking_id=None, store_id=None, event_type=EventType.PURGE, actor_type=ActorType.STAFF, actor_staff_user_id=self.actor_staff_user_id,
+                              metadata={"older_than_days": self.older_than_days, "deleted_bookings": self.counts["bookings"], "deleted": self.counts})
+                    session.commit()
+            self.status = "done"
+        except Exception as exc:
+            self.status = "failed"
+            self.error = str(exc)
+            logger.exception("Purge %s failed in %s", self.id, self.current)
+        finally:
+            self.finished_at = datetime.utcnow()
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "dry_run": self.dry_run,
+            "older_than_days": self.older_than_days,
+            "cutoff": self.cutoff,
+            "current": self.current,
+            "counts": self.counts,
+            "batches": self.batches,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_jobs: dict[str, PurgeJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def start_purge_job(job: PurgeJob, background: bool = True) -> PurgeJob | None:
+    """
+    Run job on a background thread, or in the caller's thread with
+    background=False (returning once it has finished). Returns None if
+    another purge is still running, whichever way it was started.
+    """
+    with _jobs_lock:
+        if any(j.status in ("pending", "running") for j in _jobs.values()):
+            return None
+        _jobs[job.id] = job
+    if not background:
+        return job.run()
+    threading.Thread(target=job.run, name=f"bontle-purge-{job.id}", daemon=True).start()
+    return job
+
+
+def get_purge_job(job_id: str) -> PurgeJob | None:
+    return _jobs.get(job_id)
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import json, uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from telegram import Bot
+
+from .config import settings
+from .db import run_in_session
+from .models import ActorType, AnalyticsState, Booking, BookingStatus, Customer, EventLog, EventType, Service, Store
+from .rollups import get_state
+from .telegram_outbound import send_batch
+
+CURSOR_KEY = "reminders_cursor_{hours}h"
+
+
+@dataclass(frozen=True, slots=True)
+class Reminder:
+    booking_id: str
+    store_id: int
+    chat_id: str
+    text: str
+
+
+def _advance(session: Session, key: str, old: str | None, new: str) -> bool:
+    """Compare-and-set the cursor; False when another worker moved it first."""
+    if old is None:
+        session.add(AnalyticsState(key=key, value=new))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return False
+        return True
+    result = session.exec(update(AnalyticsState).where(AnalyticsState.key==key, AnalyticsState.value==old).values(value=new))
+    session.commit()
+    return result.rowcount == 1
+
+
+def _due(session: Session, at: datetime, after_id: str | None, upper: datetime, limit: int) -> list:
+    after = Booking.scheduled_start_at > at if after_id is None else or_(Booking.scheduled_start_at > at, and_(Booking.scheduled_start_at == at, Booking.id > after_id))
+    return session.exec(
+        select(Booking.id, Booking.store_id, Booking.booking_code, Booking.scheduled_start_at, Customer.telegram_chat_id, Service.name, Store.name)
+        .join(Customer, Customer.id==Booking.customer_id).join(Service, Service.id==Booking.service_id).join(Store, Store.id==Booking.store_id)
+        .where(Booking.scheduled_start_at >= at, Booking.scheduled_start_at <= upper, after, Booking.status==BookingStatus.SCHEDULED)
+        .order_by(Booking.scheduled_start_at, Booking.id)
+        .limit(limit)
+    ).all()
+
+
+def claim_reminders(session: Session, hours: int, now: datetime | None = None, limit: int | None = None) -> list[Reminder]:
+    """
+    Claim the next reminders of the T-`hours` window: SCHEDULED bookings
+    starting after the stored cursor and at most `hours` from now, oldest
+    first, at most `limit` of them. The cursor is a (scheduled_start_at, id)
+    keyset, so each call is one bounded index range read however large the
+    table, and it is moved past the claimed rows before anything is sent:
+    a booking is handed out once across ticks, restarts and workers, and a
+    crash between claim and send loses that reminder rather than repeating it.
+    Bookings that start before a claim catches up get no reminder.
+    """
+    now = now or datetime.utcnow()
+    limit = limit or settings.reminder_batch_size
+    key = CURSOR_KEY.format(hours=hours)
+    upper = now + timedelta(hours=hours)
+    raw = get_state(session, key)
+    if raw is None:
+        # First run: start one tick back rather than reminding the whole window at once.
+        at, after_id = upper - timedelta(seconds=settings.reminder_interval_seconds), None
+    else:
+        cursor = json.loads(raw)
+        at, after_id = datetime.fromisoformat(cursor["at"]), cursor["id"]
+    if at < now:
+        at, after_id = now, None
+    rows = _due(session, at, after_id, upper, limit)
+    if len(rows) == limit:
+        cursor = {"at": rows[-1][3].isoformat(), "id": rows[-1][0]}
+    else:
+        cursor = {"at": upper.isoformat(), "id": None}
+    if not _advance(session, key, raw, json.dumps(cursor)):
+        return []
+    return [
+        Reminder(booking_id=booking_id, store_id=store_id, chat_id=chat_id,
+                 text=f"Reminder of your booking:\nStore: {store}\nService: {service}\nDate: {start.strftime('%Y-%m-%d %H:%M')}\nBooking code: {code}")
+        for booking_id, store_id, code, start, chat_id, service, store in rows
+    ]
+
+
+def log_reminders(session: Session, reminders: list[Reminder], delivered: list[bool], hours: int) -> int:
+    """One bulk insert of REMINDER_SENT events for the reminders that reached Telegram."""
+    now = datetime.utcnow()
+    metadata = json.dumps({"hours": hours})
+    rows = [
+        {"id": str(uuid.uuid4()), "booking_id": r.booking_id, "store_id": r.store_id, "event_type": EventType.REMINDER_SENT,
+         "actor_type": ActorType.SYSTEM, "actor_staff_user_id": None, "occurred_at": now, "metadata_json": metadata}
+        for r, ok in zip(reminders, delivered) if ok
+    ]
+    if rows:
+        session.execute(insert(EventLog), rows)
+        session.commit()
+    return len(rows)
+
+
+async def send_due_reminders(bot: Bot) -> dict:
+    """One reminders tick: claim, send and log each window in turn."""
+    out = {}
+    for hours in settings.reminder_hour_list:
+        reminders = await run_in_session(claim_reminders, hours)
+        delivered = await send_batch(bot, [{"chat_id": r.chat_id, "text": r.text} for r in reminders]) if reminders else []
+        if reminders:
+            await run_in_session(log_reminders, reminders, delivered, hours)
+        out[f"{hours}h"] = {"claimed": len(reminders), "sent": sum(delivered)}
+    return out
@@ -0,0 +1,151 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from datetime import datetime
+import logging, threading
+
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from sqlmodel import Session, select, text
+
+from .models import Booking, BookingStatus, EventType, ActorType
+from .availability import assign_resources
+from .booking_codes import new_booking_code
+from .logic import log_event
+
+logger = logging.getLogger(__name__)
+
+class SlotUnavailable(Exception):
+    """The requested window filled up between listing and confirming."""
+
+# Double-booking guards created by ensure_booking_constraints(); any other
+# IntegrityError (a reused booking_code, a vanished service or customer) is a
+# real error, not a taken slot.
+SLOT_CONSTRAINTS = ("uq_booking_station_start", "booking_station_no_overlap", "booking_consultant_no_overlap")
+# SQLite names the columns, not the index, in its message.
+SQLITE_SLOT_VIOLATION = "UNIQUE constraint failed: booking.station_id, booking.scheduled_start_at"
+
+def _is_slot_conflict(exc: IntegrityError) -> bool:
+    diag = getattr(exc.orig, "diag", None)  # psycopg2
+    if diag is not None:
+        return diag.constraint_name in SLOT_CONSTRAINTS
+    return SQLITE_SLOT_VIOLATION in str(exc.orig)
+
+# SQLite has no row/range locks, so reservations are serialized: a process-wide
+# lock for threads in this worker plus BEGIN IMMEDIATE against other processes.
+_sqlite_lock = threading.Lock()
+
+def _is_sqlite(session: Session) -> bool:
+    return session.get_bind().dialect.name == "sqlite"
+
+@contextmanager
+def _serialized(session: Session, store_id: int):
+    if _is_sqlite(session):
+        with _sqlite_lock:
+            dbapi_conn = session.connection().connection.dbapi_connection
+            if not dbapi_conn.in_transaction:
+                session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            yield
+    else:
+        # Transaction-scoped: released by the commit/rollback that ends the reservation.
+        session.exec(text("SELECT pg_advisory_xact_lock(:key)"), params={"key": store_id})
+        yield
+
+def customer_booking_at(session: Session, *, store_id: int, service_id: int, customer_id: int, start: datetime) -> Booking | None:
+    """The customer's live booking for this service at this start, if they already hold one."""
+    return session.exec(select(Booking).where(
+        Booking.store_id == store_id,
+        Booking.customer_id == customer_id,
+        Booking.service_id == service_id,
+        Booking.scheduled_start_at == start,
+        Booking.status != BookingStatus.CANCELLED,
+    )).first()
+
+def reserve_booking(session: Session, *, store_id: int, service_id: int, customer_id: int, start: datetime, end: datetime, booking_code: str | None = None, consultant_id: int | None = None, source_channel: str = "TELEGRAM", event_metadata: dict | None = None, idempotent: bool = False) -> Booking:
+    """
+    Re-check capacity and insert the booking in one transaction.
+    A fresh booking code is drawn inside the same serialized section unless one is given,
+    and the BOOKED event is written in the same commit.
+    With idempotent=True a booking the customer already holds for this
+    service and start is returned instead of a second one (a repeated tap).
+    Raises SlotUnavailable if the window is taken (by the re-check, or by a
+    double-booking constraint when another writer got there first); other
+    integrity errors propagate.
+    """
+    with _serialized(session, store_id):
+        try:
+            if idempotent:
+                existing = customer_booking_at(session, store_id=store_id, service_id=service_id, customer_id=customer_id, start=start)
+                if existing is not None:
+                    session.commit()  # ends the serialized transaction
+                    return existing
+            assigned = assign_resources(session, store_id=store_id, start=start, end=end, consultant_id=consultant_id)
+            if assigned is None:
+                raise SlotUnavailable()
+            station_id, consultant_id = assigned
+            booking = Booking(
+                booking_code=booking_code or new_booking_code(session, store_id),
+                store_id=store_id,
+                station_id=station_id,
+                service_id=service_id,
+                consultant_id=consultant_id,
+                customer_id=customer_id,
+                scheduled_start_at=start,
+                scheduled_end_at=end,
+                status=BookingStatus.SCHEDULED,
+                source_channel=source_channel,
+            )
+            session.add(booking)
+            log_event(session, booking_id=booking.id, store_id=store_id, event_type=EventType.BOOKED, actor_type=ActorType.CUSTOMER, metadata=event_metadata)
+            session.commit()
+        except IntegrityError as exc:
+            session.rollback()
+            if _is_slot_conflict(exc):
+                raise SlotUnavailable() from exc
+            raise
+        except Exception:
+            # SlotUnavailable, BookingCodeExhausted, driver errors: leave no half-built booking behind.
+            session.rollback()
+            raise
+    session.refresh(booking)
+    return booking
+
+SQLITE_CONSTRAINTS = [
+    # Same station, same start: the cheapest double-booking to catch at the DB level.
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_booking_station_start
+    ON booking (station_id, scheduled_start_at)
+    WHERE status != 'CANCELLED'
+    """,
+]
+
+POSTGRES_CONSTRAINTS = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    """
+    DO $$ BEGIN
+      IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'booking_station_no_overlap') THEN
+        ALTER TABLE booking ADD CONSTRAINT booking_station_no_overlap
+          EXCLUDE USING gist (station_id WITH =, tsrange(scheduled_start_at, scheduled_end_at) WITH &&)
+          WHERE (status <> 'CANCELLED');
+      END IF;
+    END $$;
+    """,
+    """
+    DO $$ BEGIN
+      IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'booking_consultant_no_overlap') THEN
+        ALTER TABLE booking ADD CONSTRAINT booking_consultant_no_overlap
+          EXCLUDE USING gist (consultant_id WITH =, tsrange(scheduled_start_at, scheduled_end_at) WITH &&)
+          WHERE (status <> 'CANCELLED');
+      END IF;
+    END $$;
+    """,
+]
+
+def ensure_booking_constraints(session: Session) -> None:
+    """Create the double-booking guards; existing conflicting rows only log a warning."""
+    statements = SQLITE_CONSTRAINTS if _is_sqlite(session) else POSTGRES_CONSTRAINTS
+    for sql in statements:
+        try:
+            session.exec(text(sql))
+            session.commit()
+        except DBAPIError as exc:
+            session.rollback()
+            logger.warning("Booking constraint not applied (%s): %s", " ".join(sql.split()[:6]), exc.orig)
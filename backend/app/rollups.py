@@ -0,0 +1,192 @@
+from __future__ import annotations
+import asyncio, logging, threading, time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, insert, or_, select
+from sqlmodel import Session
+
+from .db import engine, run_in_session
+from .models import (
+    Booking, BookingStatus, EventLog, EventType, Incident, AnalyticsState,
+    DailyStoreRollup, HourlyRollup, ServiceDailyRollup, ConsultantDailyRollup, IncidentDailyRollup,
+)
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = "rollups_watermark"
+# Changes are re-scanned from a little before the watermark: a row stamped just
+# before a refresh started may only commit after that refresh read. Recomputing
+# a bucket twice is harmless.
+OVERLAP = timedelta(minutes=5)
+BOOKING_ROLLUPS = (DailyStoreRollup, HourlyRollup, ServiceDailyRollup, ConsultantDailyRollup)
+
+_refresh_lock = threading.Lock()
+
+
+def get_state(session: Session, key: str) -> str | None:
+    row = session.get(AnalyticsState, key)
+    return row.value if row else None
+
+def set_state(session: Session, key: str, value: str) -> None:
+    session.merge(AnalyticsState(key=key, value=value))
+
+
+def _day_range(d: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(d, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+def _aggregate_bookings(rows) -> dict[type, list[dict]]:
+    """rows of (store_id, consultant_id, service_id, scheduled_start_at, status) -> rollup rows per table."""
+    daily: dict[tuple, list[int]] = defaultdict(lambda: [0, 0, 0, 0])
+    hours: Counter[tuple] = Counter()
+    services: Counter[tuple] = Counter()
+    consultants: dict[tuple, list[int]] = defaultdict(lambda: [0, 0, 0])
+    for store_id, consultant_id, service_id, start_at, status in rows:
+        d = start_at.date()
+        completed, no_show = status == BookingStatus.COMPLETED, status == BookingStatus.NO_SHOW
+        t = daily[store_id, d]
+        t[0] += 1; t[1] += completed; t[2] += no_show; t[3] += status == BookingStatus.CANCELLED
+        hours[store_id, d, start_at.hour] += 1
+        services[store_id, d, service_id] += 1
+        c = consultants[store_id, d, consultant_id or 0]
+        c[0] += 1; c[1] += completed; c[2] += no_show
+    return {
+        DailyStoreRollup: [dict(store_id=s, day=d, bookings=n, completed=c, no_show=ns, cancelled=x) for (s, d), (n, c, ns, x) in daily.items()],
+        HourlyRollup: [dict(store_id=s, day=d, hour=h, bookings=n) for (s, d, h), n in hours.items()],
+        ServiceDailyRollup: [dict(store_id=s, day=d, service_id=sv, bookings=n) for (s, d, sv), n in services.items()],
+        ConsultantDailyRollup: [dict(store_id=s, day=d, consultant_id=c, bookings=n, completed=done, no_show=ns) for (s, d, c), (n, done, ns) in consultants.items()],
+    }
+
+def _aggregate_incidents(rows) -> dict[type, list[dict]]:
+    """rows of (store_id, incident created_at, booking_id) -> IncidentDailyRollup rows."""
+    incidents: Counter[tuple] = Counter()
+    bookings: dict[tuple, set] = defaultdict(set)
+    for store_id, created_at, booking_id in rows:
+        key = (store_id, created_at.date())
+        incidents[key] += 1
+        bookings[key].add(booking_id)
+    return {IncidentDailyRollup: [dict(store_id=s, day=d, incidents=n, bookings=len(bookings[s, d])) for (s, d), n in incidents.items()]}
+
+
+BOOKING_COLUMNS = select(Booking.store_id, Booking.consultant_id, Booking.service_id, Booking.scheduled_start_at, Booking.status)
+INCIDENT_COLUMNS = select(Booking.store_id, Incident.created_at, Incident.booking_id).join(Booking, Booking.id==Incident.booking_id)
+
+def _changed_booking_days(session: Session, since: datetime) -> set[tuple[int, date]]:
+    stmt = select(Booking.store_id, Booking.scheduled_start_at)
+    days = {(s, t.date()) for s, t in session.exec(stmt.where(or_(Booking.created_at>=since, Booking.updated_at>=since)))}
+    # Bookings with a new event but no re-stamped updated_at.
+    days |= {(s, t.date()) for s, t in session.exec(stmt.join(EventLog, EventLog.booking_id==Booking.id).where(EventLog.occurred_at>=since))}
+    return days
+
+def _changed_incident_days(session: Session, since: datetime) -> set[tuple[int, date]]:
+    stmt = select(Booking.store_id, Incident.created_at).join(Booking, Booking.id==Incident.booking_id).where(Incident.created_at>=since)
+    return {(s, t.date()) for s, t in session.exec(stmt)}
+
+def _replace(session: Session, models: tuple, buckets: set[tuple[int, date]] | None, tables: dict[type, list[dict]]) -> None:
+    for model in models:
+        if buckets is None:
+            session.exec(delete(model))
+        else:
+            for store_id, d in buckets:
+                session.exec(delete(model).where(model.store_id==store_id, model.day==d).execution_options(synchronize_session=False))
+        if tables[model]:
+            session.execute(insert(model), tables[model])
+
+
+def refresh_rollups(session: Session, full: bool = False) -> dict:
+    """
+    Bring the rollup tables up to date. Only (store, day) buckets touched
+    since the stored watermark are recomputed, each from its own indexed
+    day range. The first run, or a purge since the last run, rebuilds
+    everything from one ordered pass over the bookings. Either way the
+    refresh is a single transaction, so readers never see a half-built table.
+    """
+    if not _refresh_lock.acquire(blocking=False):
+        return {"skipped": "refresh already running"}
+    lock_conn = None
+    locked = False
+    try:
+        if engine.dialect.name == "postgresql":
+            # One refresher across workers; held on its own connection.
+            lock_conn = engine.connect()
+            locked = lock_conn.exec_driver_sql("SELECT pg_try_advisory_lock(hashtext('bontle_rollups'))").scalar()
+            if not locked:
+                return {"skipped": "refresh running in another worker"}
+        return _refresh(session, full)
+    finally:
+        if lock_conn is not None:
+            # Only unlock what this call took: an unheld unlock warns, and a
+            # session-level lock already held on this pooled connection must stay.
+            if locked:
+                lock_conn.exec_driver_sql("SELECT pg_advisory_unlock(hashtext('bontle_rollups'))")
+            lock_conn.close()
+        _refresh_lock.release()
+
+def _refresh(session: Session, full: bool) -> dict:
+    t0 = time.perf_counter()
+    started_at = datetime.utcnow()
+    mark = get_state(session, WATERMARK_KEY)
+    # Purged rows leave nothing behind to mark their buckets dirty.
+    if not full and mark is not None:
+        full = session.exec(select(EventLog.id).where(EventLog.event_type==EventType.PURGE, EventLog.occurred_at>=datetime.fromisoformat(mark)).limit(1)).first() is not None
+
+    if full or mark is None:
+        ordered = BOOKING_COLUMNS.order_by(Booking.store_id, Booking.scheduled_start_at).execution_options(yield_per=10000)
+        booking_tables = _aggregate_bookings(session.exec(ordered))
+        _replace(session, BOOKING_ROLLUPS, None, booking_tables)
+        _replace(session, (IncidentDailyRollup,), None, _aggregate_incidents(session.exec(INCIDENT_COLUMNS)))
+        mode, buckets = "full", len(booking_tables[DailyStoreRollup])
+    else:
+        since = datetime.fromisoformat(mark) - OVERLAP
+        booking_days = _changed_booking_days(session, since)
+        incident_days = _changed_incident_days(session, since)
+        rows = []
+        for store_id, d in booking_days:
+            start, end = _day_range(d)
+            rows += session.exec(BOOKING_COLUMNS.where(Booking.store_id==store_id, Booking.scheduled_start_at>=start, Booking.scheduled_start_at<end)).all()
+        _replace(session, BOOKING_ROLLUPS, booking_days, _aggregate_bookings(rows))
+        rows = []
+        for store_id, d in incident_days:
+            start, end = _day_range(d)
+            rows += session.exec(INCIDENT_COLUMNS.where(Booking.store_id==store_id, Incident.created_at>=start, Incident.created_at<end)).all()
+        _replace(session, (IncidentDailyRollup,), incident_days, _aggregate_incidents(rows))
+        mode, buckets = "incremental", len(booking_days) + len(incident_days)
+
+    set_state(session, WATERMARK_KEY, started_at.isoformat())
+    session.commit()
+    return {"mode": mode, "buckets": buckets, "ms": round((time.perf_counter() - t0) * 1000, 1), "watermark": started_at.isoformat()}
+
+
+class RollupRefresher:
+    """Refreshes the rollups every `interval` seconds on the DB thread pool, starting at once."""
+
+    def __init__(self, interval: float = 60.0):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.failures = 0
+        self.last: dict | None = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self.last = await run_in_session(refresh_rollups)
+                self.runs += 1
+            except Exception:
+                self.failures += 1
+                logger.exception("Rollup refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="rollup-refresh")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"interval_seconds": self.interval, "runs": self.runs, "failures": self.failures, "last": self.last}
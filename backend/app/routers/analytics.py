@@ -1,48 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlmodel import Session, text
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, bindparam
+from sqlmodel import text
 from datetime import date, datetime, timedelta
-import csv, io
-from ..deps import get_session, get_current_user
-from ..models import StaffUser, Role
+from typing import Iterator
+import csv, io, zlib
+from ..db import engine
+from ..deps import get_current_user
+from ..kpis import kpis
+from ..models import Role
+from ..principal_cache import Principal
 
 router = APIRouter(tags=["analytics"])
 
-def _enforce(user: StaffUser, store_id: int):
+def _enforce(user: Principal, store_id: int):
     if user.role != Role.HEAD_OFFICE_ADMIN and user.store_id != store_id:
         raise HTTPException(403, "Forbidden")
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match against one ETag: a comma-separated list or *, compared weakly (W/ ignored)."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(tag == "*" or tag.removeprefix("W/") == opaque for tag in (t.strip() for t in if_none_match.split(",")))
+
 @router.get("/analytics/daily")
-def daily(store_id: int, date_str: str, session: Session = Depends(get_session), user: StaffUser = Depends(get_current_user)):
+def daily(store_id: int, date_str: str, request: Request, response: Response, user: Principal = Depends(get_current_user)):
     _enforce(user, store_id)
-    d = date.fromisoformat(date_str)
-    start = datetime.combine(d, datetime.min.time())
-    end = start + timedelta(days=1)
-    q = text("""
-    SELECT COUNT(*) as bookings,
-           SUM(CASE WHEN status='COMPLETED' THEN 1 ELSE 0 END) as completed,
-           SUM(CASE WHEN status='NO_SHOW' THEN 1 ELSE 0 END) as no_show,
-           SUM(CASE WHEN status='CANCELLED' THEN 1 ELSE 0 END) as cancelled
-    FROM booking
-    WHERE store_id=:store_id AND scheduled_start_at>=:start AND scheduled_start_at<:end
-    """)
-    row = session.exec(q, params={"store_id": store_id, "start": start, "end": end}).one()
-    return {"store_id": store_id, "date": date_str, **dict(row._mapping)}
+    try:
+        d = date.fromisoformat(date_str)
+    except ValueError:
+        raise HTTPException(400, "date_str must be YYYY-MM-DD")
+    counts = kpis.get(store_id, d)
+    # Derived from the values, so every worker hands out the same tag for the same numbers.
+    etag = 'W/"kpi-{}-{}-{bookings}-{completed}-{no_show}-{cancelled}"'.format(store_id, date_str, **counts)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"store_id": store_id, "date": date_str, **counts}
 
-@router.get("/exports/bookings.csv")
-def export_bookings_csv(store_id: int, start: str, end: str, session: Session = Depends(get_session), user: StaffUser = Depends(get_current_user)):
-    _enforce(user, store_id)
-    q = text("""
+# Half-open [start, end) on the raw column so (store_id, scheduled_start_at) is a range seek.
+EXPORT_SQL = text("""
     SELECT id as booking_id, booking_code, store_id, service_id, consultant_id,
            scheduled_start_at, scheduled_end_at, status, source_channel, created_at
     FROM booking
-    WHERE store_id=:store_id AND date(scheduled_start_at) BETWEEN :start AND :end
+    WHERE store_id=:store_id AND scheduled_start_at>=:start AND scheduled_start_at<:end
     ORDER BY scheduled_start_at
-    """)
-    rows = session.exec(q, params={"store_id": store_id, "start": start, "end": end}).all()
-    output = io.StringIO()
-    headers = list(rows[0]._mapping.keys()) if rows else ["booking_id"]
-    writer = csv.DictWriter(output, fieldnames=headers)
-    writer.writeheader()
-    for r in rows:
-        writer.writerow(dict(r._mapping))
-    return Response(content=output.getvalue(), media_type="text/csv")
+    """).bindparams(bindparam("start", type_=DateTime), bindparam("end", type_=DateTime))
+EXPORT_CHUNK_ROWS = 2000
+
+def _export_chunks(params: dict, compress: bool) -> Iterator[bytes]:
+    """
+    CSV in chunks of EXPORT_CHUNK_ROWS rows, read through a server-side
+    cursor on its own connection (the request session is closed before
+    the body streams). Memory stays at about one chunk whatever the range.
+    """
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(EXPORT_SQL, params)
+        writer.writerow(result.keys())
+        for rows in result.partitions(EXPORT_CHUNK_ROWS):
+            writer.writerows(rows)
+            data = buf.getvalue().encode()
+            buf.seek(0); buf.truncate()
+            if gz:
+                data = gz.compress(data)
+            if data:
+                yield data
+    data = buf.getvalue().encode()
+    if gz:
+        data = gz.compress(data) + gz.flush()
+    if data:
+        yield data
+
+@router.get("/exports/bookings.csv")
+def export_bookings_csv(store_id: int, start: str, end: str, accept_encoding: str = Header(""), user: Principal = Depends(get_current_user)):
+    _enforce(user, store_id)
+    compress = "gzip" in accept_encoding.lower()
+    headers = {"Content-Disposition": f'attachment; filename="bookings_{store_id}_{start}_{end}.csv"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    try:
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(400, "start and end must be YYYY-MM-DD")
+    # Both dates inclusive, as before.
+    params = {"store_id": store_id, "start": datetime.combine(first, datetime.min.time()), "end": datetime.combine(last + timedelta(days=1), datetime.min.time())}
+    return StreamingResponse(_export_chunks(params, compress), media_type="text/csv", headers=headers)
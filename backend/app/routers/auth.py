@@ -5,6 +5,7 @@ from sqlmodel import Session, select
 
 from ..deps import get_session, get_current_user   # ← make sure get_current_user is here
 from ..models import StaffUser
+from ..principal_cache import Principal
 from ..security import (
     verify_password,
     create_access_token,
@@ -91,7 +92,7 @@ def logout(payload: LogoutIn, session: Session = Depends(get_session)):
 
 # ─── Current user ───
 @router.get("/me", response_model=dict)
-def read_users_me(current_user: StaffUser = Depends(get_current_user)):
+def read_users_me(current_user: Principal = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
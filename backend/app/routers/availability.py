@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session
 from datetime import date
 from ..deps import get_session
-from ..availability import list_available_start_times
+from ..availability import list_available_start_times, list_available_range, SLOT_MINUTES
 
 router = APIRouter(tags=["availability"])
 
 @router.get("/availability/times")
-def availability_times(store_id: int, service_id: int, date_str: str, consultant_id: int | None = None, session: Session = Depends(get_session)):
+def availability_times(store_id: int, service_id: int, date_str: str, consultant_id: int | None = None, slot_minutes: int = Query(SLOT_MINUTES, ge=5, le=240), session: Session = Depends(get_session)):
     d = date.fromisoformat(date_str)
-    return {"date": date_str, "times": list_available_start_times(session, store_id=store_id, service_id=service_id, d=d, consultant_id=consultant_id)}
+    return {"date": date_str, "times": list_available_start_times(session, store_id=store_id, service_id=service_id, d=d, consultant_id=consultant_id, slot_minutes=slot_minutes)}
+
+@router.get("/availability/range")
+def availability_range(store_id: int, service_id: int, start_date: str, days: int = Query(7, ge=1, le=31), consultant_id: int | None = None, slot_minutes: int = Query(SLOT_MINUTES, ge=5, le=240), session: Session = Depends(get_session)):
+    d = date.fromisoformat(start_date)
+    return {"start_date": start_date, "days": list_available_range(session, store_id=store_id, service_id=service_id, start=d, days=days, consultant_id=consultant_id, slot_minutes=slot_minutes)}
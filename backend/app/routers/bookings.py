@@ -1,30 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlmodel import Session, select, text
 from datetime import datetime, date, timedelta
-import csv, io
+from typing import AsyncIterator
+import asyncio, csv, io, json
 
-from ..deps import get_session, get_current_user
-from ..models import Booking, BookingStatus, StaffUser, Role, EventType, ActorType, Incident
+from ..config import settings
+from ..db import run_in_session
+from ..deps import get_session, get_current_user, get_stream_user
+from ..live_queue import RESYNC, queue_hub
+from ..models import Booking, BookingStatus, Service, StaffUser, Role, EventType, ActorType, Incident
 from ..logic import validate_transition, log_event
+from ..principal_cache import Principal
+from ..booking_codes import find_by_code
+from ..security import create_stream_ticket
 
 router = APIRouter(tags=["bookings"])
 
-@router.get("/queue/today")
-def queue_today(store_id: int, session: Session = Depends(get_session), user: StaffUser = Depends(get_current_user)):
+def _check_store(user: Principal, store_id: int):
     if user.role != Role.HEAD_OFFICE_ADMIN and user.store_id != store_id:
         raise HTTPException(403, "Forbidden")
+
+def _today_queue(session: Session, store_id: int) -> list[Booking]:
     today = datetime.utcnow().date()
     start = datetime.combine(today, datetime.min.time())
     end = start + timedelta(days=1)
     stmt = select(Booking).where(Booking.store_id==store_id, Booking.scheduled_start_at>=start, Booking.scheduled_start_at<end).order_by(Booking.scheduled_start_at)
     return session.exec(stmt).all()
 
+# Cursors trail the poll by this much: updated_at is stamped before commit,
+# so a row can become visible after a poll that started later than its stamp.
+# Such rows come back once more on the next poll; clients upsert by id.
+QUEUE_SYNC_OVERLAP = timedelta(seconds=5)
+
+def _compact_queue(session: Session, store_id: int, since: datetime | None, day: date | None = None) -> list[dict]:
+    """The queue card fields for the day's (default today's) bookings (changed since `since`, if given), with service and consultant joined in."""
+    start = datetime.combine(day or datetime.utcnow().date(), datetime.min.time())
+    stmt = (
+        select(Booking.id, Booking.booking_code, Booking.scheduled_start_at, Booking.status,
+               Service.name.label("service"), StaffUser.email.label("consultant"))
+        .join(Service, Service.id==Booking.service_id)
+        .outerjoin(StaffUser, StaffUser.id==Booking.consultant_id)
+        .where(Booking.store_id==store_id, Booking.scheduled_start_at>=start, Booking.scheduled_start_at<start + timedelta(days=1))
+    )
+    if since is not None:
+        stmt = stmt.where(Booking.updated_at>since).order_by(Booking.updated_at)
+    else:
+        stmt = stmt.order_by(Booking.scheduled_start_at)
+    return [{"id": r.id, "code": r.booking_code, "time": r.scheduled_start_at, "service": r.service,
+             "consultant": r.consultant.split("@")[0] if r.consultant else None, "status": r.status} for r in session.exec(stmt)]
+
+def _parse_cursor(since: str) -> tuple[date | None, datetime]:
+    """(day the cursor was issued for, timestamp); cursors from before the day was included have no day."""
+    day, sep, stamp = since.rpartition("_")
+    try:
+        return (date.fromisoformat(day) if sep else None), datetime.fromisoformat(stamp)
+    except ValueError:
+        raise HTTPException(400, "since must be a cursor returned by this endpoint")
+
+@router.get("/queue/today")
+def queue_today(store_id: int, compact: bool = False, since: str | None = None, session: Session = Depends(get_session), user: Principal = Depends(get_current_user)):
+    """
+    Today's bookings as full rows, or with compact=true (implied by since) as
+    {"cursor", "reset", "bookings"} holding only the queue card fields. Pass
+    the cursor back as ?since= to get just the bookings changed after it.
+    The cursor names its day: once that is no longer today (a poll across
+    midnight) the answer is a full snapshot with reset=true, and the client
+    replaces its cards instead of merging.
+    """
+    _check_store(user, store_id)
+    if not compact and since is None:
+        return _today_queue(session, store_id)
+    now = datetime.utcnow()
+    cursor = None
+    if since is not None:
+        day, cursor = _parse_cursor(since)
+        if day != now.date():
+            cursor = None
+    next_cursor = f"{now.date().isoformat()}_{(now - QUEUE_SYNC_OVERLAP).isoformat()}"
+    return {"cursor": next_cursor, "reset": cursor is None, "bookings": _compact_queue(session, store_id, cursor, now.date())}
+
+def _sse(message: dict) -> bytes:
+    return f"data: {json.dumps(message, separators=(',', ':'))}\n\n".encode()
+
+async def _queue_events(store_id: int, request: Request) -> AsyncIterator[bytes]:
+    """A snapshot of today's queue, then one message per change; a fresh snapshot after a resync or at midnight."""
+    # Subscribed on the first iteration, so a client gone before the body starts never holds a queue.
+    q = queue_hub.subscribe(store_id)
+    try:
+        day, resync = None, True
+        while True:
+            if resync or datetime.utcnow().date() != day:
+                day, resync = datetime.utcnow().date(), False
+                rows = await run_in_session(lambda s: jsonable_encoder(_today_queue(s, store_id)))
+                yield _sse({"type": "snapshot", "bookings": rows})
+            try:
+                message = await asyncio.wait_for(q.get(), settings.queue_stream_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield b": ping\n\n"  # keeps proxies from closing an idle stream
+                continue
+            if message is None:  # shutdown
+                return
+            if message is RESYNC:
+                resync = True
+                continue
+            yield _sse(message)
+    finally:
+        queue_hub.unsubscribe(store_id, q)
+
+@router.post("/queue/stream-ticket")
+def queue_stream_ticket(store_id: int, user: Principal = Depends(get_current_user)):
+    """A short-lived ticket for GET /queue/stream?store_id=&ticket=, so the access token stays out of URLs."""
+    _check_store(user, store_id)
+    return {"ticket": create_stream_ticket(user_id=user.id, store_id=store_id), "expires_in": settings.queue_stream_ticket_seconds}
+
+@router.get("/queue/stream")
+async def queue_stream(store_id: int, request: Request, user: Principal = Depends(get_stream_user)):
+    """
+    Server-Sent Events for a store's queue today: {"type": "snapshot", "bookings": [...]}
+    first, then {"type": "booking", "booking": {...}} for every new or changed booking and
+    {"type": "incident", "incident": {...}} for new incidents.
+    """
+    _check_store(user, store_id)
+    return StreamingResponse(_queue_events(store_id, request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/bookings/by-code/{code}")
+def booking_by_code(code: str, session: Session = Depends(get_session), user: Principal = Depends(get_current_user)):
+    booking = find_by_code(session, code)
+    if not booking:
+        raise HTTPException(404, "Not found")
+    if user.role != Role.HEAD_OFFICE_ADMIN and user.store_id != booking.store_id:
+        raise HTTPException(403, "Forbidden")
+    return booking
+
 class StatusIn(BaseModel):
     status: BookingStatus
 
 @router.patch("/bookings/{booking_id}/status")
-def update_status(booking_id: str, payload: StatusIn, session: Session = Depends(get_session), user: StaffUser = Depends(get_current_user)):
+def update_status(booking_id: str, payload: StatusIn, session: Session = Depends(get_session), user: Principal = Depends(get_current_user)):
     booking = session.get(Booking, booking_id)
     if not booking:
         raise HTTPException(404, "Not found")
@@ -39,7 +157,7 @@ def update_status(booking_id: str, payload: StatusIn, session: Session = Depends
 
     booking.status = payload.status
     booking.updated_at = datetime.utcnow()
-    session.add(booking); session.commit()
+    session.add(booking)
 
     mapping = {
         BookingStatus.ARRIVED: EventType.ARRIVED,
@@ -51,6 +169,7 @@ def update_status(booking_id: str, payload: StatusIn, session: Session = Depends
     ev = mapping.get(payload.status)
     if ev:
         log_event(session, booking_id=booking.id, store_id=booking.store_id, event_type=ev, actor_type=ActorType.STAFF, actor_staff_user_id=user.id)
+    session.commit()
     return {"ok": True, "status": booking.status}
 
 class IncidentIn(BaseModel):
@@ -60,13 +179,14 @@ class IncidentIn(BaseModel):
     note: str
 
 @router.post("/incidents")
-def incidents(payload: IncidentIn, session: Session = Depends(get_session), user: StaffUser = Depends(get_current_user)):
+def incidents(payload: IncidentIn, session: Session = Depends(get_session), user: Principal = Depends(get_current_user)):
     booking = session.get(Booking, payload.booking_id)
     if not booking:
         raise HTTPException(404, "Not found")
     if user.role != Role.HEAD_OFFICE_ADMIN and user.store_id != booking.store_id:
         raise HTTPException(403, "Forbidden")
     inc = Incident(booking_id=payload.booking_id, staff_user_id=user.id, severity=payload.severity, category=payload.category, note=payload.note)
-    session.add(inc); session.commit()
+    session.add(inc)
     log_event(session, booking_id=booking.id, store_id=booking.store_id, event_type=EventType.INCIDENT_LOGGED, actor_type=ActorType.STAFF, actor_staff_user_id=user.id)
+    session.commit()
     return {"ok": True, "id": inc.id}
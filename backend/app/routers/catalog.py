@@ -1,30 +1,20 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
-from ..deps import get_session
-from ..models import Store, Service, StaffUser
+from fastapi import APIRouter
+from ..catalog_cache import catalog
 
 router = APIRouter(tags=["catalog"])
 
 @router.get("/stores")
-def stores(session: Session = Depends(get_session)):
-    return session.exec(select(Store).where(Store.is_active==True).order_by(Store.name)).all()
+def stores():
+    return list(catalog.snapshot().stores)
 
 @router.get("/service-categories")
-def categories(store_id: int, session: Session = Depends(get_session)):
-    rows = session.exec(select(Service.category).where(Service.store_id==store_id, Service.active==True).distinct()).all()
-    cats = [r[0] if isinstance(r, tuple) else r for r in rows]
-    return sorted(cats)
+def categories(store_id: int):
+    return list(catalog.snapshot().categories(store_id))
 
 @router.get("/services")
-def services(store_id: int, category: str | None = None, q: str | None = None, limit: int = 25, offset: int = 0, session: Session = Depends(get_session)):
-    stmt = select(Service).where(Service.store_id==store_id, Service.active==True)
-    if category:
-        stmt = stmt.where(Service.category==category)
-    if q:
-        stmt = stmt.where(Service.name.ilike(f"%{q}%"))
-    return session.exec(stmt.order_by(Service.name).offset(offset).limit(limit)).all()
+def services(store_id: int, category: str | None = None, q: str | None = None, limit: int = 25, offset: int = 0):
+    return catalog.snapshot().services(store_id, category=category, q=q)[offset:offset + limit]
 
 @router.get("/consultants")
-def consultants(store_id: int, session: Session = Depends(get_session)):
-    stmt = select(StaffUser).where(StaffUser.store_id==store_id, StaffUser.role=="CONSULTANT", StaffUser.is_active==True)
-    return session.exec(stmt).all()
+def consultants(store_id: int):
+    return list(catalog.snapshot().consultants(store_id))
@@ -13,12 +13,15 @@ from telegram.ext import (
 
 # Your real bot logic (store/category/service/date/time/confirm -> booking)
 from ..telegram_bot import start, on_callback, on_text
+from ..update_queue import UpdateQueue
+from ..dedup import UpdateDeduplicator
+from ..telegram_outbound import application_builder
 
 router = APIRouter(prefix="/telegram", tags=["telegram"])
 
 
 def build_ptb_application(bot_token: str) -> Application:
-    app = Application.builder().token(bot_token).build()
+    app = application_builder(bot_token).build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CallbackQueryHandler(on_callback))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
@@ -42,7 +45,29 @@ async def telegram_webhook(
             raise HTTPException(status_code=401, detail="Invalid Telegram secret token")
 
     payload = await request.json()
+
+    # Redeliveries of an update we already took are acknowledged without any work.
+    dedup: UpdateDeduplicator | None = getattr(request.app.state, "telegram_dedup", None)
+    update_id = payload.get("update_id")
+    if dedup is not None and update_id is not None and await dedup.is_duplicate(update_id):
+        return {"ok": True, "duplicate": True}
+
     update = Update.de_json(payload, ptb_app.bot)
 
-    await ptb_app.process_update(update)
+    # Queue mode: ack at once and let the worker pool do the DB work and replies.
+    update_queue: UpdateQueue | None = getattr(request.app.state, "telegram_update_queue", None)
+    if update_queue is not None:
+        if not update_queue.submit(update):
+            # Telegram redelivers on non-2xx, so backpressure defers rather than loses the update.
+            if dedup is not None and update_id is not None:
+                await dedup.forget(update_id)
+            raise HTTPException(status_code=503, detail="Update queue full")
+        return {"ok": True}
+
+    try:
+        await ptb_app.process_update(update)
+    except Exception:
+        if dedup is not None and update_id is not None:
+            await dedup.forget(update_id)
+        raise
     return {"ok": True}
@@ -71,6 +71,23 @@ def create_access_token(staff_user: StaffUser) -> str:
     return jwt.encode(payload, settings.jwt_secret, algorithm=ALGORITHM)
 
 
+def create_stream_ticket(*, user_id: int, store_id: int) -> str:
+    """
+    Short-lived ticket for the queue stream, which has to carry its
+    credentials in the URL: good for one store's stream only, for
+    settings.queue_stream_ticket_seconds.
+    """
+    payload = {
+        "sub": str(user_id),
+        "type": "stream",
+        "store_id": store_id,
+        "exp": int((_utc_now() + timedelta(seconds=settings.queue_stream_ticket_seconds)).timestamp()),
+        "iat": int(_utc_now().timestamp()),
+        "jti": secrets.token_hex(8),
+    }
+    return jwt.encode(payload, settings.jwt_secret, algorithm=ALGORITHM)
+
+
 def create_refresh_token(*, session: Session, staff_user: StaffUser) -> str:
     """
     Create long-lived refresh token and store JTI in database.
@@ -1,173 +1,175 @@
 from __future__ import annotations
-from datetime import datetime, timedelta, date
-from typing import Optional
-import random, string
+from datetime import datetime, timedelta, date, time
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
 from sqlmodel import Session, select
 
-from .db import engine
-from .models import Store, Service, StaffUser, Customer, Booking, BookingStatus, EventType, ActorType, Feedback
-from .availability import list_available_start_times
-from .logic import log_event
+from .db import run_in_session
+from .models import Customer
+from .availability import list_available_start_times, list_available_range
+from .reservations import reserve_booking, customer_booking_at, SlotUnavailable
+from .catalog_cache import catalog
+from .keyboards import keyboards, service_label
+from .callback_data import Tap, decode, encode
+from .conversation_state import save_conversation, with_conversation_state
+from .telegram_outbound import application_builder
 
-def _code(prefix="BO"):
-    return f"{prefix}-" + "".join(random.choices(string.digits, k=4))
+def _back(tap: Tap) -> list[InlineKeyboardButton]:
+    return [InlineKeyboardButton("⬅ Back", callback_data=encode(tap))]
 
-def _with_session(fn):
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        with Session(engine) as session:
-            return await fn(update, context, session)
-    return wrapper
+def _time_keyboard(tap: Tap, times: list[str]) -> InlineKeyboardMarkup:
+    kb = [[InlineKeyboardButton(t, callback_data=encode(tap.to("time", at=time.fromisoformat(t))))] for t in times[:12]]
+    kb.append(_back(tap.to("consultant", day=None)))
+    return InlineKeyboardMarkup(kb)
 
 async def start_app(token: str):
-    app = Application.builder().token(token).build()
+    app = application_builder(token).build()
+    await catalog.snapshot_async()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CallbackQueryHandler(on_callback))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
     return app
 
-@_with_session
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE, session: Session):
+def _upcoming(d: date, times: list[str]) -> list[str]:
+    now = datetime.utcnow()
+    return [t for t in times if datetime.combine(d, time.fromisoformat(t)) > now]
+
+def _open_times(session: Session, *, store_id: int, service_id: int, d: date, consultant_id: int | None) -> list[str]:
+    return _upcoming(d, list_available_start_times(session, store_id=store_id, service_id=service_id, d=d, consultant_id=consultant_id))
+
+def _open_range(session: Session, **kwargs) -> dict[str, list[str]]:
+    return {ds: _upcoming(date.fromisoformat(ds), times) for ds, times in list_available_range(session, **kwargs).items()}
+
+def _book(session: Session, *, store_id: int, service_id: int, consultant_id: int | None, start: datetime, end: datetime, chat_id: str, first_name: str | None) -> tuple[str | None, list[str]]:
+    """
+    Runs on the DB pool: returns (booking_code, []) or (None, fresh times) when
+    the slot can't be booked. Confirm buttons never expire, so the start is
+    re-checked against the current grid (past or closed starts are refused),
+    and a repeated tap gets back the booking it already made.
+    """
+    cust = session.exec(select(Customer).where(Customer.telegram_chat_id==chat_id)).first()
+    if not cust:
+        cust = Customer(telegram_chat_id=chat_id, display_first_name=first_name)
+        session.add(cust); session.commit(); session.refresh(cust)
+    existing = customer_booking_at(session, store_id=store_id, service_id=service_id, customer_id=cust.id, start=start)
+    if existing is not None:
+        return existing.booking_code, []
+    times = _open_times(session, store_id=store_id, service_id=service_id, d=start.date(), consultant_id=consultant_id)
+    if start.strftime("%H:%M") not in times:
+        return None, times
+    try:
+        booking = reserve_booking(session, store_id=store_id, service_id=service_id, customer_id=cust.id, start=start, end=end, consultant_id=consultant_id, event_metadata={"channel":"telegram"}, idempotent=True)
+    except SlotUnavailable:
+        return None, _open_times(session, store_id=store_id, service_id=service_id, d=start.date(), consultant_id=consultant_id)
+    return booking.booking_code, []
+
+@with_conversation_state
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
-    stores = session.exec(select(Store).where(Store.is_active==True).order_by(Store.name)).all()
-    kb = [[InlineKeyboardButton(s.name, callback_data=f"store:{s.id}")] for s in stores]
-    await update.message.reply_text("Welcome to Bontle ✨\nChoose a store:", reply_markup=InlineKeyboardMarkup(kb))
+    await update.message.reply_text("Welcome to Bontle ✨\nChoose a store:", reply_markup=keyboards.stores())
 
-@_with_session
-async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE, session: Session):
+@with_conversation_state
+async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     store_id = context.user_data.get("store_id")
     if not store_id:
         await update.message.reply_text("Type /start to begin.")
         return
     qtxt = (update.message.text or "").strip()
-    services = session.exec(select(Service).where(Service.store_id==store_id, Service.active==True, Service.name.ilike(f"%{qtxt}%")).limit(10)).all()
+    services = (await catalog.snapshot_async()).services(store_id, q=qtxt)[:10]
+    back = _back(Tap("store", store_id))
     if not services:
-        await update.message.reply_text("No matching services. Tap Back.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅ Back", callback_data="back:category")]]))
+        await update.message.reply_text("No matching services. Tap Back.", reply_markup=InlineKeyboardMarkup([back]))
         return
-    kb = [[InlineKeyboardButton(f"{s.name} • R{(s.price_cents/100):.0f} • {s.duration_minutes}m", callback_data=f"service:{s.id}")] for s in services]
-    kb.append([InlineKeyboardButton("⬅ Back", callback_data="back:category")])
+    kb = [[InlineKeyboardButton(service_label(s), callback_data=encode(Tap("service", store_id, service_id=s.id)))] for s in services]
+    kb.append(back)
     await update.message.reply_text("Select a service:", reply_markup=InlineKeyboardMarkup(kb))
 
-@_with_session
-async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, session: Session):
+async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Every button carries the signed selection so far (see callback_data.py),
+    so taps need no per-user state and no lookups beyond the catalog cache.
+    Only the store is persisted, for the free-text service search.
+    """
     cq = update.callback_query
     await cq.answer()
-    data = cq.data or ""
-
-    if data.startswith("store:"):
-        store_id = int(data.split(":")[1])
-        context.user_data["store_id"] = store_id
-        cats = session.exec(select(Service.category).where(Service.store_id==store_id, Service.active==True).distinct()).all()
-        cats = [c[0] if isinstance(c, tuple) else c for c in cats]
-        kb = [[InlineKeyboardButton(c, callback_data=f"cat:{c}")] for c in sorted(cats)]
-        kb.append([InlineKeyboardButton("Search service 🔎", callback_data="search:service")])
-        await cq.edit_message_text("Choose a category:", reply_markup=InlineKeyboardMarkup(kb))
+    tap = decode(cq.data or "")
+    if tap is None:
+        await cq.edit_message_text("This menu has expired. Type /start to begin.")
         return
 
-    if data.startswith("cat:"):
-        cat = data.split(":",1)[1]
-        context.user_data["category"] = cat
-        store_id = context.user_data["store_id"]
-        services = session.exec(select(Service).where(Service.store_id==store_id, Service.category==cat, Service.active==True).order_by(Service.name).limit(12)).all()
-        kb = [[InlineKeyboardButton(f"{s.name} • R{(s.price_cents/100):.0f} • {s.duration_minutes}m", callback_data=f"service:{s.id}")] for s in services]
-        kb.append([InlineKeyboardButton("Search service 🔎", callback_data="search:service")])
-        kb.append([InlineKeyboardButton("⬅ Back", callback_data="back:store")])
-        await cq.edit_message_text("Select a service:", reply_markup=InlineKeyboardMarkup(kb))
+    if tap.action == "store":
+        if update.effective_user:
+            context.user_data["store_id"] = tap.store_id
+            await save_conversation(update.effective_user.id, {"store_id": tap.store_id})
+        await cq.edit_message_text("Choose a category:", reply_markup=keyboards.categories(tap.store_id))
         return
 
-    if data == "search:service":
-        await cq.edit_message_text("Type part of the service name to search (e.g. 'foundation')", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅ Back", callback_data="back:category")]]))
+    if tap.action == "cat":
+        markup = keyboards.services(tap.store_id, tap.category or 0)
+        if markup is None:
+            await cq.edit_message_text("This menu has expired. Choose a category:", reply_markup=keyboards.categories(tap.store_id))
+            return
+        await cq.edit_message_text("Select a service:", reply_markup=markup)
+        return
+
+    if tap.action == "search":
+        await cq.edit_message_text("Type part of the service name to search (e.g. 'foundation')", reply_markup=InlineKeyboardMarkup([_back(tap.to("store"))]))
         return
 
-    if data.startswith("service:"):
-        service_id = int(data.split(":")[1])
-        context.user_data["service_id"] = service_id
-        store_id = context.user_data["store_id"]
-        consultants = session.exec(select(StaffUser).where(StaffUser.store_id==store_id, StaffUser.role=="CONSULTANT", StaffUser.is_active==True)).all()
-        kb = [[InlineKeyboardButton("Skip (auto-assign)", callback_data="consultant:skip")]]
-        kb += [[InlineKeyboardButton(c.email.split("@")[0], callback_data=f"consultant:{c.id}")] for c in consultants[:10]]
-        kb.append([InlineKeyboardButton("⬅ Back", callback_data="back:category")])
-        await cq.edit_message_text("Choose a consultant (optional):", reply_markup=InlineKeyboardMarkup(kb))
+    if tap.action == "service":
+        await cq.edit_message_text("Choose a consultant (optional):", reply_markup=keyboards.consultants(tap.store_id, tap.service_id))
         return
 
-    if data.startswith("consultant:"):
-        val = data.split(":")[1]
-        context.user_data["consultant_id"] = None if val=="skip" else int(val)
+    if tap.action == "consultant":
         today = datetime.utcnow().date()
-        kb = [[InlineKeyboardButton((today+timedelta(days=i)).strftime("%a %d %b"), callback_data=f"date:{(today+timedelta(days=i)).isoformat()}")] for i in range(0,7)]
-        kb.append([InlineKeyboardButton("⬅ Back", callback_data="back:service")])
+        days = await run_in_session(_open_range, store_id=tap.store_id, service_id=tap.service_id, start=today, days=7, consultant_id=tap.consultant_id)
+        open_days = [date.fromisoformat(ds) for ds, times in days.items() if times]
+        back = _back(tap.to("service", consultant_id=None))
+        if not open_days:
+            await cq.edit_message_text("No slots available in the next 7 days.", reply_markup=InlineKeyboardMarkup([back]))
+            return
+        kb = [[InlineKeyboardButton(f"{d.strftime('%a %d %b')} • {len(days[d.isoformat()])} slots", callback_data=encode(tap.to("date", day=d)))] for d in open_days]
+        kb.append(back)
         await cq.edit_message_text("Choose a date:", reply_markup=InlineKeyboardMarkup(kb))
         return
 
-    if data.startswith("date:"):
-        ds = data.split(":")[1]
-        context.user_data["date_str"] = ds
-        store_id = context.user_data["store_id"]
-        service_id = context.user_data["service_id"]
-        consultant_id = context.user_data.get("consultant_id")
-        times = list_available_start_times(session, store_id=store_id, service_id=service_id, d=date.fromisoformat(ds), consultant_id=consultant_id)
+    if tap.action == "date":
+        times = await run_in_session(_open_times, store_id=tap.store_id, service_id=tap.service_id, d=tap.day, consultant_id=tap.consultant_id)
         if not times:
-            await cq.edit_message_text("No slots available. Choose another date.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅ Back", callback_data="back:consultant")]]))
+            await cq.edit_message_text("No slots available. Choose another date.", reply_markup=InlineKeyboardMarkup([_back(tap.to("consultant", day=None))]))
             return
-        kb = [[InlineKeyboardButton(t, callback_data=f"time:{t}")] for t in times[:12]]
-        kb.append([InlineKeyboardButton("⬅ Back", callback_data="back:consultant")])
-        await cq.edit_message_text("Choose a time:", reply_markup=InlineKeyboardMarkup(kb))
+        await cq.edit_message_text("Choose a time:", reply_markup=_time_keyboard(tap, times))
         return
 
-    if data.startswith("time:"):
-        t = data.split(":")[1]
-        store = session.get(Store, context.user_data["store_id"])
-        svc = session.get(Service, context.user_data["service_id"])
-        ds = context.user_data["date_str"]
-        consultant_id = context.user_data.get("consultant_id")
-        msg = f"Confirm booking:\nStore: {store.name}\nService: {svc.name} (R{svc.price_cents/100:.0f}, {svc.duration_minutes}m)\nDate: {ds} {t}\n"
-        if consultant_id:
-            c = session.get(StaffUser, consultant_id)
+    snap = await catalog.snapshot_async()
+    store = snap.store_by_id.get(tap.store_id)
+    svc = snap.service_by_id.get(tap.service_id)
+    if not store or not svc or tap.day is None or tap.at is None:
+        await cq.edit_message_text("That service is no longer available. Type /start to begin.")
+        return
+    dt_start = datetime.combine(tap.day, tap.at)
+    when = f"{tap.day.isoformat()} {tap.at.strftime('%H:%M')}"
+
+    if tap.action == "time":
+        msg = f"Confirm booking:\nStore: {store.name}\nService: {svc.name} (R{svc.price_cents/100:.0f}, {svc.duration_minutes}m)\nDate: {when}\n"
+        c = snap.consultant_by_id.get(tap.consultant_id) if tap.consultant_id else None
+        if c:
             msg += f"Consultant: {c.email.split('@')[0]}\n"
-        kb = [[InlineKeyboardButton("✅ Confirm", callback_data=f"confirm:{t}")],[InlineKeyboardButton("⬅ Back", callback_data="back:date")]]
+        kb = [[InlineKeyboardButton("✅ Confirm", callback_data=encode(tap.to("confirm")))], _back(tap.to("date", at=None))]
         await cq.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(kb))
         return
 
-    if data.startswith("confirm:"):
-        t = data.split(":")[1]
-        store_id = context.user_data["store_id"]
-        service_id = context.user_data["service_id"]
-        consultant_id = context.user_data.get("consultant_id")
-        ds = context.user_data["date_str"]
-        dt_start = datetime.fromisoformat(f"{ds}T{t}:00")
-        svc = session.get(Service, service_id)
+    if tap.action == "confirm":
         dt_end = dt_start + timedelta(minutes=svc.duration_minutes)
-
         chat_id = str(update.effective_chat.id)
         first_name = update.effective_user.first_name if update.effective_user else None
-        cust = session.exec(select(Customer).where(Customer.telegram_chat_id==chat_id)).first()
-        if not cust:
-            cust = Customer(telegram_chat_id=chat_id, display_first_name=first_name)
-            session.add(cust); session.commit(); session.refresh(cust)
-
-        booking = Booking(
-            booking_code=_code(),
-            store_id=store_id,
-            service_id=service_id,
-            consultant_id=consultant_id,
-            customer_id=cust.id,
-            scheduled_start_at=dt_start,
-            scheduled_end_at=dt_end,
-            status=BookingStatus.SCHEDULED,
-        )
-        session.add(booking); session.commit(); session.refresh(booking)
-        log_event(session, booking_id=booking.id, store_id=store_id, event_type=EventType.BOOKED, actor_type=ActorType.CUSTOMER, metadata={"channel":"telegram"})
-
-        await cq.edit_message_text(f"Booked ✅\nBooking code: {booking.booking_code}\nSee you at {ds} {t}.")
-        return
+        code, times = await run_in_session(_book, store_id=tap.store_id, service_id=tap.service_id, consultant_id=tap.consultant_id, start=dt_start, end=dt_end, chat_id=chat_id, first_name=first_name)
+        if code is None:
+            if not times:
+                await cq.edit_message_text("Sorry, that time is no longer available and the day is now full. Choose another date.", reply_markup=InlineKeyboardMarkup([_back(tap.to("consultant", day=None, at=None))]))
+                return
+            await cq.edit_message_text("Sorry, that time is no longer available. Choose another time:", reply_markup=_time_keyboard(tap.to("date", at=None), times))
+            return
 
-    if data.startswith("back:"):
-        dest = data.split(":")[1]
-        if dest=="store":
-            stores = session.exec(select(Store).where(Store.is_active==True).order_by(Store.name)).all()
-            kb = [[InlineKeyboardButton(s.name, callback_data=f"store:{s.id}")] for s in stores]
-            await cq.edit_message_text("Choose a store:", reply_markup=InlineKeyboardMarkup(kb))
-        else:
-            await cq.edit_message_text("Type /start to begin.")
+        await cq.edit_message_text(f"Booked ✅\nBooking code: {code}\nSee you at {when}.")
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import asyncio, itertools, logging, time
+from collections import OrderedDict
+from typing import Any, Iterable
+
+import httpx
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import Application, ApplicationBuilder, BaseRateLimiter
+from telegram.request import HTTPXRequest
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Not paced: long polling, and callback answers that stop the button spinner.
+_UNLIMITED = {"getUpdates", "answerCallbackQuery"}
+# Only the newest pending edit of a message is worth sending.
+_COALESCED = {"editMessageText", "editMessageReplyMarkup"}
+
+
+class TokenBucket:
+    """`rate` tokens a second up to `burst`; takers queue FIFO. `pause` holds everyone back (flood control)."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def take(self) -> float:
+        """Wait for a token; returns the seconds spent waiting."""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - started
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def refund(self) -> None:
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    @property
+    def idle(self) -> bool:
+        return not self._lock.locked() and self._tokens + (time.monotonic() - self._updated) * self.rate >= self.burst
+
+
+class OutboundLimiter(BaseRateLimiter[int]):
+    """
+    Paces every Bot API call from this process: one global bucket (Telegram's
+    ~30 messages/s per bot) and one bucket per chat (~1/s in private chats,
+    20/min in groups). A 429 pauses all sending for its retry_after, then the
+    call is retried up to `max_retries` times (per call via rate_limit_args).
+
+    Edits of the same message that queue up behind the chat's bucket are
+    coalesced: when an edit's turn comes and a newer edit of that message is
+    already waiting, it is dropped (the caller gets True) and only the
+    newest text is sent.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, group_per_minute: float, max_retries: int, max_chats: int = 10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_per_minute / 60
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, 1)  # evenly spaced: no burst over the per-second limit
+        self._chats: OrderedDict[Any, TokenBucket] = OrderedDict()
+        self._edits: dict[tuple, int] = {}
+        self._seq = itertools.count()
+        self.sent = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.retry_after = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id) -> TokenBucket | None:
+        if chat_id is None:
+            return None
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            group = str(chat_id).startswith("-")
+            bucket = self._chats[chat_id] = TokenBucket(self.group_rate if group else self.chat_rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                # Forget chats whose bucket has refilled; they behave like new ones anyway.
+                for key in [k for k, b in itertools.islice(self._chats.items(), len(self._chats) - self.max_chats) if b.idle]:
+                    del self._chats[key]
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _take(self, bucket: TokenBucket) -> None:
+        waited = await bucket.take()
+        if waited > 0.001:
+            self.throttled += 1
+            self.throttled_seconds += waited
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in _UNLIMITED:
+            return await callback(*args, **kwargs)
+        edit_key = None
+        if endpoint in _COALESCED:
+            edit_key = (endpoint, data.get("chat_id"), data.get("message_id"), data.get("inline_message_id"))
+            seq = self._edits[edit_key] = next(self._seq)
+        chat = self._chat_bucket(data.get("chat_id"))
+        retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        try:
+            for attempt in itertools.count():
+                if chat is not None:
+                    await self._take(chat)
+                if edit_key is not None and self._edits.get(edit_key) != seq:
+                    if chat is not None:
+                        chat.refund()
+                    self.coalesced += 1
+                    return True
+                await self._take(self._global)
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as exc:
+                    self.retry_after += 1
+                    self._global.pause(exc.retry_after)
+                    if attempt >= retries:
+                        self.failed += 1
+                        raise
+                    logger.info("Telegram flood control on %s, retrying in %ss", endpoint, exc.retry_after)
+                    continue
+                except TelegramError:
+                    self.failed += 1
+                    raise
+                self.sent += 1
+                return result
+        finally:
+            if edit_key is not None and self._edits.get(edit_key) == seq:
+                del self._edits[edit_key]
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent, "throttled": self.throttled, "throttled_seconds": round(self.throttled_seconds, 3),
+            "retry_after": self.retry_after, "coalesced": self.coalesced, "failed": self.failed,
+            "chats": len(self._chats), "pending_edits": len(self._edits),
+        }
+
+
+def build_request() -> HTTPXRequest:
+    """One keep-alive HTTP/1.1 pool shared by every outbound call; sized for the update workers plus batch sends."""
+    size = settings.telegram_http_pool_size
+    return HTTPXRequest(
+        connection_pool_size=size,
+        connect_timeout=settings.telegram_connect_timeout_seconds,
+        read_timeout=settings.telegram_read_timeout_seconds,
+        write_timeout=settings.telegram_read_timeout_seconds,
+        pool_timeout=settings.telegram_pool_timeout_seconds,
+        http_version="1.1",
+        httpx_kwargs={"limits": httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=settings.telegram_keepalive_seconds)},
+    )
+
+
+def build_limiter() -> OutboundLimiter:
+    return OutboundLimiter(
+        global_rate=settings.telegram_global_rate,
+        chat_rate=settings.telegram_chat_rate,
+        chat_burst=settings.telegram_chat_burst,
+        group_per_minute=settings.telegram_group_per_minute,
+        max_retries=settings.telegram_max_retries,
+    )
+
+
+def application_builder(token: str) -> ApplicationBuilder:
+    return Application.builder().token(token).request(build_request()).rate_limiter(build_limiter())
+
+
+async def send_batch(bot: Bot, messages: Iterable[dict], concurrency: int | None = None) -> list[bool]:
+    """
+    Send many messages (send_message kwargs each) through the bot's limiter.
+    Up to `concurrency` are in flight, enough to keep the global rate busy
+    across the round trip while replies to users wait behind few of them.
+    Failures such as a user who blocked the
+    bot are logged, not raised. Returns whether each message was delivered.
+    """
+    gate = asyncio.Semaphore(concurrency or settings.telegram_batch_concurrency)
+
+    async def one(kwargs: dict) -> bool:
+        async with gate:
+            try:
+                await bot.send_message(**kwargs)
+                return True
+            except TelegramError as exc:
+                logger.warning("Telegram send to %s failed: %s", kwargs.get("chat_id"), exc)
+                return False
+
+    return list(await asyncio.gather(*(one(m) for m in messages)))
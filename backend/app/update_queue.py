@@ -0,0 +1,110 @@
+from __future__ import annotations
+import asyncio, logging
+from collections import deque
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """
+    In-process ingestion queue for webhook updates.
+
+    Updates are appended to a per-chat lane; a chat with pending work sits at
+    most once in the shared ready queue, so a chat's updates run strictly in
+    order while any idle worker can pick up any other chat. The total number
+    of queued updates is bounded and a full queue rejects instead of blocking
+    the webhook.
+
+    Throughput is bounded on purpose: at most `workers` updates and one per
+    chat run at a time, so a burst of n updates with handler time h takes
+    about max(n / workers, updates per chat) * h, where inline processing
+    would run all of them at once.
+    """
+
+    def __init__(self, ptb_app: Application, workers: int = 16, maxsize: int = 1000):
+        self.ptb_app = ptb_app
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._lanes: dict[int, deque[Update]] = {}
+        self._ready: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.depth = 0
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @staticmethod
+    def _chat_key(update: Update) -> int:
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return update.update_id
+
+    def submit(self, update: Update) -> bool:
+        if self.depth >= self.maxsize:
+            self.dropped += 1
+            return False
+        key = self._chat_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            # New or idle chat: make it schedulable. A chat already in a
+            # worker's hands keeps its lane and is re-queued when that update finishes.
+            lane = self._lanes[key] = deque()
+            self._ready.put_nowait(key)
+        lane.append(update)
+        self.depth += 1
+        self.enqueued += 1
+        self._idle.clear()
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            update = lane.popleft()
+            try:
+                await self.ptb_app.process_update(update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Telegram update %s failed", update.update_id)
+            finally:
+                self.depth -= 1
+                if lane:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._lanes[key]
+                if self.depth == 0:
+                    self._idle.set()
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work(), name=f"telegram-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Telegram update queue not drained on shutdown (%s pending)", self.depth)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "depth": self.depth,
+            "capacity": self.maxsize,
+            "active_chats": len(self._lanes),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -1,69 +1,52 @@
 from sqlmodel import Session, text
 
-VIEWS_SQL = [
-"""
-DROP VIEW IF EXISTS v_daily_store_ops;
-CREATE VIEW v_daily_store_ops AS
-SELECT store_id,
-       DATE(scheduled_start_at) AS day,
-       COUNT(*) AS bookings,
-       SUM(CASE WHEN status='COMPLETED' THEN 1 ELSE 0 END) AS completed,
-       SUM(CASE WHEN status='NO_SHOW' THEN 1 ELSE 0 END) AS no_show,
-       SUM(CASE WHEN status='CANCELLED' THEN 1 ELSE 0 END) AS cancelled
-FROM booking
-GROUP BY store_id, DATE(scheduled_start_at);
+from .rollups import get_state, set_state
+
+# Power BI views. Each is a thin select over the rollup tables kept current by
+# rollups.refresh_rollups, so a dashboard query scales with days, not bookings.
+# Bump VIEWS_VERSION when a definition changes; startup only rebuilds then.
+VIEWS_VERSION = "2"
+VIEWS_KEY = "views_version"
+
+VIEWS = {
+"v_daily_store_ops": """
+SELECT store_id, day, bookings, completed, no_show, cancelled
+FROM dailystorerollup
 """,
-"""
-DROP VIEW IF EXISTS v_peak_hours;
-CREATE VIEW v_peak_hours AS
-SELECT store_id,
-       EXTRACT(HOUR FROM scheduled_start_at) AS hour,
-       COUNT(*) AS bookings
-FROM booking
-GROUP BY store_id, EXTRACT(HOUR FROM scheduled_start_at);
+"v_peak_hours": """
+SELECT store_id, hour, SUM(bookings) AS bookings
+FROM hourlyrollup
+GROUP BY store_id, hour
 """,
-"""
-DROP VIEW IF EXISTS v_service_mix;
-CREATE VIEW v_service_mix AS
-SELECT b.store_id,
+"v_service_mix": """
+SELECT r.store_id,
        s.category,
        s.name AS service_name,
-       COUNT(*) AS bookings,
-       SUM(s.price_cents) AS value_cents
-FROM booking b
-JOIN service s ON s.id = b.service_id
-GROUP BY b.store_id, s.category, s.name;
+       SUM(r.bookings) AS bookings,
+       SUM(r.bookings * s.price_cents) AS value_cents
+FROM servicedailyrollup r
+JOIN service s ON s.id = r.service_id
+GROUP BY r.store_id, s.category, s.name
 """,
-"""
-DROP VIEW IF EXISTS v_consultant_performance;
-CREATE VIEW v_consultant_performance AS
+"v_consultant_performance": """
 SELECT store_id,
-       consultant_id,
-       DATE(scheduled_start_at) AS day,
-       COUNT(*) AS bookings,
-       SUM(CASE WHEN status='COMPLETED' THEN 1 ELSE 0 END) AS completed,
-       SUM(CASE WHEN status='NO_SHOW' THEN 1 ELSE 0 END) AS no_show
-FROM booking
-GROUP BY store_id, consultant_id, DATE(scheduled_start_at);
+       NULLIF(consultant_id, 0) AS consultant_id,
+       day, bookings, completed, no_show
+FROM consultantdailyrollup
+""",
+"v_incident_rates": """
+SELECT store_id, day, incidents, bookings,
+       ROUND(incidents * 100.0 / NULLIF(bookings, 0), 2) AS incidents_per_100
+FROM incidentdailyrollup
 """,
-"""
-DROP VIEW IF EXISTS v_incident_rates;
-CREATE VIEW v_incident_rates AS
-SELECT b.store_id,
-       DATE(i.created_at) AS day,
-       COUNT(i.id) AS incidents,
-       COUNT(DISTINCT b.id) AS bookings,
-       ROUND(
-           (COUNT(i.id)::decimal / NULLIF(COUNT(DISTINCT b.id),0)) * 100,
-           2
-       ) AS incidents_per_100
-FROM incident i
-JOIN booking b ON b.id = i.booking_id
-GROUP BY b.store_id, DATE(i.created_at);
-"""
-]
+}
 
 def ensure_views(session: Session):
-    for sql in VIEWS_SQL:
-        session.exec(text(sql))
+    # One statement per execute: SQLite's driver rejects multi-statement strings.
+    if get_state(session, VIEWS_KEY) == VIEWS_VERSION:
+        return
+    for name, select_sql in VIEWS.items():
+        session.exec(text(f"DROP VIEW IF EXISTS {name}"))
+        session.exec(text(f"CREATE VIEW {name} AS {select_sql}"))
+    set_state(session, VIEWS_KEY, VIEWS_VERSION)
     session.commit()
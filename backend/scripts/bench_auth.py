@@ -0,0 +1,115 @@
+"""
+Per-request auth overhead: JWT check + StaffUser lookup on every request
+(the old get_current_user) vs JWT check + principal cache.
+
+Times --requests calls of each resolver directly and through GET /auth/me,
+counting SQL statements, then checks that deactivating the user and
+changing its role take effect on the next request, and that an
+invalidation landing while a cache miss is loading the user is not
+overwritten by the stale load.
+
+Run from backend/:  python scripts/bench_auth.py [--requests 5000]
+"""
+import argparse, os, sys, tempfile, time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=5000)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/auth.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app import deps
+from app.db import engine, init_db
+from app.models import Role, StaffUser
+from app.principal_cache import principals
+from app.routers import auth
+from app.security import create_access_token, decode_token
+from app.seed import seed_if_needed
+
+statements = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(*_):
+    global statements
+    statements += 1
+
+
+def uncached(token: str) -> StaffUser:
+    """The pre-cache resolver: decode, then load the user in a request session."""
+    data = decode_token(token)
+    with Session(engine) as session:
+        user = session.exec(select(StaffUser).where(StaffUser.id == int(data["sub"]))).first()
+        if not user or not user.is_active:
+            raise HTTPException(401)
+        return user
+
+
+def run(label: str, fn) -> None:
+    global statements
+    fn()  # warm
+    statements = 0
+    t0 = time.perf_counter()
+    for _ in range(args.requests):
+        fn()
+    us = (time.perf_counter() - t0) / args.requests * 1e6
+    print(f"{label:>28} {us:>9.1f} {statements / args.requests:>13.2f}")
+
+
+def main():
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+        manager = s.exec(select(StaffUser).where(StaffUser.role == Role.MANAGER)).first()
+        token, manager_id = create_access_token(manager), manager.id
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    print(f"{'resolver':>28} {'us/request':>9} {'SQL/request':>13}")
+    run("uncached, direct", lambda: uncached(token))
+    run("principal cache, direct", lambda: deps.principal_from_token(token))
+    app.dependency_overrides[deps.get_current_user] = lambda: uncached(token)
+    run("uncached, GET /auth/me", lambda: client.get("/auth/me", headers=headers))
+    app.dependency_overrides.clear()
+    run("principal cache, GET /auth/me", lambda: client.get("/auth/me", headers=headers))
+    print("cache:", principals.stats())
+
+    # A role change commits (and invalidates) after the miss read the old row:
+    # the load must not put the old principal back for the TTL.
+    principals.invalidate(manager_id)
+    pending = [manager_id]
+    def invalidate_mid_load(*_):
+        while pending:
+            principals.invalidate(pending.pop())
+    event.listen(engine, "after_cursor_execute", invalidate_mid_load)
+    principals.get(manager_id)
+    event.remove(engine, "after_cursor_execute", invalidate_mid_load)
+    hits = principals.hits
+    principals.get(manager_id)
+    assert principals.hits == hits, "a load that raced an invalidation was cached"
+    print("an invalidation during a load kept the stale principal out of the cache")
+
+    with Session(engine) as s:
+        user = s.get(StaffUser, manager_id)
+        user.role = Role.CONSULTANT
+        s.add(user); s.commit()
+    assert client.get("/auth/me", headers=headers).json()["role"] == Role.CONSULTANT.value, "role change not picked up"
+    with Session(engine) as s:
+        user = s.get(StaffUser, manager_id)
+        user.is_active = False
+        s.add(user); s.commit()
+    r = client.get("/auth/me", headers=headers)
+    assert r.status_code == 401 and r.json()["detail"] == "Inactive user", f"deactivated user: {r.status_code} {r.text}"
+    print("role change and deactivation took effect on the next request")
+
+
+if __name__ == "__main__":
+    main()
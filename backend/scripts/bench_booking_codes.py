@@ -0,0 +1,53 @@
+"""
+Generate a million booking codes for one store and report raw collision rate,
+generation throughput and check-character coverage.
+
+Run from backend/:  python scripts/bench_booking_codes.py [--count 1000000]
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.booking_codes import generate_code, normalize_code, ALPHABET, RANDOM_CHARS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--store-id", type=int, default=1)
+    args = parser.parse_args()
+
+    seen: set[str] = set()
+    collisions = 0
+    t0 = time.perf_counter()
+    for _ in range(args.count):
+        code = generate_code(args.store_id)
+        if code in seen:
+            collisions += 1
+        else:
+            seen.add(code)
+    elapsed = time.perf_counter() - t0
+
+    space = 32 ** RANDOM_CHARS
+    expected = args.count * (args.count - 1) / (2 * space)
+    print(f"codes={args.count:,} elapsed={elapsed:.2f}s throughput={args.count / elapsed:,.0f}/s")
+    print(f"raw collisions={collisions} rate={collisions / args.count:.2e} (birthday estimate {expected:.1f}; each is absorbed by one retry)")
+
+    # Every single-character substitution must be rejected by the check character.
+    rnd = random.Random(5)
+    sample = rnd.sample(sorted(seen), 2000)
+    undetected = 0
+    for code in sample:
+        assert normalize_code(code) == code
+        assert normalize_code(code.lower().replace("-", " ")) == code
+        i = rnd.choice([k for k, c in enumerate(code) if c != "-" and k > 0])
+        typo = code[:i] + rnd.choice([c for c in ALPHABET if c != code[i]]) + code[i + 1:]
+        if normalize_code(typo) is not None:
+            undetected += 1
+    print(f"single-char typos undetected={undetected}/{len(sample)}")
+    if undetected:
+        raise SystemExit("FAIL: check character missed a substitution")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Concurrent write burst against a file SQLite database: a bare engine
+(the old create_engine defaults: rollback journal, pysqlite 5s lock wait)
+vs the engine profile from app.db (WAL, synchronous=NORMAL, busy_timeout,
+timed pool).
+Counts "database is locked" failures and prints pool wait metrics.
+
+Run from backend/:  python scripts/bench_db_pool.py [--threads 32] [--writes 50]
+"""
+import argparse, os, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--threads", type=int, default=32)
+parser.add_argument("--writes", type=int, default=50)
+args = parser.parse_args()
+
+tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/profile.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import create_engine
+
+from app import db
+
+
+def burst(engine) -> tuple[int, int, float]:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS hits (id INTEGER PRIMARY KEY, worker INT, n INT)"))
+
+    def worker(w: int) -> tuple[int, int]:
+        ok = locked = 0
+        for n in range(args.writes):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text("INSERT INTO hits (worker, n) VALUES (:w, :n)"), {"w": w, "n": n})
+                    conn.execute(text("SELECT count(*) FROM hits WHERE worker = :w"), {"w": w}).scalar()
+                ok += 1
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+        return ok, locked
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as ex:
+        results = list(ex.map(worker, range(args.threads)))
+    return sum(r[0] for r in results), sum(r[1] for r in results), time.perf_counter() - t0
+
+
+def main():
+    bare = create_engine(f"sqlite:///{tmp}/bare.db", connect_args={"check_same_thread": False})
+    print(f"threads={args.threads} writes/thread={args.writes}")
+    print(f"{'engine':>8} {'ok':>6} {'locked':>7} {'writes/s':>9}")
+    for name, engine in (("bare", bare), ("profile", db.engine)):
+        ok, locked, elapsed = burst(engine)
+        print(f"{name:>8} {ok:>6} {locked:>7} {ok / elapsed:>9.0f}")
+    print("pool:", db.pool_stats())
+
+
+if __name__ == "__main__":
+    main()
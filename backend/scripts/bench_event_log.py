@@ -0,0 +1,112 @@
+"""
+Status updates per second through the real PATCH /bookings/{id}/status
+handler, with the event log in each mode:
+
+  two-commit      the old path: commit the status, then commit the event
+  transactional   status and event in one commit
+  write_behind    status commit only; events bulk-inserted in the background
+
+Every mode runs SCHEDULED -> ARRIVED on its own set of bookings and the
+script checks one ARRIVED event per booking landed afterwards. The modes
+take turns for --rounds rounds (rotating which goes first, since later runs
+see a bigger table) and the median and range per mode are reported; single
+runs differ by more than the gap between the modes.
+
+Run from backend/:  python scripts/bench_event_log.py [--updates 2000] [--threads 8] [--rounds 5] [--database-url URL]
+"""
+import argparse, os, statistics, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--updates", type=int, default=2000)
+parser.add_argument("--threads", type=int, default=8)
+parser.add_argument("--rounds", type=int, default=5)
+parser.add_argument("--database-url", default=None)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/events.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlmodel import Session, select, func
+from app import logic
+from app.config import settings
+from app.db import engine, init_db
+from app.event_log import event_log_writer
+from app.models import Booking, BookingStatus, Customer, EventLog, EventType, Role, Service, Station
+from app.routers import bookings
+from app.routers.bookings import StatusIn, update_status
+from app.seed import seed_if_needed
+
+ADMIN = SimpleNamespace(id=None, role=Role.HEAD_OFFICE_ADMIN, store_id=None)
+runs = 0
+
+
+def make_bookings(n: int) -> list[str]:
+    global runs
+    runs += 1
+    with Session(engine) as s:
+        station = s.exec(select(Station)).first()
+        svc = s.exec(select(Service).where(Service.store_id == station.store_id)).first()
+        cust = Customer(telegram_chat_id=f"bench-{time.time_ns()}")
+        s.add(cust); s.commit(); s.refresh(cust)
+        base = datetime(2030, 1, 1) + timedelta(days=30 * runs)
+        rows = [Booking(booking_code=f"EV{runs}-{i}", store_id=station.store_id, station_id=station.id, service_id=svc.id, customer_id=cust.id,
+                        scheduled_start_at=base + timedelta(minutes=i), scheduled_end_at=base + timedelta(minutes=i + 1)) for i in range(n)]
+        s.add_all(rows); s.commit()
+        return [b.id for b in rows]
+
+
+def two_commit_log_event(session, **kw):
+    # Pre-change behaviour: the route had already committed, and the event gets its own commit.
+    session.commit()
+    real_log_event(session, **kw)
+    session.commit()
+
+real_log_event = logic.log_event
+
+
+def run(mode: str) -> float:
+    ids = make_bookings(args.updates)
+    settings.event_log_mode = "transactional" if mode == "two-commit" else mode
+    bookings.log_event = two_commit_log_event if mode == "two-commit" else real_log_event
+    if mode == "write_behind":
+        event_log_writer.start()
+
+    def one(booking_id: str):
+        with Session(engine) as s:
+            update_status(booking_id, StatusIn(status=BookingStatus.ARRIVED), session=s, user=ADMIN)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as ex:
+        list(ex.map(one, ids))
+    elapsed = time.perf_counter() - t0
+    if mode == "write_behind":
+        event_log_writer.stop()
+
+    with Session(engine) as s:
+        logged = s.exec(select(func.count()).select_from(EventLog).where(EventLog.booking_id.in_(ids), EventLog.event_type == EventType.ARRIVED)).one()
+    assert logged == len(ids), f"{mode}: {logged} events for {len(ids)} updates"
+    return len(ids) / elapsed
+
+
+def main():
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+    modes = ["two-commit", "transactional", "write_behind"]
+    results: dict[str, list[float]] = {m: [] for m in modes}
+    for r in range(args.rounds):
+        for mode in modes[r % len(modes):] + modes[:r % len(modes)]:
+            results[mode].append(run(mode))
+    print(f"updates={args.updates} threads={args.threads} rounds={args.rounds} db={engine.dialect.name}")
+    print(f"{'mode':>14} {'median/s':>9} {'min':>6} {'max':>6}")
+    for mode in modes:
+        rates = results[mode]
+        print(f"{mode:>14} {statistics.median(rates):>9.0f} {min(rates):>6.0f} {max(rates):>6.0f}")
+    print("writer:", event_log_writer.stats())
+
+
+if __name__ == "__main__":
+    main()
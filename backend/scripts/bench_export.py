@@ -0,0 +1,127 @@
+"""
+Peak memory of the bookings CSV export over a large synthetic range.
+
+Seeds --rows bookings for one store into a throwaway SQLite file, then runs
+the export in a fresh child process per mode and reports the peak RSS growth:
+
+  buffered   the old path: .all() + one StringIO + one Response body
+  streaming  GET /exports/bookings.csv as shipped (server-side cursor, chunks)
+  gzip       the same with Accept-Encoding: gzip
+
+Exits non-zero if streaming grows RSS by more than --max-mb.
+
+Run from backend/:  python scripts/bench_export.py [--rows 1000000] [--max-mb 64]
+"""
+import argparse, asyncio, os, resource, subprocess, sys, tempfile, time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=1_000_000)
+parser.add_argument("--max-mb", type=float, default=64.0)
+parser.add_argument("--child", choices=["buffered", "streaming", "gzip"])
+parser.add_argument("--db")
+args = parser.parse_args()
+
+db_path = args.db or f"{tempfile.mkdtemp()}/export.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.db import engine, init_db
+from app.models import Customer, Role, Service, Station
+from app.routers.analytics import EXPORT_SQL, export_bookings_csv
+from app.seed import seed_if_needed
+
+START, END = "2020-01-01", "2035-12-31"
+# The same half-open range the router binds for START..END inclusive.
+RANGE = {"start": datetime(2020, 1, 1), "end": datetime(2036, 1, 1)}
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
+
+
+def seed(n: int) -> int:
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+        station = s.exec(select(Station)).first()
+        svc = s.exec(select(Service).where(Service.store_id == station.store_id)).first()
+        cust = Customer(telegram_chat_id="export-bench")
+        s.add(cust); s.commit(); s.refresh(cust)
+        store_id, station_id, svc_id, cust_id = station.store_id, station.id, svc.id, cust.id
+    base = datetime(2024, 1, 1)
+    insert = text("""
+        INSERT INTO booking (id, booking_code, store_id, station_id, service_id, customer_id,
+                             scheduled_start_at, scheduled_end_at, status, source_channel, created_at, updated_at)
+        VALUES (:id, :code, :store_id, :station_id, :service_id, :customer_id, :start, :end, 'COMPLETED', 'TELEGRAM', :start, :start)
+    """)
+    batch = 50_000
+    with engine.begin() as conn:
+        for lo in range(0, n, batch):
+            rows = []
+            for i in range(lo, min(lo + batch, n)):
+                start = base + timedelta(minutes=i)
+                rows.append({"id": f"exp-{i:08d}", "code": f"EXP{i:08d}", "store_id": store_id, "station_id": station_id,
+                             "service_id": svc_id, "customer_id": cust_id, "start": start, "end": start + timedelta(minutes=1)})
+            conn.execute(insert, rows)
+    return store_id
+
+
+def buffered(store_id: int) -> int:
+    import csv, io
+    with Session(engine) as session:
+        rows = session.exec(EXPORT_SQL, params={"store_id": store_id, **RANGE}).all()
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(rows[0]._mapping.keys()))
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(dict(r._mapping))
+        return len(output.getvalue().encode())
+
+
+async def streamed(store_id: int, gzip: bool) -> int:
+    user = SimpleNamespace(role=Role.HEAD_OFFICE_ADMIN, store_id=None)
+    resp = export_bookings_csv(store_id, START, END, accept_encoding="gzip" if gzip else "", user=user)
+    size = 0
+    async for chunk in resp.body_iterator:
+        size += len(chunk)
+    return size
+
+
+def child(mode: str) -> None:
+    with Session(engine) as s:
+        store_id = s.exec(text("SELECT store_id FROM booking WHERE id = 'exp-00000000'")).one()[0]
+    before = peak_rss_mb()
+    t0 = time.perf_counter()
+    size = buffered(store_id) if mode == "buffered" else asyncio.run(streamed(store_id, mode == "gzip"))
+    print(f"{mode} {peak_rss_mb() - before:.1f} {size} {time.perf_counter() - t0:.1f}")
+
+
+def main():
+    if args.child:
+        child(args.child)
+        return
+    t0 = time.perf_counter()
+    seed(args.rows)
+    print(f"seeded {args.rows} bookings in {time.perf_counter() - t0:.0f}s")
+    print(f"{'mode':>10} {'peak RSS +MB':>13} {'body MB':>8} {'secs':>6}")
+    results = {}
+    for mode in ("buffered", "streaming", "gzip"):
+        # mmap'd database pages are shared page cache but still show up in RSS; turn
+        # mmap off in the children so the number is the export's own memory.
+        env = {**os.environ, "SQLITE_MMAP_SIZE": "0"}
+        out = subprocess.run([sys.executable, __file__, "--child", mode, "--db", db_path], capture_output=True, text=True, check=True, env=env).stdout.split()
+        _, growth, size, secs = out[-4:]
+        results[mode] = float(growth)
+        print(f"{mode:>10} {float(growth):>13.1f} {int(size) / 2**20:>8.1f} {float(secs):>6.1f}")
+    ok = results["streaming"] <= args.max_mb and results["gzip"] <= args.max_mb
+    print("OK" if ok else "FAIL", f"streaming peak growth within {args.max_mb} MB")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+/analytics/daily: the old per-request aggregate vs the in-memory KPI counters.
+
+Seeds --rows bookings for store 1 on one day into a throwaway SQLite file,
+then times --requests calls of:
+
+  1. the old COUNT/SUM query over the day's bookings,
+  2. the endpoint served from the counters (200 with an ETag),
+  3. the endpoint revalidated with If-None-Match (304, no body).
+
+Then checks that a list of tags, * and the strong form of the weak tag
+in If-None-Match revalidate too. Finally books and moves a few bookings
+through reserve_booking and PATCH /bookings/{id}/status, and commits a
+status change while a reload is reading, and checks the counters still
+match the DB.
+
+Run from backend/:  python scripts/bench_kpis.py [--rows 50000] [--requests 2000]
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=50_000)
+parser.add_argument("--requests", type=int, default=2000)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/kpis.db"
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, text
+from sqlmodel import Session, select
+
+from app.db import engine, init_db
+from app.deps import get_current_user
+from app.kpis import FIELDS, _load, kpis
+from app.models import Booking, BookingStatus, Customer, Role, Service, StaffUser, Station
+from app.reservations import reserve_booking
+from app.routers import analytics, bookings
+from app.seed import seed_if_needed
+
+STATUSES = ["SCHEDULED", "COMPLETED", "COMPLETED", "NO_SHOW", "CANCELLED"]
+
+LEGACY_SQL = text("""
+    SELECT COUNT(*) as bookings,
+           SUM(CASE WHEN status='COMPLETED' THEN 1 ELSE 0 END) as completed,
+           SUM(CASE WHEN status='NO_SHOW' THEN 1 ELSE 0 END) as no_show,
+           SUM(CASE WHEN status='CANCELLED' THEN 1 ELSE 0 END) as cancelled
+    FROM booking
+    WHERE store_id=:store_id AND scheduled_start_at>=:start AND scheduled_start_at<:end
+""")
+
+
+def seed(day: datetime) -> tuple[int, int]:
+    init_db()
+    rng = random.Random(3)
+    with Session(engine) as s:
+        seed_if_needed(s)
+        station = s.exec(select(Station).where(Station.store_id == 1)).first()
+        service = s.exec(select(Service).where(Service.store_id == 1)).first()
+        cust = Customer(telegram_chat_id="kpi-bench")
+        s.add(cust); s.commit(); s.refresh(cust)
+        cust_id, station_id, service_id = cust.id, station.id, service.id
+    rows = []
+    for i in range(args.rows):
+        at = day + timedelta(seconds=rng.randrange(86400))
+        rows.append({"id": f"kb-{i}", "booking_code": f"KB{i}", "store_id": 1, "station_id": station_id, "service_id": service_id,
+                     "consultant_id": None, "customer_id": cust_id, "scheduled_start_at": at, "scheduled_end_at": at + timedelta(minutes=30),
+                     "status": rng.choice(STATUSES), "source_channel": "TELEGRAM", "created_at": at, "updated_at": at})
+    with engine.begin() as conn:
+        conn.execute(insert(Booking.__table__), rows)
+    return cust_id, service_id
+
+
+def rate(fn) -> float:
+    t0 = time.perf_counter()
+    for _ in range(args.requests):
+        fn()
+    return args.requests / (time.perf_counter() - t0)
+
+
+def check(store_id: int, day: datetime) -> None:
+    with Session(engine) as s:
+        db = _load(s, day, day + timedelta(days=1), store_id).get(store_id, [0, 0, 0, 0])
+    cached = kpis.get(store_id, day.date())
+    assert cached == dict(zip(FIELDS, db)), f"store {store_id} {day.date()}: counters {cached} != db {db}"
+
+
+def main():
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    t0 = time.perf_counter()
+    cust_id, service_id = seed(day)
+    print(f"seeded {args.rows} bookings in {time.perf_counter() - t0:.1f}s")
+    kpis.seed(day.date())
+
+    with Session(engine) as s:
+        admin = s.exec(select(StaffUser).where(StaffUser.role == Role.HEAD_OFFICE_ADMIN)).first()
+        s.expunge(admin)
+    app = FastAPI()
+    app.include_router(analytics.router)
+    app.include_router(bookings.router)
+    app.dependency_overrides[get_current_user] = lambda: admin
+    client = TestClient(app)
+    url = f"/analytics/daily?store_id=1&date_str={day.date().isoformat()}"
+
+    params = {"store_id": 1, "start": day, "end": day + timedelta(days=1)}
+    def legacy():
+        with Session(engine) as s:
+            s.exec(LEGACY_SQL, params=params).one()
+    first = client.get(url)
+    etag = first.headers["etag"]
+    statuses = []
+    print(f"{'path':>22} {'req/s':>9}")
+    print(f"{'aggregate query':>22} {rate(legacy):>9.0f}")
+    print(f"{'counters, 200':>22} {rate(lambda: client.get(url)):>9.0f}")
+    print(f"{'counters, 304':>22} {rate(lambda: statuses.append(client.get(url, headers={'If-None-Match': etag}).status_code)):>9.0f}")
+    print(f"304 rate: {statuses.count(304) / len(statuses):.0%}  body: {first.json()}")
+    for header in (f'"other", {etag}', "*", etag.removeprefix("W/")):
+        assert client.get(url, headers={"If-None-Match": header}).status_code == 304, header
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # Writes through the app paths move the counters without a reload.
+    loads = kpis.loads
+    tomorrow = day + timedelta(days=1)
+    kpis.get(2, tomorrow.date())
+    with Session(engine) as s:
+        service2 = s.exec(select(Service).where(Service.store_id == 2)).first()
+        made = []
+        for h in range(9, 13):
+            start = tomorrow.replace(hour=h)
+            made.append(reserve_booking(s, store_id=2, service_id=service2.id, customer_id=cust_id, start=start, end=start + timedelta(minutes=service2.duration_minutes)).id)
+        target = s.exec(select(Booking).where(Booking.store_id == 1, Booking.status == BookingStatus.SCHEDULED)).first().id
+    for booking_id, path in [(made[0], ["ARRIVED", "IN_SERVICE", "COMPLETED"]), (made[1], ["NO_SHOW"]), (made[2], ["CANCELLED"]), (target, ["NO_SHOW"])]:
+        for status in path:
+            assert client.patch(f"/bookings/{booking_id}/status", json={"status": status}).status_code == 200
+    assert kpis.loads == loads + 1, "counters were reloaded instead of updated in place"
+    check(2, tomorrow)
+    check(1, day)
+
+    # A status change that commits after a reload has read the day must not be lost.
+    kpis._loaded_at[(1, day.date())] = float("-inf")
+    with Session(engine) as s:
+        late = s.exec(select(Booking.id).where(Booking.store_id == 1, Booking.status == BookingStatus.SCHEDULED)).first()
+    pending = [late]
+    def commit_mid_load(conn, cursor, statement, *_):
+        while pending and "GROUP BY" in statement:
+            assert client.patch(f"/bookings/{pending.pop()}/status", json={"status": "NO_SHOW"}).status_code == 200
+    event.listen(engine, "after_cursor_execute", commit_mid_load)
+    kpis.get(1, day.date())
+    event.remove(engine, "after_cursor_execute", commit_mid_load)
+    check(1, day)
+    revalidated = client.get(url, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 200 and revalidated.headers["etag"] != etag, "ETag did not change with the counts"
+    print("counters match the DB after reserve_booking, status changes and a change during a reload; ETag moved with them")
+    print("kpis:", kpis.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Outbound Telegram calls: PTB's default bot vs the outbound layer
+(app/telegram_outbound.py), against the local fake Bot API
+(fake_telegram.py) enforcing 30 messages/s per bot and 1/s per chat.
+
+  1. broadcast: --messages messages to --chats chats, all at once; the
+     default bot hits 429s and loses messages, the layer delivers all of them,
+  2. interactive reply: a reply to a new chat sent mid-broadcast, timed,
+  3. flood control: the fake answers 429 (retry_after) to everything for a
+     moment mid-batch; the layer waits it out and delivers all,
+  4. edit coalescing: --edits rapid edits of one message; only a few reach
+     the API and the last text wins,
+  5. keep-alive: TCP connections opened per client.
+
+Run from backend/:  python scripts/bench_outbound.py [--messages 300] [--chats 100] [--edits 20]
+"""
+import argparse, asyncio, os, socket, sys, tempfile, time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--messages", type=int, default=300)
+parser.add_argument("--chats", type=int, default=100)
+parser.add_argument("--edits", type=int, default=20)
+parser.add_argument("--latency", type=float, default=0.02, help="simulated Bot API round trip, seconds")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/outbound.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import uvicorn
+from telegram.error import RetryAfter
+from telegram.ext import Application
+
+from app.telegram_outbound import application_builder, send_batch
+from fake_telegram import FakeTelegram
+
+TOKEN = "123456:fake"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def broadcast(offset: int = 0) -> list[dict]:
+    return [{"chat_id": 1000 + offset + i % args.chats, "text": f"Reminder {i}"} for i in range(args.messages)]
+
+
+async def serve(fake: FakeTelegram) -> tuple[str, uvicorn.Server, asyncio.Task]:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(fake.app, port=port, log_level="warning", limit_concurrency=1000))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return f"http://127.0.0.1:{port}/bot", server, task
+
+
+async def default_bot() -> None:
+    fake = FakeTelegram(latency=args.latency)
+    url, server, task = await serve(fake)
+    app = Application.builder().token(TOKEN).base_url(url).build()
+    await app.bot.initialize()
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(app.bot.send_message(**m) for m in broadcast()), return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+    sent = sum(not isinstance(r, Exception) for r in results)
+    flooded = sum(isinstance(r, RetryAfter) for r in results)
+    print(f"{'default bot':>14}: {sent}/{args.messages} delivered, {flooded} raised RetryAfter, {elapsed:.2f}s, "
+          f"{fake.stats()['connections']} connections")
+    await app.bot.shutdown()
+    server.should_exit = True
+    await task
+
+
+async def layer() -> None:
+    fake = FakeTelegram(latency=args.latency)
+    url, server, task = await serve(fake)
+    app = application_builder(TOKEN).base_url(url).build()
+    bot, limiter = app.bot, app.bot.rate_limiter
+    await bot.initialize()
+
+    # 1 + 2: broadcast, with an interactive reply in the middle of it.
+    async def reply_mid_broadcast() -> float:
+        await asyncio.sleep(args.messages / 30 / 2)
+        t0 = time.perf_counter()
+        await bot.send_message(chat_id=999_999, text="Booked!")
+        return time.perf_counter() - t0
+    t0 = time.perf_counter()
+    delivered, reply_s = await asyncio.gather(send_batch(bot, broadcast()), reply_mid_broadcast())
+    sent, failed = sum(delivered), delivered.count(False)
+    elapsed = time.perf_counter() - t0
+    print(f"{'outbound layer':>14}: {sent}/{args.messages} delivered, {failed} failed, {fake.rejected} answered 429, {elapsed:.2f}s "
+          f"({sent / elapsed:.1f} msg/s), {fake.stats()['connections']} connections")
+    print(f"{'':>14}  reply to a new chat mid-broadcast: {reply_s * 1000:.0f} ms")
+    assert sent == args.messages and failed == 0
+
+    # 3: flood control mid-batch.
+    before = limiter.retry_after
+    batch = broadcast(offset=args.chats)[: args.messages // 3]
+    async def flood_soon():
+        await asyncio.sleep(0.5)
+        fake.flood(1.0)
+    t0 = time.perf_counter()
+    delivered, _ = await asyncio.gather(send_batch(bot, batch), flood_soon())
+    sent, failed = sum(delivered), delivered.count(False)
+    print(f"{'flood control':>14}: {sent}/{len(batch)} delivered after {limiter.retry_after - before} 429s with retry_after, "
+          f"{time.perf_counter() - t0:.2f}s")
+    assert sent == len(batch) and failed == 0
+
+    # 4: rapid edits of one message (e.g. a status message updated by several jobs).
+    msg = await bot.send_message(chat_id=777, text="Queue: 0 waiting")
+    calls = fake.calls["editMessageText"]
+    texts = [f"Queue: {i} waiting" for i in range(1, args.edits + 1)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(bot.edit_message_text(t, chat_id=777, message_id=msg.message_id) for t in texts))
+    reached = fake.texts[("777", msg.message_id)]
+    print(f"{'edits':>14}: {args.edits} edits -> {fake.calls['editMessageText'] - calls} API calls "
+          f"({limiter.coalesced} coalesced), {time.perf_counter() - t0:.2f}s, final text {reached[-1]!r}")
+    assert reached[-1] == texts[-1]
+
+    print("limiter:", limiter.stats())
+    await bot.shutdown()
+    server.should_exit = True
+    await task
+
+
+async def main():
+    print(f"{args.messages} messages to {args.chats} chats; fake API allows 30 msg/s per bot, 1 msg/s per chat, {args.latency * 1000:.0f} ms round trip")
+    await default_bot()
+    await layer()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
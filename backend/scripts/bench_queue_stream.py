@@ -0,0 +1,166 @@
+"""
+Live queue: 10s polling of /queue/today vs the /queue/stream SSE channel.
+
+Starts the full app under uvicorn on a throwaway SQLite file with --bookings
+bookings today for store 1, then:
+
+  1. measures one /queue/today poll and what --tablets tablets polling
+     every 10s cost per minute,
+  2. opens --tablets SSE streams, each with a ticket from
+     POST /queue/stream-ticket, waits for their snapshots and counts the
+     bytes sent while nothing changes (heartbeats only); an access token,
+     another store's ticket and an expired ticket are refused,
+  3. PATCHes --changes booking statuses and times how long until every
+     tablet has seen each change, checking none is lost.
+
+Run from backend/:  python scripts/bench_queue_stream.py [--tablets 50] [--bookings 200] [--changes 50]
+"""
+import argparse, asyncio, json, os, socket, statistics, sys, tempfile, time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--tablets", type=int, default=50)
+parser.add_argument("--bookings", type=int, default=200)
+parser.add_argument("--changes", type=int, default=50)
+parser.add_argument("--idle", type=float, default=6.0, help="seconds to watch idle streams")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/stream.db"
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+os.environ["ROLLUP_REFRESH_SECONDS"] = "0"
+os.environ["NO_SHOW_SWEEP_SECONDS"] = "0"
+os.environ["QUEUE_STREAM_HEARTBEAT_SECONDS"] = "2"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx, uvicorn
+from jose import jwt
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.db import engine, init_db
+from app.live_queue import queue_hub
+from app.main import app
+from app.models import Booking, Customer, Role, Service, StaffUser, Station
+from app.security import ALGORITHM, create_access_token
+from app.seed import seed_if_needed
+
+
+def seed() -> tuple[str, list[str]]:
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+        station = s.exec(select(Station).where(Station.store_id == 1)).first()
+        service = s.exec(select(Service).where(Service.store_id == 1)).first()
+        admin = s.exec(select(StaffUser).where(StaffUser.role == Role.HEAD_OFFICE_ADMIN)).first()
+        cust = Customer(telegram_chat_id="stream-bench")
+        s.add(cust); s.commit(); s.refresh(cust)
+        token = create_access_token(admin)
+        rows, day = [], datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        for i in range(args.bookings):
+            at = day + timedelta(minutes=5 * i % 1440)
+            rows.append({"id": f"qs-{i}", "booking_code": f"QS{i}", "store_id": 1, "station_id": station.id, "service_id": service.id,
+                         "consultant_id": None, "customer_id": cust.id, "scheduled_start_at": at, "scheduled_end_at": at + timedelta(minutes=30),
+                         "status": "SCHEDULED", "source_channel": "TELEGRAM", "created_at": at, "updated_at": at})
+    with engine.begin() as conn:
+        conn.execute(insert(Booking.__table__), rows)
+    return token, [r["id"] for r in rows]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Tablet:
+    def __init__(self):
+        self.snapshot = asyncio.Event()
+        self.seen: dict[str, float] = {}
+        self.bytes = 0
+
+    async def listen(self, client: httpx.AsyncClient, url: str):
+        async with client.stream("GET", url) as r:
+            async for line in r.aiter_lines():
+                self.bytes += len(line) + 1
+                if not line.startswith("data: "):
+                    continue
+                m = json.loads(line[6:])
+                if m["type"] == "snapshot":
+                    self.snapshot.set()
+                elif m["type"] == "booking":
+                    self.seen.setdefault(f'{m["booking"]["id"]}:{m["booking"]["status"]}', time.perf_counter())
+
+
+async def main():
+    token, ids = seed()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    base = f"http://127.0.0.1:{port}"
+    auth = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        t0 = time.perf_counter()
+        r = await client.get("/queue/today?store_id=1", headers=auth)
+        poll_ms, poll_bytes = (time.perf_counter() - t0) * 1000, len(r.content)
+        print(f"poll: {len(r.json())} bookings, {poll_bytes / 1024:.1f} KiB, {poll_ms:.1f} ms")
+        print(f"polling, {args.tablets} tablets: {args.tablets * 6} requests/min, {args.tablets * 6 * poll_bytes / 1024 / 1024:.1f} MiB/min, "
+              f"each rerunning the query")
+
+    limits = httpx.Limits(max_connections=args.tablets + 10)
+    async with httpx.AsyncClient(base_url=base, timeout=None, limits=limits) as streams, httpx.AsyncClient(base_url=base, timeout=30) as client:
+        async def ticket(store_id: int = 1) -> str:
+            r = await client.post(f"/queue/stream-ticket?store_id={store_id}", headers=auth)
+            assert r.status_code == 200, r.text
+            return r.json()["ticket"]
+
+        expired = jwt.encode({**jwt.get_unverified_claims(await ticket()), "exp": int(time.time()) - 1}, settings.jwt_secret, algorithm=ALGORITHM)
+        refused = {name: (await client.get(f"/queue/stream?store_id=1&{query}")).status_code for name, query in [
+            ("access token as ?token=", f"token={token}"),
+            ("access token as ?ticket=", f"ticket={token}"),
+            ("store 2 ticket", f"ticket={await ticket(2)}"),
+            ("expired ticket", f"ticket={expired}"),
+        ]}
+        print("stream refused:", refused)
+        assert all(code in (401, 422) for code in refused.values()), refused
+
+        tablets = [Tablet() for _ in range(args.tablets)]
+        tasks = [asyncio.create_task(t.listen(streams, f"/queue/stream?store_id=1&ticket={await ticket()}")) for t in tablets]
+        await asyncio.wait_for(asyncio.gather(*(t.snapshot.wait() for t in tablets)), 30)
+        before = sum(t.bytes for t in tablets)
+        await asyncio.sleep(args.idle)
+        idle = sum(t.bytes for t in tablets) - before
+        print(f"stream, {args.tablets} tablets idle: {idle / args.idle * 60 / 1024:.1f} KiB/min (heartbeats), 0 queries")
+
+        latencies, missing = [], 0
+        for booking_id in ids[:args.changes]:
+            key = f"{booking_id}:ARRIVED"
+            t0 = time.perf_counter()
+            r = await client.patch(f"/bookings/{booking_id}/status", json={"status": "ARRIVED"}, headers=auth)
+            assert r.status_code == 200, r.text
+            deadline = t0 + 5
+            while not all(key in t.seen for t in tablets) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.001)
+            got = [t.seen[key] - t0 for t in tablets if key in t.seen]
+            missing += len(tablets) - len(got)
+            latencies.append(max(got) * 1000 if got else float("inf"))
+        latencies.sort()
+        print(f"{args.changes} status changes: PATCH -> all {args.tablets} tablets p50 {statistics.median(latencies):.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, max {latencies[-1]:.1f} ms, missed {missing}")
+        print("hub:", queue_hub.stats())
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    await asyncio.sleep(0.2)
+    print("after disconnect:", queue_hub.stats())
+    server.should_exit = True
+    await serving
+    assert missing == 0, "some tablets missed changes"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+/queue/today polling payloads: full rows vs the compact projection vs
+?since= delta polls.
+
+Seeds --bookings bookings today for store 1 (plus --other bookings on other
+days, which delta polls must seek past), then times and sizes a full poll,
+a compact snapshot, an idle delta poll and a delta poll after --changes
+status changes, checking the delta returns exactly the changed bookings.
+Then moves the clock across midnight: a cursor from the previous day must
+get a full snapshot of the new day with reset=true, not an empty delta.
+
+Run from backend/:  python scripts/bench_queue_sync.py [--bookings 200] [--other 100000] [--changes 5]
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--bookings", type=int, default=200)
+parser.add_argument("--other", type=int, default=100_000)
+parser.add_argument("--changes", type=int, default=5)
+parser.add_argument("--repeat", type=int, default=50)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/sync.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from app.db import engine, init_db
+from app.deps import get_current_user
+from app.models import Booking, BookingStatus, Customer, Role, Service, StaffUser, Station
+from app.routers import bookings
+from app.seed import seed_if_needed
+
+
+def seed() -> list[str]:
+    init_db()
+    rng = random.Random(5)
+    with Session(engine) as s:
+        seed_if_needed(s)
+        station = s.exec(select(Station).where(Station.store_id == 1)).first()
+        services = s.exec(select(Service).where(Service.store_id == 1)).all()
+        consultants = s.exec(select(StaffUser).where(StaffUser.role == Role.CONSULTANT)).all()
+        cust = Customer(telegram_chat_id="sync-bench")
+        s.add(cust); s.commit(); s.refresh(cust)
+        station_id, service_ids, consultant_ids, cust_id = station.id, [x.id for x in services], [c.id for c in consultants] + [None], cust.id
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    stamped = datetime.utcnow() - timedelta(hours=1)
+    rows = []
+    for i in range(args.bookings + args.other):
+        at = day + timedelta(minutes=5 * i % 1440) if i < args.bookings else day - timedelta(days=1 + rng.randrange(365), minutes=rng.randrange(1440))
+        rows.append({"id": f"qy-{i}", "booking_code": f"QY{i}", "store_id": 1, "station_id": station_id, "service_id": rng.choice(service_ids),
+                     "consultant_id": rng.choice(consultant_ids), "customer_id": cust_id, "scheduled_start_at": at, "scheduled_end_at": at + timedelta(minutes=30),
+                     "status": "SCHEDULED", "source_channel": "TELEGRAM", "created_at": stamped, "updated_at": stamped})
+    with engine.begin() as conn:
+        conn.execute(insert(Booking.__table__), rows)
+    return [r["id"] for r in rows[:args.bookings]]
+
+
+def poll(client: TestClient, url: str) -> tuple[dict | list, int, float]:
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        r = client.get(url)
+    assert r.status_code == 200, r.text
+    return r.json(), len(r.content), (time.perf_counter() - t0) / args.repeat * 1000
+
+
+def main():
+    ids = seed()
+    with Session(engine) as s:
+        admin = s.exec(select(StaffUser).where(StaffUser.role == Role.HEAD_OFFICE_ADMIN)).first()
+        s.expunge(admin)
+    app = FastAPI()
+    app.include_router(bookings.router)
+    app.dependency_overrides[get_current_user] = lambda: admin
+    client = TestClient(app)
+
+    print(f"{'poll':>22} {'rows':>6} {'bytes':>8} {'ms':>7}")
+    full, size, ms = poll(client, "/queue/today?store_id=1")
+    print(f"{'full rows':>22} {len(full):>6} {size:>8} {ms:>7.2f}")
+    snap, size, ms = poll(client, "/queue/today?store_id=1&compact=true")
+    print(f"{'compact snapshot':>22} {len(snap['bookings']):>6} {size:>8} {ms:>7.2f}")
+    assert len(snap["bookings"]) == len(full) == args.bookings
+    idle, size, ms = poll(client, f"/queue/today?store_id=1&since={snap['cursor']}")
+    print(f"{'delta, nothing new':>22} {len(idle['bookings']):>6} {size:>8} {ms:>7.2f}")
+    assert idle["bookings"] == []
+
+    changed = random.Random(9).sample(ids, args.changes)
+    for booking_id in changed:
+        assert client.patch(f"/bookings/{booking_id}/status", json={"status": "ARRIVED"}).status_code == 200
+    delta, size, ms = poll(client, f"/queue/today?store_id=1&since={snap['cursor']}")
+    print(f"{'delta, after changes':>22} {len(delta['bookings']):>6} {size:>8} {ms:>7.2f}")
+    assert sorted(b["id"] for b in delta["bookings"]) == sorted(changed), "delta did not return exactly the changed bookings"
+    assert all(b["status"] == "ARRIVED" for b in delta["bookings"])
+    print("delta poll returned exactly the changed bookings; card:", delta["bookings"][0])
+    across_midnight(client)
+
+
+def across_midnight(client: TestClient) -> None:
+    """A booking for tomorrow, made yesterday evening, must reach a client that polled just before midnight."""
+    midnight = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=30)
+    with Session(engine) as s:
+        booking = s.exec(select(Booking).where(Booking.id == "qy-0")).one()
+        made = midnight - timedelta(hours=4)
+        s.add(Booking(booking_code="QYNEXT", store_id=1, station_id=booking.station_id, service_id=booking.service_id, customer_id=booking.customer_id,
+                      scheduled_start_at=midnight + timedelta(hours=9), scheduled_end_at=midnight + timedelta(hours=9, minutes=30),
+                      status=BookingStatus.SCHEDULED, created_at=made, updated_at=made))
+        s.commit()
+    clock = {"now": midnight - timedelta(seconds=2)}
+    class Clock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock["now"]
+    bookings.datetime = Clock
+    try:
+        before = client.get("/queue/today?store_id=1&compact=true").json()
+        clock["now"] = midnight + timedelta(seconds=3)
+        after = client.get(f"/queue/today?store_id=1&since={before['cursor']}").json()
+        same_day = client.get(f"/queue/today?store_id=1&since={after['cursor']}").json()
+    finally:
+        bookings.datetime = datetime
+    assert before["reset"] and before["bookings"] == []
+    assert after["reset"], "a cursor from the previous day was answered with a delta"
+    assert [b["code"] for b in after["bookings"]] == ["QYNEXT"], after
+    assert not same_day["reset"] and same_day["bookings"] == []
+    print("across midnight: the old day's cursor got a reset snapshot of the new day; the next poll is a delta again")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Reminder scan cost per tick against table size.
+
+Seeds --per-day upcoming bookings a day for the next two days, then grows
+the booking history through --sizes rows. At each size it replays --ticks
+one-minute scheduler ticks of both reminder windows (T-24h, T-2h) through
+claim_reminders and reports queries and milliseconds per tick, which should
+stay flat as the table grows. It checks that every due booking was claimed
+exactly once across the ticks, and again when two workers claim the same
+ticks concurrently.
+
+Finally, one real reminders tick (send_due_reminders) runs against the
+fake Bot API (fake_telegram.py) through the outbound layer. It checks that
+every claimed reminder was delivered and logged as REMINDER_SENT.
+
+Run from backend/:  python scripts/bench_reminders.py [--sizes 10000,100000,500000] [--per-day 20000] [--ticks 30]
+"""
+import argparse, asyncio, os, random, socket, statistics, sys, tempfile, threading, time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--sizes", default="10000,100000,500000")
+parser.add_argument("--per-day", type=int, default=20_000)
+parser.add_argument("--ticks", type=int, default=30)
+parser.add_argument("--send", type=int, default=60, help="reminders due in the end-to-end tick (about)")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/reminders.db"
+os.environ["REMINDER_HOURS"] = "24,2"
+os.environ["REMINDER_INTERVAL_SECONDS"] = "60"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import uvicorn
+from sqlalchemy import delete, event, func, insert
+from sqlmodel import Session, select
+
+from app.db import engine, init_db
+from app.models import AnalyticsState, Booking, BookingStatus, Customer, EventLog, EventType, Service, Station
+from app.reminders import CURSOR_KEY, claim_reminders, send_due_reminders
+from app.rollups import set_state
+from app.seed import seed_if_needed
+from app.telegram_outbound import application_builder
+from fake_telegram import FakeTelegram
+
+WINDOWS = (24, 2)
+NOW = datetime.utcnow().replace(second=0, microsecond=0)
+queries = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(*_):
+    global queries
+    queries += 1
+
+
+def seed() -> dict:
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+        stations = s.exec(select(Station)).all()
+        services = {x.store_id: x.id for x in s.exec(select(Service))}
+        customers = [Customer(telegram_chat_id=str(10_000 + i)) for i in range(2000)]
+        s.add_all(customers); s.commit()
+        ctx = {"stations": [(st.store_id, st.id) for st in stations if st.store_id in services], "services": services,
+               "customers": [c.id for c in s.exec(select(Customer).where(Customer.telegram_chat_id >= "10000"))]}
+    upcoming = [NOW + timedelta(seconds=random.randrange(48 * 3600)) for _ in range(args.per_day * 2)]
+    insert_bookings(ctx, "up", upcoming, statuses=("SCHEDULED",) * 9 + ("CANCELLED",))
+    return ctx
+
+
+def insert_bookings(ctx: dict, prefix: str, starts: list[datetime], statuses=("COMPLETED", "COMPLETED", "NO_SHOW", "CANCELLED")) -> None:
+    rng = random.Random(len(starts))
+    rows = []
+    for i, at in enumerate(starts):
+        store_id, station_id = rng.choice(ctx["stations"])
+        rows.append({"id": f"{prefix}-{i}", "booking_code": f"{prefix.upper()}{i}", "store_id": store_id, "station_id": station_id,
+                     "service_id": ctx["services"][store_id], "consultant_id": None, "customer_id": rng.choice(ctx["customers"]),
+                     "scheduled_start_at": at, "scheduled_end_at": at + timedelta(minutes=30), "status": rng.choice(statuses),
+                     "source_channel": "TELEGRAM", "created_at": at, "updated_at": at})
+    with engine.begin() as conn:
+        for i in range(0, len(rows), 20_000):
+            conn.execute(insert(Booking.__table__), rows[i:i + 20_000])
+
+
+def reset_cursors(s: Session) -> None:
+    s.exec(delete(AnalyticsState).where(AnalyticsState.key.in_([CURSOR_KEY.format(hours=h) for h in WINDOWS])))
+    s.commit()
+
+
+def expected(s: Session, hours: int) -> set[str]:
+    """What the replayed ticks must claim: SCHEDULED, starting in (first tick's lower bound, last tick's upper bound]."""
+    lo = NOW + timedelta(hours=hours) - timedelta(seconds=60)
+    hi = NOW + timedelta(minutes=args.ticks - 1) + timedelta(hours=hours)
+    return set(s.exec(select(Booking.id).where(Booking.scheduled_start_at > lo, Booking.scheduled_start_at <= hi, Booking.status == BookingStatus.SCHEDULED)))
+
+
+def replay(worker_claims: dict[int, list[str]], limit: int | None = None) -> list[tuple[int, float]]:
+    costs = []
+    with Session(engine) as s:
+        for tick in range(args.ticks):
+            now = NOW + timedelta(minutes=tick)
+            before, t0 = queries, time.perf_counter()
+            for hours in WINDOWS:
+                worker_claims[hours] += [r.booking_id for r in claim_reminders(s, hours, now, limit)]
+            costs.append((queries - before, (time.perf_counter() - t0) * 1000))
+    return costs
+
+
+def check_once(claims: dict[int, list[str]], label: str) -> None:
+    with Session(engine) as s:
+        for hours in WINDOWS:
+            got, want = claims[hours], expected(s, hours)
+            assert len(got) == len(set(got)), f"{label}: a {hours}h reminder was claimed twice"
+            assert set(got) == want, f"{label}: {hours}h claimed {len(got)}, expected {len(want)}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def end_to_end() -> None:
+    fake = FakeTelegram(latency=0.02)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(fake.app, port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    bot = application_builder("123456:fake").base_url(f"http://127.0.0.1:{port}/bot").build().bot
+    await bot.initialize()
+
+    # Let about --send bookings fall due in the T-2h window; nothing in T-24h.
+    per_minute = args.per_day / 1440 * 0.9
+    now = datetime.utcnow()
+    with Session(engine) as s:
+        reset_cursors(s)
+        set_state(s, CURSOR_KEY.format(hours=2), f'{{"at": "{(now + timedelta(hours=2, minutes=-args.send / per_minute)).isoformat()}", "id": null}}')
+        set_state(s, CURSOR_KEY.format(hours=24), f'{{"at": "{(now + timedelta(hours=24, minutes=1)).isoformat()}", "id": null}}')
+        s.commit()
+    t0 = time.perf_counter()
+    result = await send_due_reminders(bot)
+    elapsed = time.perf_counter() - t0
+    with Session(engine) as s:
+        logged = s.exec(select(func.count()).select_from(EventLog).where(EventLog.event_type == EventType.REMINDER_SENT)).one()
+    sent = result["2h"]["sent"]
+    print(f"end to end: {result} in {elapsed:.2f}s ({sent / elapsed:.1f} msg/s), fake API got {fake.calls['sendMessage']} sendMessage, "
+          f"{fake.rejected} 429s; {logged} REMINDER_SENT events")
+    assert sent == result["2h"]["claimed"] == fake.calls["sendMessage"] == logged and sent > 0
+    again = await send_due_reminders(bot)
+    assert again["2h"]["claimed"] <= 2, f"the next tick re-claimed reminders: {again}"
+    await bot.shutdown()
+    server.should_exit = True
+    await task
+
+
+def main():
+    ctx = seed()
+    print(f"{args.per_day * 2} bookings in the next 48h ({args.per_day}/day); {args.ticks} ticks of windows {WINDOWS}h per size")
+    print(f"{'history rows':>12} {'queries/tick':>13} {'ms/tick p50':>12} {'ms/tick max':>12} {'claimed':>8}")
+    have = 0
+    for size in (int(x) for x in args.sizes.split(",")):
+        insert_bookings(ctx, f"h{have}", [NOW - timedelta(days=1 + random.randrange(720), minutes=random.randrange(1440)) for _ in range(size - have)])
+        have = size
+        with Session(engine) as s:
+            reset_cursors(s)
+        claims = {h: [] for h in WINDOWS}
+        costs = replay(claims)
+        check_once(claims, f"{size} rows")
+        ms = [c[1] for c in costs]
+        print(f"{size:>12} {max(c[0] for c in costs):>13} {statistics.median(ms):>12.2f} {max(ms):>12.2f} {sum(map(len, claims.values())):>8}")
+
+    # Two workers on the same ticks, with a small batch so the keyset cursor is exercised mid-window.
+    with Session(engine) as s:
+        reset_cursors(s)
+    claims = {h: [] for h in WINDOWS}
+    threads = [threading.Thread(target=replay, args=(claims, 5)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    got = sum(map(len, claims.values()))
+    assert all(len(c) == len(set(c)) for c in claims.values()), "two workers claimed the same reminder"
+    print(f"two workers, batch 5: {got} claims, no booking claimed twice")
+
+    asyncio.run(end_to_end())
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Power BI views over rollup tables vs the old aggregate-everything views.
+
+Seeds --rows bookings (3 stores, spread over --days days) plus incidents
+into a throwaway SQLite file, then:
+
+  1. times a full rollup build,
+  2. checks every v_* view returns exactly what the old definition
+     (recreated here as legacy_v_*) returns,
+  3. times typical dashboard reads on both,
+  4. changes --changes bookings, times the incremental refresh and re-checks.
+
+Run from backend/:  python scripts/bench_rollups.py [--rows 300000] [--days 365] [--changes 200]
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=300_000)
+parser.add_argument("--days", type=int, default=365)
+parser.add_argument("--changes", type=int, default=200)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/rollups.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert, text, update
+from sqlmodel import Session, select
+
+from app.db import engine, init_db
+from app.models import Booking, Customer, Incident, Service, Station, StaffUser, Role
+from app.rollups import refresh_rollups
+from app.seed import seed_if_needed
+from app.views import ensure_views
+
+STATUSES = ["SCHEDULED", "COMPLETED", "COMPLETED", "COMPLETED", "NO_SHOW", "CANCELLED"]
+
+# The pre-rollup definitions, in SQLite syntax.
+LEGACY = {
+"v_daily_store_ops": """
+SELECT store_id, DATE(scheduled_start_at) AS day, COUNT(*) AS bookings,
+       SUM(CASE WHEN status='COMPLETED' THEN 1 ELSE 0 END) AS completed,
+       SUM(CASE WHEN status='NO_SHOW' THEN 1 ELSE 0 END) AS no_show,
+       SUM(CASE WHEN status='CANCELLED' THEN 1 ELSE 0 END) AS cancelled
+FROM booking GROUP BY store_id, DATE(scheduled_start_at)""",
+"v_peak_hours": """
+SELECT store_id, CAST(strftime('%H', scheduled_start_at) AS INTEGER) AS hour, COUNT(*) AS bookings
+FROM booking GROUP BY store_id, strftime('%H', scheduled_start_at)""",
+"v_service_mix": """
+SELECT b.store_id, s.category, s.name AS service_name, COUNT(*) AS bookings, SUM(s.price_cents) AS value_cents
+FROM booking b JOIN service s ON s.id = b.service_id GROUP BY b.store_id, s.category, s.name""",
+"v_consultant_performance": """
+SELECT store_id, consultant_id, DATE(scheduled_start_at) AS day, COUNT(*) AS bookings,
+       SUM(CASE WHEN status='COMPLETED' THEN 1 ELSE 0 END) AS completed,
+       SUM(CASE WHEN status='NO_SHOW' THEN 1 ELSE 0 END) AS no_show
+FROM booking GROUP BY store_id, consultant_id, DATE(scheduled_start_at)""",
+"v_incident_rates": """
+SELECT b.store_id, DATE(i.created_at) AS day, COUNT(i.id) AS incidents, COUNT(DISTINCT b.id) AS bookings,
+       ROUND((CAST(COUNT(i.id) AS REAL) / NULLIF(COUNT(DISTINCT b.id),0)) * 100, 2) AS incidents_per_100
+FROM incident i JOIN booking b ON b.id = i.booking_id GROUP BY b.store_id, DATE(i.created_at)""",
+}
+
+DASHBOARD = [
+    ("store, last 30 days", "SELECT * FROM {v_daily_store_ops} WHERE store_id = 1 AND day >= :since"),
+    ("all stores, daily", "SELECT * FROM {v_daily_store_ops}"),
+    ("peak hours", "SELECT * FROM {v_peak_hours}"),
+    ("service mix", "SELECT * FROM {v_service_mix}"),
+    ("consultants, 30 days", "SELECT * FROM {v_consultant_performance} WHERE day >= :since"),
+]
+
+
+def seed() -> datetime:
+    init_db()
+    rng = random.Random(7)
+    with Session(engine) as s:
+        seed_if_needed(s)
+        stations = [(x.id, x.store_id) for x in s.exec(select(Station))]
+        services = [(x.id, x.store_id, x.duration_minutes) for x in s.exec(select(Service))]
+        consultants = [(x.id, x.store_id) for x in s.exec(select(StaffUser).where(StaffUser.role == Role.CONSULTANT))]
+        cust = Customer(telegram_chat_id="rollup-bench")
+        s.add(cust); s.commit(); s.refresh(cust)
+        cust_id = cust.id
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=args.days)
+    by_store = {sid: [x for x in services if x[1] == sid] for _, sid in stations}
+    bookings, incidents = [], []
+    for i in range(args.rows):
+        station_id, store_id = rng.choice(stations)
+        service_id, _, minutes = rng.choice(by_store[store_id])
+        cons = rng.choice([c for c, sid in consultants if sid == store_id] + [None])
+        at = start + timedelta(minutes=rng.randrange(args.days * 24 * 60))
+        bookings.append({"id": f"rb-{i}", "booking_code": f"RB{i}", "store_id": store_id, "station_id": station_id, "service_id": service_id,
+                         "consultant_id": cons, "customer_id": cust_id, "scheduled_start_at": at, "scheduled_end_at": at + timedelta(minutes=minutes),
+                         "status": rng.choice(STATUSES), "source_channel": "TELEGRAM", "created_at": at - timedelta(days=2), "updated_at": at - timedelta(days=2)})
+        if rng.random() < 0.02:
+            incidents.append({"id": f"ri-{i}", "booking_id": f"rb-{i}", "category": "Service", "severity": "low", "note": "bench",
+                              "created_at": at + timedelta(minutes=rng.randrange(0, 600))})
+    # Core inserts through the model tables, so timestamps are stored exactly as the app stores them.
+    with engine.begin() as conn:
+        conn.execute(insert(Booking.__table__), bookings)
+        conn.execute(insert(Incident.__table__), incidents)
+        for name, sql in LEGACY.items():
+            conn.execute(text(f"CREATE VIEW legacy_{name} AS {sql}"))
+    return end - timedelta(days=30)
+
+
+def rows(conn, sql: str) -> list[tuple]:
+    # Compare as text, rounding floats: the two sides type day/ratio columns differently.
+    norm = lambda v: str(round(v, 2)) if isinstance(v, float) else str(v)
+    return sorted(tuple(norm(v) for v in r) for r in conn.execute(text(sql)))
+
+
+def check() -> None:
+    with engine.connect() as conn:
+        for name in LEGACY:
+            new, old = rows(conn, f"SELECT * FROM {name}"), rows(conn, f"SELECT * FROM legacy_{name}")
+            assert new == old, f"{name}: rollup view differs from the legacy view ({len(new)} vs {len(old)} rows)"
+    print("  views match the legacy definitions")
+
+
+def timed(conn, sql: str, **params) -> float:
+    t0 = time.perf_counter()
+    conn.execute(text(sql), params).all()
+    return (time.perf_counter() - t0) * 1000
+
+
+def main():
+    t0 = time.perf_counter()
+    since = seed()
+    print(f"seeded {args.rows} bookings over {args.days} days in {time.perf_counter() - t0:.0f}s")
+
+    with Session(engine) as s:
+        ensure_views(s)
+        print("full build:", refresh_rollups(s))
+    check()
+
+    print(f"{'dashboard query':>22} {'legacy ms':>10} {'rollup ms':>10}")
+    with engine.connect() as conn:
+        for label, sql in DASHBOARD:
+            legacy = timed(conn, sql.format(**{k: f"legacy_{k}" for k in LEGACY}), since=since.date().isoformat())
+            rollup = timed(conn, sql.format(**{k: k for k in LEGACY}), since=since.date())
+            print(f"{label:>22} {legacy:>10.1f} {rollup:>10.1f}")
+
+    rng = random.Random(11)
+    changed = rng.sample(range(args.rows), args.changes)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for i in changed:
+            conn.execute(update(Booking.__table__).where(Booking.__table__.c.id == f"rb-{i}").values(status="NO_SHOW", updated_at=now))
+        conn.execute(insert(Incident.__table__), [{"id": "ri-new", "booking_id": f"rb-{changed[0]}", "category": "Service", "severity": "high", "note": "bench", "created_at": now}])
+    with Session(engine) as s:
+        print(f"after {args.changes} status changes:", refresh_rollups(s))
+    check()
+
+
+if __name__ == "__main__":
+    main()
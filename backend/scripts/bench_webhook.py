@@ -0,0 +1,98 @@
+"""
+Webhook request latency under a burst of updates, inline processing vs the
+background update queue. Update handling is simulated with a fixed delay
+(DB work + Telegram replies) so only the ingestion path is measured.
+
+The queue acks sooner but handles the burst more slowly than inline: it runs
+at most --workers updates, one per chat, at a time. "floor s" is that bound,
+max(burst / workers, updates per chat) x handler time; raising --workers
+(or spreading the burst over more --chats) moves the queue towards it.
+
+Run from backend/:  python scripts/bench_webhook.py [--burst 500] [--handler-ms 150] [--chats 50]
+"""
+import argparse, asyncio, os, statistics, sys, time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers.telegram import router
+from app.update_queue import UpdateQueue
+
+
+def payload(i: int, chats: int) -> dict:
+    return {"update_id": i, "message": {"message_id": i, "date": 0, "chat": {"id": 1000 + i % chats, "type": "private"}, "text": "hi"}}
+
+
+async def burst(mode: str, n: int, handler_ms: float, chats: int, queue_size: int, workers: int) -> tuple[list[float], float, dict | None]:
+    done = asyncio.Event()
+    handled = 0
+    seen: dict[int, list[int]] = {}
+
+    async def process_update(update):
+        nonlocal handled
+        seen.setdefault(update.effective_chat.id, []).append(update.update_id)
+        await asyncio.sleep(handler_ms / 1000)
+        handled += 1
+        if handled == n:
+            done.set()
+
+    app = FastAPI()
+    app.include_router(router)
+    app.state.telegram_app = SimpleNamespace(bot=None, process_update=process_update)
+    app.state.telegram_webhook_secret = ""
+    queue = None
+    if mode == "queue":
+        queue = UpdateQueue(app.state.telegram_app, workers=workers, maxsize=queue_size)
+        queue.start()
+        app.state.telegram_update_queue = queue
+
+    latencies: list[float] = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def post(i: int):
+            t0 = time.perf_counter()
+            r = await client.post("/telegram/webhook", json=payload(i, chats))
+            latencies.append((time.perf_counter() - t0) * 1000)
+            return r.status_code
+
+        t0 = time.perf_counter()
+        codes = await asyncio.gather(*(post(i) for i in range(n)))
+        accepted = codes.count(200)
+        if accepted == n:
+            await done.wait()
+        drain = time.perf_counter() - t0
+    stats = None
+    if queue:
+        stats = queue.stats()
+        await queue.stop()
+        assert all(ids == sorted(ids) for ids in seen.values()), "per-chat order violated"
+    return latencies, drain, stats
+
+
+def pct(values: list[float], p: int) -> float:
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=500)
+    parser.add_argument("--handler-ms", type=float, default=150.0)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"burst={args.burst} handler={args.handler_ms}ms chats={args.chats} workers={args.workers}")
+    per_chat = -(-args.burst // args.chats)
+    floors = {"inline": args.handler_ms / 1000, "queue": max(args.burst / args.workers, per_chat) * args.handler_ms / 1000}
+    print(f"{'mode':>7} {'p50 ms':>8} {'p99 ms':>8} {'all handled s':>14} {'floor s':>8}  queue")
+    for mode in ("inline", "queue"):
+        lat, drain, stats = await burst(mode, args.burst, args.handler_ms, args.chats, args.queue_size, args.workers)
+        print(f"{mode:>7} {pct(lat, 50):>8.1f} {pct(lat, 99):>8.1f} {drain:>14.2f} {floors[mode]:>8.2f}  {stats or ''}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
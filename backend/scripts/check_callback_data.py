@@ -0,0 +1,205 @@
+"""
+Checks for the signed callback_data codec (app/callback_data.py):
+
+  1. size: the largest possible payload and every button the bot can
+     currently render fit Telegram's 64-byte limit,
+  2. tampering: every single-character edit, a payload signed with another
+     key, truncation and the old "store:1"-style strings are rejected,
+  3. round trips: representative taps for every step decode to themselves,
+     and walking the real handlers through the flow (every forward and
+     Back button) only ever produces buttons that decode,
+  4. old menus: after a category is added, a category button sent earlier
+     still opens the same services; after it is renamed, the button
+     answers "This menu has expired" instead of another category,
+  5. stale confirms: a Confirm for a past start or one outside opening
+     hours books nothing, and tapping the same Confirm twice books once
+     and answers with the same booking code.
+
+Run from backend/:  python scripts/check_callback_data.py
+"""
+import asyncio, base64, hashlib, hmac, os, sys, tempfile, time as clock
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/callbacks.db"
+os.environ["CONVERSATION_STORE"] = "memory"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlmodel import Session, func, select
+
+from app import callback_data as cb, telegram_bot
+from app.callback_data import ACTIONS, MAX_BYTES, Tap, category_key, decode, encode
+from app.catalog_cache import catalog
+from app.db import engine, init_db
+from app.keyboards import keyboards
+from app.availability import list_available_range
+from app.models import Booking, Service
+from app.seed import seed_if_needed
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def buttons(markup) -> list[str]:
+    return [b.callback_data for row in markup.inline_keyboard for b in row]
+
+
+def check_size() -> None:
+    worst = Tap("confirm", 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF, date(2179, 6, 6), time(23, 59))
+    assert decode(encode(worst)) == worst
+    snap = catalog.snapshot()
+    rendered = buttons(keyboards.stores())
+    for store in snap.stores:
+        rendered += buttons(keyboards.categories(store.id))
+        for c in snap.categories(store.id):
+            rendered += buttons(keyboards.services(store.id, category_key(c)))
+        for svc in snap.services(store.id):
+            rendered += buttons(keyboards.consultants(store.id, svc.id))
+    longest = max(len(d.encode()) for d in rendered)
+    assert longest <= MAX_BYTES and len(encode(worst)) <= MAX_BYTES
+    print(f"size: worst case {len(encode(worst))} bytes, {len(rendered)} rendered menu buttons at most {longest} bytes (limit {MAX_BYTES})")
+
+
+def check_tampering() -> None:
+    token = encode(Tap("confirm", 1, None, 8, 3, date(2026, 3, 1), time(10, 30)))
+    edits = 0
+    for i, ch in enumerate(token):
+        for other in ALPHABET:
+            if other != ch:
+                assert decode(token[:i] + other + token[i + 1:]) is None, f"edit at {i} accepted"
+                edits += 1
+    payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))[:cb._LAYOUT.size]
+    foreign = payload + hmac.new(b"another-key", payload, hashlib.sha256).digest()[:cb._MAC_BYTES]
+    assert decode(base64.urlsafe_b64encode(foreign).rstrip(b"=").decode()) is None
+    for bad in ("", "store:1", "confirm:10:30", token[:-1], token + "A", "%%%%", "A" * 64):
+        assert decode(bad) is None, bad
+    print(f"tampering: {edits} single-character edits, a foreign key, truncation and old-format data all rejected")
+
+
+def check_round_trips() -> None:
+    d, t = date(2026, 3, 1), time(9, 15)
+    taps = [Tap("store", 1), Tap("cat", 1, category=category_key("Makeup")), Tap("search", 2), Tap("service", 1, service_id=8),
+            Tap("consultant", 1, service_id=8), Tap("consultant", 1, service_id=8, consultant_id=3),
+            Tap("date", 1, service_id=8, consultant_id=3, day=d), Tap("time", 1, service_id=8, day=d, at=t),
+            Tap("confirm", 1, service_id=8, consultant_id=3, day=d, at=time(0, 0))]
+    assert {t.action for t in taps} == set(ACTIONS)
+    for tap in taps:
+        assert decode(encode(tap)) == tap, tap
+    print(f"round trips: {len(taps)} taps covering every action")
+
+
+async def press(data: str, texts: list[str] | None = None) -> list[str]:
+    """Run one tap through the handler; returns the buttons it rendered."""
+    async def noop(*a, **kw):
+        pass
+    shown: list[str] = []
+    async def edit(text, reply_markup=None):
+        if texts is not None:
+            texts.append(text)
+        shown.extend(buttons(reply_markup) if reply_markup else [])
+    update = SimpleNamespace(callback_query=SimpleNamespace(data=data, answer=noop, edit_message_text=edit),
+                             effective_chat=SimpleNamespace(id=1), effective_user=SimpleNamespace(id=1, first_name="Check"))
+    await telegram_bot.on_callback(update, SimpleNamespace(user_data={}))
+    return shown
+
+
+async def walk_flow() -> None:
+    """Breadth-first over every button the handlers render, stopping short of confirm (no booking made)."""
+    seen: set[str] = set()
+    frontier = buttons(keyboards.stores())[:1]
+    actions = set()
+    while frontier:
+        data = frontier.pop()
+        if data in seen:
+            continue
+        seen.add(data)
+        tap = decode(data)
+        assert tap is not None, f"handler rendered a button that does not decode: {data!r}"
+        actions.add(tap.action)
+        if tap.action == "confirm":
+            continue
+        # Keep the walk small: one date, a few times.
+        rendered = await press(data)
+        if tap.action == "consultant":
+            rendered = [b for b in rendered if decode(b).action != "date"][:1] + [b for b in rendered if decode(b).action == "date"][:1]
+        frontier += rendered[:4] if tap.action == "date" else rendered
+    assert actions >= {"store", "cat", "search", "service", "consultant", "date", "time", "confirm"}, actions
+    print(f"flow: {len(seen)} distinct buttons reached through the handlers, all decode; actions {sorted(actions)}")
+
+
+def commit_catalog(change) -> None:
+    """Apply a catalog change and wait for the background reload to pick it up."""
+    version = catalog.stats()["version"]
+    with Session(engine) as s:
+        change(s)
+        s.commit()
+    assert catalog.stats()["version"] > version
+    while catalog.snapshot().version != catalog.stats()["version"]:
+        clock.sleep(0.01)
+
+
+async def old_menus() -> None:
+    snap = catalog.snapshot()
+    store_id, name = next((s.id, snap.categories(s.id)[-1]) for s in snap.stores if len(snap.categories(s.id)) > 1)
+    old = next(b for b in buttons(keyboards.categories(store_id)) if decode(b).category == category_key(name))
+    before = await press(old)
+
+    def add_first(s):  # sorts ahead of every existing category
+        s.add(Service(store_id=store_id, category="AAA New", name="Brow tint", duration_minutes=15, price_cents=9000))
+    commit_catalog(add_first)
+    assert catalog.snapshot().categories(store_id)[0] == "AAA New"
+    assert await press(old) == before, "an old category button opened a different category after one was added"
+
+    def rename(s):
+        for svc in s.exec(select(Service).where(Service.store_id == store_id, Service.category == name)):
+            svc.category = name + " (renamed)"
+    commit_catalog(rename)
+    texts: list[str] = []
+    shown = await press(old, texts)
+    assert texts == ["This menu has expired. Choose a category:"], texts
+    assert {decode(b).action for b in shown} == {"cat", "search"}
+    print(f"old menus: {name!r} button unchanged after a category was added, expired after the rename")
+
+
+def booking_count() -> int:
+    with Session(engine) as s:
+        return s.exec(select(func.count()).select_from(Booking)).one()
+
+
+async def stale_confirms() -> None:
+    snap = catalog.snapshot()
+    store_id = snap.stores[0].id
+    svc = snap.services(store_id)[0]
+    with Session(engine) as s:
+        days = list_available_range(s, store_id=store_id, service_id=svc.id, start=datetime.utcnow().date() + timedelta(days=1), days=7)
+    ds, times = next((ds, times) for ds, times in days.items() if times)
+    tap = Tap("confirm", store_id, service_id=svc.id, day=date.fromisoformat(ds), at=time.fromisoformat(times[0]))
+    before = booking_count()
+    for stale in (tap.to("confirm", day=date(2020, 1, 6)), tap.to("confirm", at=time(3, 0))):
+        texts: list[str] = []
+        await press(encode(stale), texts)
+        assert not texts[-1].startswith("Booked"), texts
+    assert booking_count() == before, "a past or out-of-hours confirm made a booking"
+    first: list[str] = []
+    second: list[str] = []
+    await press(encode(tap), first)
+    await press(encode(tap), second)
+    assert first[-1].startswith("Booked") and first == second, (first, second)
+    assert booking_count() == before + 1
+    print(f"stale confirms: past and out-of-hours starts refused, a double tap booked once ({first[-1].splitlines()[1]})")
+
+
+def main():
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+    check_size()
+    check_tampering()
+    check_round_trips()
+    asyncio.run(walk_flow())
+    asyncio.run(old_menus())
+    asyncio.run(stale_confirms())
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Drive the booking wizard through the real bot handlers, alternating every
+tap between two simulated workers (each with its own PTB-style user_data),
+with conversation state in the SQL store. The flow must end in a booking,
+and a service search on the other worker must find the chosen store.
+The stored record must hold only the store (everything else travels in
+callback_data). Also prints writes per update, and checks that an
+expired flow gets the /start prompt and that the periodic prune deletes
+expired flows from both the SQL and the in-memory store.
+
+Run from backend/:  python scripts/check_conversation_state.py
+"""
+import asyncio, json, os, sys, tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/conversations.db"
+os.environ["CONVERSATION_STORE"] = "sql"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import update
+from sqlmodel import Session
+
+from app import telegram_bot
+from app.callback_data import decode
+from app.keyboards import keyboards
+from app.conversation_state import MemoryConversationStore, conversation_store
+from app.db import engine, init_db
+from app.models import ConversationState
+from app.seed import seed_if_needed
+
+USER_ID = 424242
+
+
+class Worker:
+    def __init__(self, name: str):
+        self.name = name
+        self.user_data: dict = {}  # PTB keeps one of these per user, per process
+
+    async def tap(self, data: str) -> tuple[str, list[str]]:
+        shown: dict = {}
+        async def answer(*a, **kw):
+            pass
+        async def edit(text, reply_markup=None):
+            shown["text"] = text
+            shown["buttons"] = [b.callback_data for row in reply_markup.inline_keyboard for b in row] if reply_markup else []
+        update = SimpleNamespace(callback_query=SimpleNamespace(data=data, answer=answer, edit_message_text=edit),
+                                 effective_chat=SimpleNamespace(id=USER_ID), effective_user=SimpleNamespace(id=USER_ID, first_name="Check"))
+        await telegram_bot.on_callback(update, SimpleNamespace(user_data=self.user_data))
+        print(f"  {self.name}: {decode(data).action:<12} -> {shown['text'].splitlines()[0]}")
+        return shown["text"], shown["buttons"]
+
+    async def type(self, text: str) -> str:
+        shown: dict = {}
+        async def reply(text, reply_markup=None):
+            shown["text"] = text
+        update = SimpleNamespace(message=SimpleNamespace(text=text, reply_text=reply), effective_user=SimpleNamespace(id=USER_ID))
+        await telegram_bot.on_text(update, SimpleNamespace(user_data=self.user_data))
+        print(f"  {self.name}: typed {text!r:<6} -> {shown['text'].splitlines()[0]}")
+        return shown["text"]
+
+
+def first(buttons: list[str], action: str) -> str:
+    return next(b for b in buttons if decode(b).action == action)
+
+
+async def main():
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+    a, b = Worker("worker A"), Worker("worker B")
+
+    stores = [btn.callback_data for row in keyboards.stores().inline_keyboard for btn in row]
+    _, buttons = await a.tap(first(stores, "store"))
+    assert (await b.type("a")).startswith("Select a service"), "search on the other worker did not see the store"
+    _, buttons = await b.tap(first(buttons, "cat"))
+    _, buttons = await a.tap(first(buttons, "service"))
+    _, buttons = await b.tap(first(buttons, "consultant"))
+    _, buttons = await a.tap(first(buttons, "date"))
+    _, confirm = await b.tap(first(buttons, "time"))
+    with Session(engine) as s:
+        raw = s.get(ConversationState, USER_ID).data
+    store_id = decode(first(stores, "store")).store_id
+    assert json.loads(raw) == {"s": store_id}, f"stored more than the store: {raw}"
+    print(f"stored record: {raw} ({len(raw)} bytes)")
+    text, _ = await a.tap(first(confirm, "confirm"))
+    assert text.startswith("Booked"), f"flow did not complete across workers: {text!r}"
+    stats = conversation_store.stats()
+    print(f"8 updates: {stats['loads']} state loads, {stats['saves']} writes")
+
+    # An abandoned flow past the TTL reads as empty: the search sends the user back to /start.
+    with engine.begin() as conn:
+        conn.execute(update(ConversationState).values(updated_at=datetime.utcnow() - timedelta(days=1)))
+    assert "/start" in await b.type("a")
+    assert await conversation_store.prune() == {"pruned": 1}
+    with Session(engine) as s:
+        assert s.get(ConversationState, USER_ID) is None, "expired flow still stored after prune"
+
+    memory = MemoryConversationStore(timedelta(minutes=5))
+    for user_id in range(100):
+        await memory.save(user_id, {"store_id": 1})
+    memory._rows = {user_id: (raw, at - 600 if user_id < 60 else at) for user_id, (raw, at) in memory._rows.items()}
+    assert await memory.load(0) == {} and 0 not in memory._rows, "load kept an expired row"
+    assert await memory.prune() == {"pruned": 59} and len(memory._rows) == 40
+    print("ok: the flow crossed workers, expired flows restart cleanly and are pruned from both stores")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
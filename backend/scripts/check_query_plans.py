@@ -0,0 +1,122 @@
+"""
+EXPLAIN the store/time-range booking queries and fail if any of them stops
+using the composite booking indexes (e.g. someone wraps scheduled_start_at
+in date() again), or, for the range queries, stops seeking on both ends of
+the scheduled_start_at range: a SEARCH bounded on one side only still reads
+the store's whole history.
+
+Each query is run once through the app's own code path while the SQL that
+reaches the driver is captured, then that exact SQL is EXPLAINed. SQLite
+runs against a throwaway file; pass --database-url for Postgres. On Postgres
+sequential scans are disabled for the session, because on a small table a
+seq scan is cheaper and would hide whether the index is usable at all.
+
+Run from backend/:  python scripts/check_query_plans.py [--database-url URL]
+"""
+import argparse, os, re, sys, tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--database-url", default=None)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/plans.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event, text
+from sqlmodel import Session, select
+
+from app.availability import _booking_rows
+from app.db import engine, init_db
+from app.kpis import _load as load_kpis
+from app.models import Booking, BookingStatus
+from app.no_shows import _overdue as overdue_bookings
+from app.reminders import _due as due_reminders
+from app.routers.analytics import EXPORT_SQL
+from app.routers.bookings import _compact_queue
+
+START = datetime(2025, 3, 1)
+END = START + timedelta(days=1)
+CONSULTANT_DAY_SQL = text("""
+    SELECT id FROM booking
+    WHERE store_id=:store_id AND consultant_id=:consultant_id AND scheduled_start_at>=:start AND scheduled_start_at<:end
+""")
+# The pre-change export predicate, shown for comparison only.
+LEGACY_EXPORT_SQL = text("""
+    SELECT id FROM booking
+    WHERE store_id=:store_id AND date(scheduled_start_at) BETWEEN :start AND :end
+    ORDER BY scheduled_start_at
+""")
+
+CHECKS = [
+    # (name, runs the query on a session, index the plan must name (None = reference only), seeks both start bounds)
+    ("export", lambda s: s.exec(EXPORT_SQL, params={"store_id": 1, "start": START, "end": END}).all(), "ix_booking_store_start", True),
+    ("daily kpis", lambda s: load_kpis(s, START, END, store_id=1), "ix_booking_store_", True),
+    ("queue today", lambda s: s.exec(select(Booking).where(Booking.store_id == 1, Booking.scheduled_start_at >= START, Booking.scheduled_start_at < END).order_by(Booking.scheduled_start_at)).all(), "ix_booking_store_", True),
+    ("queue delta", lambda s: _compact_queue(s, 1, datetime.utcnow()), "ix_booking_store_updated", False),
+    ("availability", lambda s: _booking_rows(s, 1, START, END), "ix_booking_store_", True),
+    ("consultant day", lambda s: s.exec(CONSULTANT_DAY_SQL, params={"store_id": 1, "consultant_id": 2, "start": START, "end": END}).all(), "ix_booking_store_consultant_start", True),
+    ("reminders", lambda s: due_reminders(s, START, "some-id", END, 500), "ix_booking_status_start", True),
+    # Overdue is open-ended by design: everything before the cutoff.
+    ("no-show sweep", lambda s: s.exec(overdue_bookings([1, 2, 3], BookingStatus.SCHEDULED, START, 1000)).all(), "ix_booking_status_start", False),
+    ("legacy export", lambda s: s.exec(LEGACY_EXPORT_SQL, params={"store_id": 1, "start": date(2025, 3, 1), "end": date(2025, 3, 1)}).all(), None, False),
+]
+# The index seek on both ends of the range, as SQLite ("scheduled_start_at>?") and Postgres ("Index Cond: ... scheduled_start_at >= ...") print it.
+LOWER_BOUND = re.compile(r"scheduled_start_at\s*>")
+UPPER_BOUND = re.compile(r"scheduled_start_at\s*<")
+
+
+def seek_line(plan: str, index: str) -> str:
+    """The plan line(s) of the index seek: SQLite puts the bounds on the SEARCH line, Postgres on the Index Cond under it."""
+    lines = plan.splitlines()
+    for i, line in enumerate(lines):
+        if index in line:
+            return "\n".join(lines[i:i + 2])
+    return ""
+
+
+@contextmanager
+def captured(session: Session):
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    conn = session.connection()
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+
+
+def plan_for(session: Session, run) -> str:
+    with captured(session) as statements:
+        run(session)
+    statement, parameters = statements[-1]
+    conn = session.connection()
+    if engine.dialect.name == "sqlite":
+        return "\n".join(r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    return "\n".join(r[0] for r in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters))
+
+
+def main():
+    init_db()
+    failed = 0
+    with Session(engine) as session:
+        if engine.dialect.name == "postgresql":
+            session.connection().exec_driver_sql("SET LOCAL enable_seqscan = off")
+        for name, run, want, ranged in CHECKS:
+            plan = plan_for(session, run)
+            ok = want is None or want in plan
+            if ok and ranged:
+                seek = seek_line(plan, want)
+                ok = bool(LOWER_BOUND.search(seek) and UPPER_BOUND.search(seek))
+            failed += not ok
+            print(f"[{'ok' if ok else 'FAIL':>4}] {name}{'' if want else ' (reference)'}")
+            print("       " + plan.replace("\n", "\n       "))
+    print(f"{failed} query plan check(s) failed" if failed else f"ok: range queries use the composite indexes on {engine.dialect.name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+A local stand-in for the Telegram Bot API, for throughput and flood-control
+tests of the outbound layer (app/telegram_outbound.py).
+
+Answers getMe, sendMessage, editMessageText, editMessageReplyMarkup and
+answerCallbackQuery under /bot<token>/<method> after --latency of simulated
+round trip, and enforces Telegram-style limits with its own token buckets:
+--global-rate messages/s for the bot and --chat-rate per chat. A call over
+either limit gets a real-shaped 429 with parameters.retry_after. Counts
+calls, 429s and the TCP connections clients opened.
+
+Used by bench_outbound.py; also runs on its own:
+    python scripts/fake_telegram.py [--port 8081]
+and point a bot at it with base_url="http://127.0.0.1:8081/bot".
+"""
+import argparse, asyncio, json, time
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+
+class Bucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FakeTelegram:
+    def __init__(self, global_rate: float = 30, global_burst: float = 5, chat_rate: float = 1, chat_burst: float = 3,
+                 retry_after: int = 1, latency: float = 0.02):
+        self.global_bucket = Bucket(global_rate, global_burst)
+        self.chat_rate, self.chat_burst = chat_rate, chat_burst
+        self.chats: dict[str, Bucket] = {}
+        self.retry_after = retry_after
+        self.latency = latency
+        self.flood_until = 0.0
+        self.calls: Counter = Counter()
+        self.rejected = 0
+        self.connections: set = set()
+        self.texts: dict[tuple[str, int], list[str]] = {}
+        self.next_message_id = 1
+        self.app = FastAPI()
+        self.app.post("/bot{token}/{method}")(self.handle)
+
+    def flood(self, seconds: float) -> None:
+        """Answer every message call with 429 for the next `seconds`, as Telegram does under flood control."""
+        self.flood_until = time.monotonic() + seconds
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "rejected_429": self.rejected, "connections": len(self.connections)}
+
+    def _too_many(self) -> JSONResponse:
+        self.rejected += 1
+        return JSONResponse({"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                             "parameters": {"retry_after": self.retry_after}}, status_code=429)
+
+    async def handle(self, token: str, method: str, request: Request):
+        self.connections.add(request.scope["client"])
+        form = dict(await request.form())
+        await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method == "answerCallbackQuery":
+            return {"ok": True, "result": True}
+        chat_id = form.get("chat_id", "0")
+        if time.monotonic() < self.flood_until:
+            return self._too_many()
+        chat = self.chats.setdefault(chat_id, Bucket(self.chat_rate, self.chat_burst))
+        if not chat.take() or not self.global_bucket.take():
+            return self._too_many()
+        if method == "sendMessage":
+            message_id, self.next_message_id = self.next_message_id, self.next_message_id + 1
+        else:
+            message_id = int(form["message_id"])
+        text = form.get("text")
+        if text is not None:
+            self.texts.setdefault((chat_id, message_id), []).append(text)
+        message = {"message_id": message_id, "date": int(time.time()), "chat": {"id": int(chat_id), "type": "private"}, "from": BOT_USER}
+        if text is not None:
+            message["text"] = text
+        if "reply_markup" in form:
+            message["reply_markup"] = json.loads(form["reply_markup"])
+        return {"ok": True, "result": message}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--latency", type=float, default=0.02)
+    a = parser.parse_args()
+    fake = FakeTelegram(global_rate=a.global_rate, chat_rate=a.chat_rate, latency=a.latency)
+    uvicorn.run(fake.app, port=a.port, log_level="warning")
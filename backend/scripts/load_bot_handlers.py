@@ -0,0 +1,122 @@
+"""
+Replay N concurrent simulated Telegram callback updates through the real bot
+handlers and report p50/p99 handler latency, with DB work either run inline
+on the event loop (the old behaviour) or offloaded to the DB thread pool.
+
+Half of the updates are `date:` taps (availability query), half are `store:`
+taps served from the catalog cache. --slow-ms adds latency to every DB call
+to mimic a remote/loaded database; with inline DB work the cache-only taps
+queue up behind it.
+
+A third run expires the catalog cache's TTL at the start and invalidates
+it again 100 ms in, with --reload-ms added to each catalog reload, so the
+p99 includes reloads: taps keep being served from the previous snapshot
+while a background thread rebuilds it.
+
+Run from backend/:  python scripts/load_bot_handlers.py [--updates 200] [--slow-ms 20] [--reload-ms 200]
+"""
+import argparse, asyncio, os, statistics, sys, tempfile, time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--updates", type=int, default=200)
+parser.add_argument("--slow-ms", type=float, default=20.0)
+parser.add_argument("--reload-ms", type=float, default=200.0)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlmodel import Session, select
+from app import catalog_cache, conversation_state, db, telegram_bot
+from app.callback_data import Tap, encode
+from app.db import engine, init_db
+from app.models import Service
+from app.seed import seed_if_needed
+
+
+def slowed(fn):
+    def wrapper(session, *a, **kw):
+        time.sleep(args.slow_ms / 1000)
+        return fn(session, *a, **kw)
+    return wrapper
+
+
+async def run_inline(fn, /, *a, **kw):
+    # Pre-change behaviour: the query blocks the event loop.
+    with Session(engine) as session:
+        return slowed(fn)(session, *a, **kw)
+
+
+async def run_offloaded(fn, /, *a, **kw):
+    return await db.run_in_session(slowed(fn), *a, **kw)
+
+
+def fake_update(data: str, chat_id: int):
+    async def noop(*a, **kw):
+        await asyncio.sleep(0)
+    cq = SimpleNamespace(data=data, answer=noop, edit_message_text=noop)
+    return SimpleNamespace(callback_query=cq, effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=chat_id, first_name="Load"))
+
+
+def slow_load(version):
+    time.sleep(args.reload_ms / 1000)
+    return load(version)
+
+
+load = catalog_cache._load
+catalog_cache._load = slow_load
+
+
+async def replay(runner, expire: bool = False) -> dict[str, list[float]]:
+    telegram_bot.run_in_session = runner
+    day = datetime.utcnow().date() + timedelta(days=1)
+    with Session(engine) as s:
+        svc = s.exec(select(Service).where(Service.store_id == 1)).first()
+    latencies: dict[str, list[float]] = {"date:": [], "store:": []}
+    # Conversation state (saved by store: taps) in memory, so only the handlers' own DB work is slowed.
+    conversation_state.conversation_store = conversation_state.MemoryConversationStore(timedelta(hours=1))
+
+    async def one(i: int):
+        kind = "date:" if i % 2 == 0 else "store:"
+        data = encode(Tap("date", 1, service_id=svc.id, day=day) if kind == "date:" else Tap("store", 1))
+        context = SimpleNamespace(user_data={})
+        t0 = time.perf_counter()
+        await telegram_bot.on_callback(fake_update(data, i), context)
+        latencies[kind].append((time.perf_counter() - t0) * 1000)
+
+    async def expire_midway():
+        catalog_cache.catalog.ttl_seconds = 0.05  # expires at the start ...
+        await asyncio.sleep(0.1)
+        catalog_cache.catalog.invalidate()  # ... and a catalog commit mid-run
+
+    jobs = [one(i) for i in range(args.updates)]
+    if expire:
+        jobs.append(expire_midway())
+    await asyncio.gather(*jobs)
+    return latencies
+
+
+def pct(values: list[float], p: float) -> float:
+    return statistics.quantiles(values, n=100)[int(p) - 1] if len(values) > 1 else values[0]
+
+
+async def main():
+    init_db()
+    with Session(engine) as s:
+        seed_if_needed(s)
+    print(f"updates={args.updates} db_latency={args.slow_ms}ms pool_workers={db.settings.db_executor_workers}")
+    print(f"{'mode':>10} {'tap':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    catalog_cache.catalog.snapshot()  # warm, as app startup does
+    for name, runner, expire in (("inline", run_inline, False), ("offloaded", run_offloaded, False), ("expired", run_offloaded, True)):
+        reloads = catalog_cache.catalog.misses
+        lat = await replay(runner, expire)
+        for kind, values in lat.items():
+            print(f"{name:>10} {kind:>7} {pct(values, 50):>8.1f} {pct(values, 99):>8.1f}")
+    await asyncio.sleep(args.reload_ms / 1000 * 2)
+    print(f"catalog reloads during the expired run: {catalog_cache.catalog.misses - reloads} ({args.reload_ms:.0f} ms each, off the event loop)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Replay the same Telegram updates at the webhook, concurrently and repeatedly,
+and check every update_id reaches the bot exactly once. The persistent run
+puts two app instances (two "workers") on one database and splits the
+redeliveries between them. A last run fails the persistent claim once
+(as a locked database would) and checks Telegram's retry is still processed.
+
+Run from backend/:  python scripts/replay_updates.py [--updates 200] [--copies 5]
+"""
+import argparse, asyncio, os, sys, tempfile
+from collections import Counter
+from types import SimpleNamespace
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/replay.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.exc import OperationalError
+
+from app import dedup
+from app.db import init_db
+from app.dedup import UpdateDeduplicator
+from app.routers.telegram import router
+
+
+def payload(i: int) -> dict:
+    return {"update_id": i, "message": {"message_id": i, "date": 0, "chat": {"id": 1000 + i % 20, "type": "private"}, "text": "hi"}}
+
+
+def make_app(handled: Counter, persistent: bool) -> FastAPI:
+    async def process_update(update):
+        await asyncio.sleep(0.001)
+        handled[update.update_id] += 1
+
+    app = FastAPI()
+    app.include_router(router)
+    app.state.telegram_app = SimpleNamespace(bot=None, process_update=process_update)
+    app.state.telegram_webhook_secret = ""
+    app.state.telegram_dedup = UpdateDeduplicator(persistent=persistent)
+    return app
+
+
+async def replay(persistent: bool, updates: int, copies: int) -> None:
+    handled: Counter = Counter()
+    apps = [make_app(handled, persistent) for _ in range(2 if persistent else 1)]
+    clients = [httpx.AsyncClient(transport=httpx.ASGITransport(app=a), base_url="http://replay") for a in apps]
+    try:
+        posts = [clients[(i + c) % len(clients)].post("/telegram/webhook", json=payload(i)) for c in range(copies) for i in range(updates)]
+        codes = Counter(r.status_code for r in await asyncio.gather(*posts))
+    finally:
+        for c in clients:
+            await c.aclose()
+
+    extra = {k: v for k, v in handled.items() if v != 1}
+    print(f"persistent={persistent!s:<5} posts={updates * copies} status={dict(codes)} handled={sum(handled.values())} unique={len(handled)}")
+    for a in apps:
+        print("   ", a.state.telegram_dedup.stats())
+    assert len(handled) == updates and not extra, f"updates handled more than once: {extra}"
+
+
+async def claim_failure() -> None:
+    handled: Counter = Counter()
+    app = make_app(handled, persistent=True)
+    claim = dedup._claim
+
+    def locked(session, update_id):
+        dedup._claim = claim
+        raise OperationalError("INSERT INTO processedupdate", {}, Exception("database is locked"))
+
+    dedup._claim = locked
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://replay") as client:
+        first = await client.post("/telegram/webhook", json=payload(10_000))
+        retry = await client.post("/telegram/webhook", json=payload(10_000))
+    print(f"claim failure: first delivery {first.status_code}, retry {retry.status_code} {retry.json()}, handled={handled[10_000]}")
+    assert first.status_code == 500 and handled[10_000] == 1, "the retry after a failed claim was dropped as a duplicate"
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--copies", type=int, default=5)
+    args = parser.parse_args()
+    init_db()
+    await replay(False, args.updates, args.copies)
+    await replay(True, args.updates, args.copies)
+    await claim_failure()
+    print("ok: every update processed exactly once")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
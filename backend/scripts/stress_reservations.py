@@ -0,0 +1,196 @@
+"""
+Fire many parallel confirmations at one slot and check exactly one wins.
+
+Run from backend/:  python scripts/stress_reservations.py [--workers 300] [--database-url URL]
+Without --database-url a throwaway SQLite file is used. Pass --naive to run the
+old unchecked insert path for comparison (expect double bookings).
+
+Afterwards, error mapping: a slot caught only by the database constraint is
+SlotUnavailable, while a reused booking_code propagates as IntegrityError
+and a BookingCodeExhausted leaves the session rolled back.
+
+Finally, availability and booking agree: with two stations, a 10:00-10:30
+booking on one and 10:30-11:30 on the other, 10:00 is neither listed nor
+bookable for a 60-minute service. Then random days are filled through
+reserve_booking (stations, consultants, requested consultants, unassigned
+legacy rows), and after every booking each start on the grid must be listed
+exactly when assign_resources can place it.
+"""
+import argparse, os, random, sys, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--workers", type=int, default=300)
+parser.add_argument("--database-url", default=None)
+parser.add_argument("--naive", action="store_true")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/stress.db"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlmodel import Session, select, func
+from app import reservations
+from app.booking_codes import BookingCodeExhausted
+from app.db import engine, init_db
+from app.availability import assign_resources, list_available_start_times
+from app.models import Store, Station, Service, StoreHours, Customer, Booking, BookingStatus, StaffUser, Role
+from app.reservations import reserve_booking, ensure_booking_constraints, SlotUnavailable
+
+
+def setup() -> tuple[int, int, list[int]]:
+    init_db()
+    with Session(engine) as s:
+        ensure_booking_constraints(s)
+        store = Store(region="Test", name=f"Stress {datetime.utcnow().isoformat()}")
+        s.add(store); s.commit(); s.refresh(store)
+        s.add(Station(store_id=store.id, name="Only kiosk"))
+        for dow in range(7):
+            s.add(StoreHours(store_id=store.id, day_of_week=dow, open_time=time(9), close_time=time(18)))
+        svc = Service(store_id=store.id, category="Makeup", name="Full Glam", duration_minutes=60, price_cents=45000)
+        s.add(svc); s.commit(); s.refresh(svc)
+        customers = [Customer(telegram_chat_id=f"stress-{store.id}-{i}") for i in range(args.workers)]
+        s.add_all(customers); s.commit()
+        return store.id, svc.id, [c.id for c in customers]
+
+
+def main():
+    store_id, service_id, customer_ids = setup()
+    start = datetime.combine(datetime.utcnow().date() + timedelta(days=1), time(10))
+    end = start + timedelta(minutes=60)
+    gate = threading.Barrier(args.workers)
+
+    def confirm(i: int) -> str:
+        with Session(engine) as s:
+            gate.wait()
+            try:
+                if args.naive:
+                    s.add(Booking(booking_code=f"N-{store_id}-{i}", store_id=store_id, service_id=service_id, customer_id=customer_ids[i], scheduled_start_at=start, scheduled_end_at=end))
+                    s.commit()
+                else:
+                    reserve_booking(s, store_id=store_id, service_id=service_id, customer_id=customer_ids[i], start=start, end=end)
+                return "booked"
+            except SlotUnavailable:
+                return "taken"
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(confirm, range(args.workers)))
+
+    with Session(engine) as s:
+        stored = s.exec(select(func.count()).select_from(Booking).where(Booking.store_id == store_id, Booking.status != BookingStatus.CANCELLED)).one()
+    booked = results.count("booked")
+    print(f"workers={args.workers} booked={booked} taken={results.count('taken')} rows_in_db={stored}")
+    if booked != 1 or stored != 1:
+        raise SystemExit("FAIL: expected exactly one booking for the slot")
+    print("OK: exactly one confirmation won")
+    if not args.naive:
+        check_errors(store_id, service_id, customer_ids, start, end)
+        check_listed_means_bookable(customer_ids[0])
+
+
+def outcome(fn) -> str:
+    try:
+        fn()
+        return "booked"
+    except Exception as exc:
+        return type(exc).__name__
+
+
+def check_errors(store_id: int, service_id: int, customer_ids: list[int], start: datetime, end: datetime) -> None:
+    with Session(engine) as s:
+        taken = s.exec(select(Booking).where(Booking.store_id == store_id, Booking.status != BookingStatus.CANCELLED)).one()
+        reserve = lambda **kw: reserve_booking(s, store_id=store_id, service_id=service_id, customer_id=customer_ids[1], **kw)
+        later = start + timedelta(hours=2)
+
+        # Skip the capacity re-check so only the unique index can stop the insert.
+        assign = reservations.assign_resources
+        reservations.assign_resources = lambda *a, **kw: (taken.station_id, None)
+        by_index = outcome(lambda: reserve(start=start, end=end))
+        reservations.assign_resources = assign
+
+        reused_code = outcome(lambda: reserve(start=later, end=later + timedelta(minutes=60), booking_code=taken.booking_code))
+
+        def exhausted(session, store_id):
+            raise BookingCodeExhausted("test")
+        draw = reservations.new_booking_code
+        reservations.new_booking_code = exhausted
+        no_code = outcome(lambda: reserve(start=later, end=later + timedelta(minutes=60)))
+        reservations.new_booking_code = draw
+        rolled_back = not s.in_transaction()
+
+    print(f"slot caught by the index -> {by_index}, reused booking_code -> {reused_code}, code exhausted -> {no_code} (rolled back: {rolled_back})")
+    if (by_index, reused_code, no_code, rolled_back) != ("SlotUnavailable", "IntegrityError", "BookingCodeExhausted", True):
+        raise SystemExit("FAIL: reservation errors mapped wrongly")
+
+
+def two_station_store(s: Session, consultants: int = 0) -> tuple[int, list[int], list[int], dict[int, int]]:
+    store = Store(region="Test", name=f"Two stations {datetime.utcnow().isoformat()}")
+    s.add(store); s.commit(); s.refresh(store)
+    stations = [Station(store_id=store.id, name=f"Kiosk {i}") for i in (1, 2)]
+    staff = [StaffUser(email=f"c{i}-{store.id}@stress.test", hashed_password="x", role=Role.CONSULTANT, store_id=store.id) for i in range(consultants)]
+    services = [Service(store_id=store.id, category="Makeup", name=f"{m}m", duration_minutes=m, price_cents=1000) for m in (30, 45, 60, 90)]
+    s.add_all(stations + staff + services)
+    for dow in range(7):
+        s.add(StoreHours(store_id=store.id, day_of_week=dow, open_time=time(9), close_time=time(18)))
+    s.commit()
+    return store.id, [x.id for x in stations], [x.id for x in staff], {x.duration_minutes: x.id for x in services}
+
+
+def disagreements(s: Session, store_id: int, services: dict[int, int], d, consultant_id: int | None = None) -> list[str]:
+    out = []
+    for minutes, service_id in services.items():
+        listed = set(list_available_start_times(s, store_id=store_id, service_id=service_id, d=d, consultant_id=consultant_id))
+        at = datetime.combine(d, time(9))
+        while at + timedelta(minutes=minutes) <= datetime.combine(d, time(18)):
+            placed = assign_resources(s, store_id=store_id, start=at, end=at + timedelta(minutes=minutes), consultant_id=consultant_id) is not None
+            if placed != (at.strftime("%H:%M") in listed):
+                out.append(f"{minutes}m at {at:%H:%M}: listed={not placed}, bookable={placed}")
+            at += timedelta(minutes=30)
+    return out
+
+
+def check_listed_means_bookable(customer_id: int) -> None:
+    d = datetime.utcnow().date() + timedelta(days=3)
+    with Session(engine) as s:
+        store_id, stations, _, services = two_station_store(s)
+        for i, (a, b, station_id) in enumerate([(time(10), time(10, 30), stations[0]), (time(10, 30), time(11, 30), stations[1])]):
+            s.add(Booking(booking_code=f"TS-{store_id}-{i}", store_id=store_id, station_id=station_id, service_id=services[30], customer_id=customer_id,
+                          scheduled_start_at=datetime.combine(d, a), scheduled_end_at=datetime.combine(d, b)))
+        s.commit()
+        listed = list_available_start_times(s, store_id=store_id, service_id=services[60], d=d)
+        placed = assign_resources(s, store_id=store_id, start=datetime.combine(d, time(10)), end=datetime.combine(d, time(11)))
+        print(f"split stations: 60m at 10:00 listed={'10:00' in listed}, bookable={placed is not None}")
+        if "10:00" in listed or placed is not None or disagreements(s, store_id, services, d):
+            raise SystemExit("FAIL: availability lists a start that booking cannot place")
+
+    rng = random.Random(11)
+    checked = booked = 0
+    for day in range(6):
+        d = datetime.utcnow().date() + timedelta(days=10 + day)
+        with Session(engine) as s:
+            store_id, stations, consultants, services = two_station_store(s, consultants=day % 3)
+            if day % 2:  # legacy rows that hold a station without naming one
+                at = datetime.combine(d, time(9 + rng.randrange(8)))
+                s.add(Booking(booking_code=f"UA-{store_id}", store_id=store_id, station_id=None, service_id=services[60], customer_id=customer_id,
+                              scheduled_start_at=at, scheduled_end_at=at + timedelta(hours=1)))
+                s.commit()
+            for _ in range(40):
+                minutes = rng.choice(list(services))
+                requested = rng.choice(consultants + [None]) if consultants else None
+                at = datetime.combine(d, time(9)) + timedelta(minutes=15 * rng.randrange(36))
+                try:
+                    reserve_booking(s, store_id=store_id, service_id=services[minutes], customer_id=customer_id,
+                                    start=at, end=at + timedelta(minutes=minutes), consultant_id=requested)
+                    booked += 1
+                except SlotUnavailable:
+                    pass
+                for consultant_id in [None] + consultants:
+                    bad = disagreements(s, store_id, services, d, consultant_id)
+                    checked += 1
+                    if bad:
+                        raise SystemExit(f"FAIL: availability and booking disagree (consultant {consultant_id}): {bad[:5]}")
+    print(f"random days: {booked} bookings, listings matched assign_resources on every start in {checked} checks")
+
+
+if __name__ == "__main__":
+    main()
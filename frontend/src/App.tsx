@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { login, me, stores, queueToday, updateStatus, kpisDaily } from "./api";
+import { login, me, stores, queueToday, queueStream, updateStatus, kpisDaily } from "./api";
 
 function todayISO() {
   const d = new Date();
@@ -9,6 +9,11 @@ function todayISO() {
   return `${y}-${m}-${day}`;
 }
 
+function upsertBooking(queue: any[], b: any) {
+  const rest = queue.filter((x) => x.id !== b.id);
+  return [...rest, b].sort((x, y) => x.scheduled_start_at.localeCompare(y.scheduled_start_at));
+}
+
 export function App() {
   const [token, setToken] = useState<string | null>(null);
   const [user, setUser] = useState<any | null>(null);
@@ -38,29 +43,35 @@ export function App() {
     }
   }
 
+  async function refreshKpis() {
+    if (!token || !storeId) return;
+    setKpis(await kpisDaily(token, storeId, todayISO()));
+  }
+
   async function refreshAll() {
     if (!token || !storeId) return;
-    const q = await queueToday(token, storeId);
-    setQueue(q);
-    if (selected) {
-      const latest = q.find((b: any) => b.id === selected.id);
-      if (latest) setSelected(latest);
-    }
-    const k = await kpisDaily(token, storeId, todayISO());
-    setKpis(k);
+    setQueue(await queueToday(token, storeId));
+    await refreshKpis();
   }
 
+  // Today's queue arrives as a snapshot and then as changes; KPIs are revalidated (ETag) on each change.
   useEffect(() => {
     if (!token || !storeId) return;
-    refreshAll().catch(()=>{});
-    const i = setInterval(() => refreshAll().catch(()=>{}), 10000);
-    return () => clearInterval(i);
+    const es = queueStream(token, storeId, (m) => {
+      if (m.type === "snapshot") setQueue(m.bookings);
+      else if (m.type === "booking") setQueue((q) => upsertBooking(q, m.booking));
+      if (m.type !== "incident") refreshKpis().catch(()=>{});
+    });
+    return () => es.close();
   }, [token, storeId]);
 
+  useEffect(() => {
+    setSelected((sel: any) => (sel ? queue.find((b) => b.id === sel.id) ?? sel : sel));
+  }, [queue]);
+
   async function setStatus(status: string) {
     if (!token || !selected) return;
     await updateStatus(token, selected.id, status);
-    await refreshAll();
   }
 
   if (!token) {
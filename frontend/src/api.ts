@@ -29,6 +29,46 @@ export async function queueToday(token: string, store_id: number) {
   return r.json();
 }
 
+// Live queue over Server-Sent Events: a "snapshot" message, then "booking"/"incident" changes.
+// EventSource cannot send headers, so the stream is opened with a short-lived ticket in the
+// query string (never the access token). Tickets expire, so each reconnect fetches a new one.
+async function streamTicket(token: string, store_id: number): Promise<string> {
+  const r = await fetch(`${API_BASE}/queue/stream-ticket?store_id=${store_id}`, {
+    method: "POST",
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!r.ok) throw new Error(await r.text());
+  return (await r.json()).ticket;
+}
+
+export function queueStream(token: string, store_id: number, onMessage: (m: any) => void) {
+  let es: EventSource | null = null;
+  let closed = false;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  const open = async () => {
+    try {
+      const ticket = await streamTicket(token, store_id);
+      if (closed) return;
+      es = new EventSource(`${API_BASE}/queue/stream?store_id=${store_id}&ticket=${encodeURIComponent(ticket)}`);
+      es.onmessage = (e) => onMessage(JSON.parse(e.data));
+      es.onerror = () => {
+        es?.close();
+        if (!closed) retry = setTimeout(open, 2000);
+      };
+    } catch {
+      if (!closed) retry = setTimeout(open, 5000);
+    }
+  };
+  open();
+  return {
+    close() {
+      closed = true;
+      clearTimeout(retry);
+      es?.close();
+    },
+  };
+}
+
 export async function updateStatus(token: string, booking_id: string, status: string) {
   const r = await fetch(`${API_BASE}/bookings/${booking_id}/status`, {
     method: "PATCH",